@@ -0,0 +1,138 @@
+import numpy as np
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+
+from EMQST_lib import support_functions as sf
+from EMQST_lib import measurement_functions as mf
+from EMQST_lib.povm import POVM
+
+
+# A single experimental setting, with the same arguments as the standard measurement function:
+# measurement_angles has shape (2**n_qubits, n_qubits, 2) as returned by POVM.get_angles(),
+# state_angles has shape (n_qubits, 2). Plain (n_shots, measurement_angles, state_angles) tuples are accepted as well.
+MeasurementJob = namedtuple('MeasurementJob', ['n_shots', 'measurement_angles', 'state_angles'])
+
+
+class MeasurementBackend:
+    """
+    Base class for batched, asynchronous experimental measurement backends.
+    A backend receives a whole batch of measurement jobs at once and returns one future per job,
+    such that a control stack can queue many settings at once instead of paying one round trip per setting.
+    Subclasses implement run_batch, which measures a list of jobs and returns a list with the outcomes of each job.
+    A backend can be passed to the experimental paths with exp_dictionary["measurement_backend"].
+    The worker threads are started on the first submit and kept alive between calls, such that one backend can be reused
+    for several experiments. They are not stopped by the experimental paths, so call shutdown() or use the backend in a with block.
+    """
+
+    def __init__(self, max_workers = 1, batch_size = None):
+        """
+        max_workers:    Number of batches that can be in flight at the same time.
+        batch_size:     Maximal number of jobs sent in one batch, at least 1. Defaults to all jobs in one batch.
+        """
+        if batch_size is not None and batch_size < 1:
+            raise ValueError(f"The batch size must be at least 1, got {batch_size}.")
+        self._max_workers = max_workers
+        self._batch_size = batch_size
+        self._executor = None
+
+    def run_batch(self, jobs):
+        raise NotImplementedError("Measurement backends must implement run_batch.")
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers = self._max_workers)
+        return self._executor
+
+    def _run_batch_into_futures(self, jobs, job_futures):
+        try:
+            outcomes = self.run_batch(jobs)
+        except Exception as error:
+            for job_future in job_futures:
+                job_future.set_exception(error)
+            return
+        for job_future, outcome in zip(job_futures, outcomes):
+            job_future.set_result(outcome)
+
+    def submit(self, jobs):
+        """
+        Submits a list of jobs and returns a list of futures with the outcomes of each job, in the order of the jobs.
+        """
+        jobs = [MeasurementJob(*job) for job in jobs]
+        job_futures = [Future() for _ in jobs]
+        batch_size = len(jobs) if self._batch_size is None else self._batch_size
+        for start in range(0, len(jobs), max(batch_size, 1)): # max only guards the empty job list
+            self._get_executor().submit(self._run_batch_into_futures, jobs[start:start + batch_size], job_futures[start:start + batch_size])
+        return job_futures
+
+    def run(self, jobs):
+        """
+        Submits a list of jobs and waits for all outcomes, returned in the order of the jobs.
+        """
+        return [job_future.result() for job_future in self.submit(jobs)]
+
+    def iterate_results(self, jobs):
+        """
+        Submits a list of jobs and yields (job index, outcomes) as the jobs complete.
+        """
+        job_futures = self.submit(jobs)
+        future_index = {job_future: index for index, job_future in enumerate(job_futures)}
+        for job_future in as_completed(job_futures):
+            yield future_index[job_future], job_future.result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+class FunctionBackend(MeasurementBackend):
+    """
+    Backend wrapping the existing experimental measurement functions.
+    If a batch_measurement_function(jobs, exp_dictionary) is given, every batch is sent in a single call.
+    Otherwise each job is measured with measurement_function(n_shots, measurement_angles, state_angles, exp_dictionary),
+    the standard measurement function, and max_workers batches are in flight at the same time.
+    """
+
+    def __init__(self, measurement_function = None, exp_dictionary = None, batch_measurement_function = None, max_workers = 1, batch_size = None):
+        super().__init__(max_workers, batch_size)
+        if measurement_function is None and batch_measurement_function is None:
+            raise ValueError("Please provide a measurement function or a batch measurement function.")
+        self._measurement_function = measurement_function
+        self._batch_measurement_function = batch_measurement_function
+        self._exp_dictionary = {} if exp_dictionary is None else exp_dictionary
+
+    def run_batch(self, jobs):
+        if self._batch_measurement_function is not None:
+            return self._batch_measurement_function(jobs, self._exp_dictionary)
+        return [self._measurement_function(job.n_shots, job.measurement_angles, job.state_angles, self._exp_dictionary) for job in jobs]
+
+
+class SimulatedBackend(MeasurementBackend):
+    """
+    In-process stand-in for an experimental backend, used for testing.
+    Each job is simulated as a spin measurement (POVM.POVM_from_angles) on the product state given by the state angles,
+    and returns the outcome indices as the standard measurement function does.
+    latency (float) is the simulated round-trip time of each batch in seconds.
+    """
+
+    def __init__(self, latency = 0.0, max_workers = 1, batch_size = None):
+        super().__init__(max_workers, batch_size)
+        self._latency = latency
+        self.n_round_trips = 0
+
+    def run_batch(self, jobs):
+        time.sleep(self._latency)
+        self.n_round_trips += 1
+        outcomes = []
+        for job in jobs:
+            rho = sf.get_density_matrix_from_angles(np.asarray(job.state_angles))
+            povm = POVM.POVM_from_angles(np.asarray(job.measurement_angles)[0])
+            outcomes.append(mf.simulated_measurement(job.n_shots, povm, rho))
+        return outcomes
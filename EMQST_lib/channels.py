@@ -0,0 +1,157 @@
+import numpy as np
+from functools import lru_cache
+from scipy.linalg import hadamard
+
+
+# All channels in this module act on POVMs, i.e. the operators K are applied as K M K^dagger
+# (the same convention as POVM.generate_noisy_POVM, where the inverse Kraus operators are supplied).
+# POVM stacks can have arbitrary leading dimensions, e.g. (n_clusters, n_outcomes, dim, dim).
+
+
+def _read_only(array):
+    """
+    Returns a read-only view, used for arrays that are stored in a cache.
+    """
+    array = array.view()
+    array.flags.writeable = False
+    return array
+
+
+def apply_kraus(povm_stack, kraus_ops):
+    """
+    Applies the channel M -> sum_n K_n M K_n^dagger to a stack of POVMs in one contraction.
+
+    Args:
+        povm_stack (ndarray): POVM elements of shape (..., n_outcomes, dim, dim).
+        kraus_ops (ndarray): Kraus operators of shape (n_kraus, dim, dim), or (n_stack, n_kraus, dim, dim)
+            if a separate channel is applied to each entry along the first axis of the stack,
+            in which case povm_stack has shape (n_stack, ..., n_outcomes, dim, dim).
+
+    Returns:
+        ndarray: The noisy POVM stack with the same shape as povm_stack.
+    """
+    povm_stack = np.asarray(povm_stack)
+    kraus_ops = np.asarray(kraus_ops)
+    if kraus_ops.ndim == 3:
+        return np.einsum('nij,...jk,nlk->...il', kraus_ops, povm_stack, kraus_ops.conj(), optimize=True)
+    return np.einsum('cnij,c...jk,cnlk->c...il', kraus_ops, povm_stack, kraus_ops.conj(), optimize=True)
+
+
+def apply_unitary(povm_stack, unitary):
+    """
+    Applies the unitary channel M -> U M U^dagger to a stack of POVMs.
+
+    Args:
+        povm_stack (ndarray): POVM elements of shape (..., n_outcomes, dim, dim).
+        unitary (ndarray): Unitary of shape (dim, dim), or (n_stack, dim, dim) for one unitary per stack entry.
+    """
+    unitary = np.asarray(unitary)
+    return apply_kraus(povm_stack, unitary[..., None, :, :])
+
+
+def apply_local_kraus(povm_stack, kraus_ops, n_qubits):
+    """
+    Applies the same single-qubit channel independently to every qubit of the POVMs.
+    The n-qubit Kraus operators are never constructed; each qubit index is contracted in turn.
+
+    Args:
+        povm_stack (ndarray): POVM elements of shape (..., n_outcomes, 2**n_qubits, 2**n_qubits).
+        kraus_ops (ndarray): Single-qubit Kraus operators of shape (n_kraus, 2, 2).
+        n_qubits (int): Number of qubits of the POVMs.
+    """
+    povm_stack = np.asarray(povm_stack, dtype=complex)
+    kraus_ops = np.asarray(kraus_ops, dtype=complex)
+    lead_shape = povm_stack.shape[:-2]
+    dim = 2**n_qubits
+    tensor = povm_stack.reshape(-1, *[2]*(2*n_qubits))
+    for qubit in range(n_qubits):
+        # Move the row and column index of the qubit to the end, apply the channel, and move them back.
+        tensor = np.moveaxis(tensor, (1 + qubit, 1 + n_qubits + qubit), (-2, -1))
+        tensor = np.einsum('nij,...jk,nlk->...il', kraus_ops, tensor, kraus_ops.conj())
+        tensor = np.moveaxis(tensor, (-2, -1), (1 + qubit, 1 + n_qubits + qubit))
+    return tensor.reshape(*lead_shape, dim, dim)
+
+
+def depolarize(povm_stack, strength):
+    """
+    Global depolarizing channel on POVMs, M -> strength * tr(M)/dim * I + (1-strength) * M.
+    For the POVMs of POVM.generate_computational_POVM this is the same as POVM.depolarized_POVM.
+    """
+    povm_stack = np.asarray(povm_stack)
+    dim = povm_stack.shape[-1]
+    trace = np.einsum('...ii->...', povm_stack)
+    return strength/dim * trace[..., None, None] * np.eye(dim) + (1-strength) * povm_stack
+
+
+def mix_with_identity(povm_stack, strength):
+    """
+    Mixes every POVM element with the identity, M -> strength/dim * I + (1-strength) * M.
+    This is the noise of POVM.depolarized_POVM and of the 2 qubit noise mode 7 of POVM.generate_noisy_POVM.
+    """
+    povm_stack = np.asarray(povm_stack)
+    dim = povm_stack.shape[-1]
+    return strength/dim * np.eye(dim) + (1-strength) * povm_stack
+
+
+@lru_cache(maxsize=None)
+def single_qubit_kraus(noise_mode):
+    """
+    Returns the (inverse) Kraus operators of the single qubit noise modes of POVM.generate_noisy_POVM.
+    1: Constant depolarizing noise
+    2: Stronger depolarizing noise
+    3: Amplitude damping noise
+    4: Constant over-rotation
+    """
+    X = np.array([[0,1],[1,0]])
+    Y = np.array([[0,-1j],[1j,0]])
+    Z = np.array([[1,0],[0,-1]])
+    if noise_mode == 1: # Constant depolarizing noise
+        p = 0.05
+        Krauss_op = np.array([np.sqrt(1-(3*p)/4)*np.eye(2),np.sqrt(p)*X/2,np.sqrt(p)*Y/2,np.sqrt(p)*Z/2],dtype=complex)
+    elif noise_mode == 2: # Stronger depolarizing noise
+        p = 0.2
+        Krauss_op = np.array([np.sqrt(1-(3*p)/4)*np.eye(2),np.sqrt(p)/2*X,np.sqrt(p)*Y/2,np.sqrt(p)*Z/2],dtype=complex)
+    elif noise_mode == 3: # Amplitude damping noise
+        gamma = 0.2
+        K0 = np.array([[1,0],[0,np.sqrt(1-gamma)]],dtype=complex)
+        K1 = np.array([[0,np.sqrt(gamma)],[0,0]],dtype=complex)
+        Krauss_op = np.array([K0.conj().T,K1.conj().T])
+    elif noise_mode == 4: # Constant over-rotation
+        rotAngle = np.pi/5
+        U = np.cos(rotAngle/2)*np.eye(2) - 1j* np.sin(rotAngle/2)*X
+        Krauss_op = np.array([U],dtype=complex)
+    else:
+        raise ValueError(f'Invalid single qubit noise mode {noise_mode}.')
+    return _read_only(Krauss_op)
+
+
+@lru_cache(maxsize=None)
+def coherent_XX_unitary(n_qubits, angle):
+    """
+    Returns the coherent cross-talk unitary used by QREM.set_coherent_POVM_array, cached by size and angle.
+    For 1 and 2 qubits this is a rotation about the collective X axis, exp(-i angle/2 X...X).
+    For more qubits it is the nearest neighbour model exp(-i angle/2 sum_i X_i X_i+1).
+    Since all terms are diagonal in the Hadamard basis, the unitary is constructed as H D H without matrix exponentials.
+    """
+    dim = 2**n_qubits
+    bits = (np.arange(dim)[:, None] >> np.arange(n_qubits)[::-1]) & 1
+    z = 1 - 2*bits
+    if n_qubits <= 2:
+        eigenvalues = np.prod(z, axis=1)
+    else:
+        eigenvalues = np.sum(z[:, :-1] * z[:, 1:], axis=1)
+    H = hadamard(dim) / np.sqrt(dim)
+    unitary = (H * np.exp(-1j/2 * angle * eigenvalues)) @ H
+    return _read_only(unitary.astype(complex))
+
+
+@lru_cache(maxsize=None)
+def coherent_XX_POVM(n_qubits, angle):
+    """
+    Returns the computational basis POVM rotated by coherent_XX_unitary, cached by size and angle.
+    """
+    unitary = coherent_XX_unitary(n_qubits, angle)
+    dim = 2**n_qubits
+    # Computational basis projectors are rotated into the outer products of the columns of the unitary.
+    rotated_POVM = np.einsum('ik,jk->kij', unitary, unitary.conj())
+    return _read_only(rotated_POVM.reshape(dim, dim, dim))
@@ -16,17 +16,22 @@ def main():
     return 1
 
 
-def device_tomography(n_qubits,n_shots_each,povm,calibration_states,n_cores=1,bool_exp_meaurements=False,exp_dictionary={},initial_guess_POVM=None,calibration_angles=None):
+def device_tomography(n_qubits,n_shots_each,povm,calibration_states,n_cores=1,bool_exp_meaurements=False,exp_dictionary={},initial_guess_POVM=None,calibration_angles=None,mle_method="standard"):
     """
     Takes in a list of  POVM objects, a set of calibration states and experimental dictionary
     and performs device tomography or POVM set tomography
     Standard format for superconducting qubit is each POVM object is a set of spin measurement on each qubit. 
+    mle_method selects the reconstruction, "standard" for POVM_MLE or "accelerated" for POVM_MLE_accelerated.
+    initial_guess_POVM is used as starting point of the reconstruction, also for experimental data. Defaults to povm.
+    Experimental measurements require calibration_angles. A measurement backend in exp_dictionary is not shut down here.
     
     returns an array corrected POVM object. 
     """
     
     # If no experimental angles are provided
     if calibration_angles is None:
+        if bool_exp_meaurements:
+            raise ValueError("Experimental device tomography requires calibration_angles, the angle representation of the calibration states.")
         calibration_angles=np.zeros((len(calibration_states),1))
     # Perform measurement over all calibration states and all POVMs
     outcome_index_matrix=np.zeros((n_shots_each))
@@ -38,18 +43,18 @@ def device_tomography(n_qubits,n_shots_each,povm,calibration_states,n_cores=1,bo
     # Create a count function that stores the data on the form (POMV index x calib.state index)
     index_counts=np.zeros((len(povm),len(calibration_states),2**n_qubits))
     #index_count_efficient=np.zeros((len(POVM),2**n_qubits,len(calibration_states)))
-    for i in range(len(povm)):
-        for j in range(len(calibration_states)):
-            outcome_index_matrix=mf.measurement(n_shots_each,povm[i],calibration_states[j],bool_exp_meaurements,exp_dictionary,state_angle_representation=calibration_angles[j])
+    if bool_exp_meaurements: # All settings are submitted together, as one batch if exp_dictionary holds a measurement backend
+        settings=[(i,j) for i in range(len(povm)) for j in range(len(calibration_states))]
+        outcome_index_list=mf.experimental_measurements(n_shots_each,[povm[i].get_angles() for i,j in settings],[calibration_angles[j] for i,j in settings],exp_dictionary)
+        for (i,j),outcome_index_matrix in zip(settings,outcome_index_list):
             index_counts[i,j]=np.bincount(outcome_index_matrix,minlength=2**n_qubits)
-            #for k in range(len(index_list)):
-                #print(outcome_index_matrix)
-            #    index_counts[i,k,j] = np.count_nonzero(outcome_index_matrix == index_list[k])
+    else: # Simulated counts are drawn directly for all POVM and calibration state pairs
+        index_counts=mf.simulated_measurement_counts(n_shots_each,povm,calibration_states)
       
     mesh_end = time.time()
     print(f'Done collecting and sorting QDT data, total runtime {mesh_end - mesh_start}.')
     print(f'Starting POVM reconstruction.')
-    if bool_exp_meaurements or initial_guess_POVM is None:
+    if initial_guess_POVM is None:
         initial_guess_POVM=povm
         
         
@@ -59,7 +64,14 @@ def device_tomography(n_qubits,n_shots_each,povm,calibration_states,n_cores=1,bo
     #print(f'Runtime of POVM reconstruction {dt_end - dt_start}')
 
     parallel_dt_start=time.time()
-    corrected_POVM = Parallel(n_jobs=n_cores)(delayed(POVM_MLE)(n_qubits,index_counts[i],calibration_states,initial_guess_POVM[i]) for i in range(len(povm)))
+    if mle_method == "accelerated":
+        results = Parallel(n_jobs=n_cores)(delayed(POVM_MLE_accelerated)(n_qubits,index_counts[i],calibration_states,initial_guess_POVM[i]) for i in range(len(povm)))
+        corrected_POVM = [result[0] for result in results]
+        n_not_converged = np.sum([not result[1]["converged"] for result in results])
+        if n_not_converged > 0:
+            print(f'{n_not_converged} POVM reconstructions reached the iteration limit before converging.')
+    else:
+        corrected_POVM = Parallel(n_jobs=n_cores)(delayed(POVM_MLE)(n_qubits,index_counts[i],calibration_states,initial_guess_POVM[i]) for i in range(len(povm)))
     parallel_dt_end = time.time()
     print(f'Runtime of parallel POVM reconstruction {parallel_dt_end - parallel_dt_start}')
     #print(f'Relative runtime impovement: {(dt_end - dt_start)/(paralleldt_end - paralleldt_start)} ')
@@ -79,6 +91,8 @@ def donwconverted_device_tomography(n_qubits,downconvert_to_qubits,n_shots_each,
     povm_initial = POVM.generate_Pauli_POVM(n_qubits)
     # If no experimental angles are provided
     if calibration_angles is None:
+        if bool_exp_meaurements:
+            raise ValueError("Experimental device tomography requires calibration_angles, the angle representation of the calibration states.")
         calibration_angles=np.zeros((len(calibration_states),1))
     # Perform measurement over all calibration states and all POVMs
     outcome_index_matrix=np.zeros((n_shots_each))
@@ -89,16 +103,19 @@ def donwconverted_device_tomography(n_qubits,downconvert_to_qubits,n_shots_each,
     # Create a count function that stores the data on the form (POMV index x calib.state index x outcome index)
     index_counts=np.zeros((len(noisy_POVM),len(calibration_states),2**n_qubits))
     
-    for i in range(len(noisy_POVM)):
-        for j in range(len(calibration_states)):
-            outcome_index_matrix=mf.measurement(n_shots_each,noisy_POVM[i],calibration_states[j],bool_exp_meaurements,exp_dictionary,state_angle_representation=calibration_angles[j])
+    if bool_exp_meaurements: # All settings are submitted together, as one batch if exp_dictionary holds a measurement backend
+        settings=[(i,j) for i in range(len(noisy_POVM)) for j in range(len(calibration_states))]
+        outcome_index_list=mf.experimental_measurements(n_shots_each,[noisy_POVM[i].get_angles() for i,j in settings],[calibration_angles[j] for i,j in settings],exp_dictionary)
+        for (i,j),outcome_index_matrix in zip(settings,outcome_index_list):
             index_counts[i,j]=np.bincount(outcome_index_matrix,minlength=2**n_qubits)
+    else: # Simulated counts are drawn directly for all POVM and calibration state pairs
+        index_counts=mf.simulated_measurement_counts(n_shots_each,noisy_POVM,calibration_states)
 
       
     mesh_end = time.time()
     print(f'Done collecting and sorting QDT data, total runtime {mesh_end - mesh_start}.')
     print(f'Starting POVM reconstruction.')
-    if bool_exp_meaurements or initial_guess_POVM is None:
+    if initial_guess_POVM is None:
         initial_guess_POVM=povm_initial
     
     parallel_dt_start=time.time()
@@ -124,16 +141,17 @@ def donwconverted_device_tomography(n_qubits,downconvert_to_qubits,n_shots_each,
 
 
 
-def POVM_MLE(n_qubits,index_counts, calibration_states,initial_guess_POVM):
+def POVM_MLE(n_qubits,index_counts, calibration_states,initial_guess_POVM,perturb_param=0.01):
     """
     Performs POVM reconstruction from measurements performed on calibration states.
     Follows prescription give by https://link.aps.org/doi/10.1103/PhysRevA.64.024102
+    perturb_param is the depolarizing noise mixed into the initial guess. A warm start from a previous
+    reconstruction can use a much smaller value than the default, which is chosen for ideal (rank deficient) guesses.
     """
     optm='optimal'
     # Initialize POVM
     POVM_reconstruction=initial_guess_POVM.get_POVM()
     # Apply small depolarizing noise such that channel does not yield zero-values
-    perturb_param=0.01
     POVM_reconstruction=np.array([perturb_param/2**n_qubits*np.eye(2**n_qubits) + (1-perturb_param)*POVM_elem for POVM_elem in POVM_reconstruction])
     iter_max = 2*10**3
     j=0
@@ -145,13 +163,15 @@ def POVM_MLE(n_qubits,index_counts, calibration_states,initial_guess_POVM):
         p=np.abs(np.real(np.einsum('qij,nji->nq',POVM_reconstruction,calibration_states,optimize=optm)))
         fp=index_counts/p # Whenever p=0 it will be cancelled by the elemetns in G also being zero
     
-        G=np.einsum('nq,mq,nij,qjk,mkl->il',fp,fp,calibration_states,POVM_reconstruction,calibration_states,optimize=optm)
+        # G = sum_q A_q M_q A_q with A_q = sum_n fp[n,q] rho_n, which is linear in the number of calibration states.
+        A=np.einsum('nq,nij->qij',fp,calibration_states,optimize=optm)
+        G=np.einsum('qij,qjk,qkl->il',A,POVM_reconstruction,A,optimize=optm)
         
-        eigV,U=sp.linalg.eig(G)
+        eigV,U=np.linalg.eigh(G)
         D=np.diag(1/np.sqrt(eigV))
         L=U@D@U.conj().T
 
-        R=np.einsum('nq,ij,njk->qik',fp,L,calibration_states,optimize=optm)
+        R=np.einsum('ij,qjk->qik',L,A,optimize=optm)
         POVM_reconstruction_old=POVM_reconstruction
         POVM_reconstruction=np.einsum('qij,qjk,qlk->qil',R,POVM_reconstruction,R.conj(),optimize=optm)
         j+=1
@@ -161,6 +181,409 @@ def POVM_MLE(n_qubits,index_counts, calibration_states,initial_guess_POVM):
     #print(f'\tNumber of MLE iterations: {j}, final distance {sf.POVM_distance(POVM_reconstruction,POVM_reconstruction_old)}')
     return POVM(POVM_reconstruction)
 
+def POVM_MLE_accelerated(n_qubits, index_counts, calibration_states, initial_guess_POVM, max_iter=2000, tol=1e-11, relaxation=1.0, max_relaxation=64, perturb_param=0.01):
+    """
+    Faster variant of POVM_MLE with convergence diagnostics.
+    The standard POVM_MLE step is M_q -> R_q M_q R_q^dagger with R_q = L A_q. Here the step is over-relaxed as
+    R_q(w) = I + w (R_q - I) with w = 1 + relaxation, and the POVM is renormalized with S^(-1/2), S = sum_q R_q(w) M_q R_q(w)^dagger.
+    This keeps all POVM elements positive and the POVM complete, and reduces to the standard step for w = 1.
+    The over-relaxed step is only accepted if the likelihood does not decrease compared to the standard step,
+    otherwise the standard step is used. The relaxation grows after accepted and shrinks after rejected steps.
+    The inverse square roots are computed with a Hermitian eigensolver. The log-likelihood is checked every iteration,
+    and the iteration stops when its increase per count falls below tol, or when max_iter iterations are reached.
+    Returns:
+        tuple: (POVM object, diagnostics dictionary with keys
+                "converged", "n_iterations", "log_likelihood", "change", "n_accepted", "n_rejected")
+    """
+    dim = 2**n_qubits
+    optm='optimal'
+    if isinstance(initial_guess_POVM, POVM):
+        initial_guess_POVM = initial_guess_POVM.get_POVM()
+    # Apply small depolarizing noise such that channel does not yield zero-values
+    POVM_reconstruction = perturb_param/dim*np.eye(dim) + (1-perturb_param)*np.asarray(initial_guess_POVM, dtype=complex)
+    index_counts = np.asarray(index_counts)
+    calibration_states = np.asarray(calibration_states, dtype=complex)
+    measured = index_counts > 0
+    n_counts = np.sum(index_counts)
+    identity = np.eye(dim)
+
+    def probabilities(POVM_list):
+        return np.abs(np.real(np.einsum('qij,nji->nq',POVM_list,calibration_states,optimize=optm)))
+
+    def log_likelihood(p):
+        return np.sum(index_counts[measured]*np.log(p[measured]))
+
+    def inverse_sqrt(H):
+        eigV,U = np.linalg.eigh(H)
+        return (U/np.sqrt(eigV)) @ U.conj().T
+
+    def apply_step(R):
+        rotated = R @ POVM_reconstruction @ np.transpose(R.conj(), axes=[0,2,1])
+        S_inv_sqrt = inverse_sqrt(np.sum(rotated, axis=0))
+        return S_inv_sqrt @ rotated @ S_inv_sqrt
+
+    p = probabilities(POVM_reconstruction)
+    log_L = log_likelihood(p)
+    n_accepted = 0
+    n_rejected = 0
+    converged = False
+    change = np.inf
+    j = 0
+    while j < max_iter:
+        fp = np.divide(index_counts, p, out=np.zeros(p.shape), where=measured)
+        A = np.einsum('nq,nij->qij',fp,calibration_states,optimize=optm)
+        G = np.einsum('qij,qjk,qkl->il',A,POVM_reconstruction,A,optimize=optm)
+        R = inverse_sqrt(G) @ A
+        POVM_step = R @ POVM_reconstruction @ np.transpose(R.conj(), axes=[0,2,1])
+        p_step = probabilities(POVM_step)
+        log_L_step = log_likelihood(p_step)
+
+        # Safeguarded over-relaxed step.
+        POVM_relaxed = apply_step(identity + (1 + relaxation)*(R - identity))
+        p_relaxed = probabilities(POVM_relaxed)
+        log_L_relaxed = log_likelihood(p_relaxed) if np.all(p_relaxed[measured] > 0) else -np.inf
+        if log_L_relaxed >= log_L_step:
+            POVM_reconstruction, p, log_L_new = POVM_relaxed, p_relaxed, log_L_relaxed
+            relaxation = min(1.25*relaxation, max_relaxation)
+            n_accepted += 1
+        else:
+            POVM_reconstruction, p, log_L_new = POVM_step, p_step, log_L_step
+            relaxation = relaxation/2
+            n_rejected += 1
+        j += 1
+        change = (log_L_new - log_L)/n_counts
+        log_L = log_L_new
+        if np.abs(change) <= tol:
+            converged = True
+            break
+
+    diagnostics = {
+        "converged": converged,
+        "n_iterations": j,
+        "log_likelihood": log_L,
+        "change": change,
+        "n_accepted": n_accepted,
+        "n_rejected": n_rejected,
+    }
+    return POVM(POVM_reconstruction), diagnostics
+
+
+def POVM_MLE_batch(n_qubits, index_counts, calibration_states, initial_guess_POVM, chunk_size=512, perturb_param=0.01):
+    """
+    Performs the POVM reconstruction of POVM_MLE for a stack of independent problems of the same dimension at once.
+    Each problem keeps iterating until it has converged by the same criterion as POVM_MLE,
+    converged problems are masked out of the remaining iterations.
+    Args:
+        n_qubits (int): Number of qubits of each problem.
+        index_counts (ndarray): Counts of shape (n_problems, n_calibration_states, n_outcomes).
+        calibration_states (ndarray): Calibration states of shape (n_problems, n_calibration_states, dim, dim),
+                                      or (n_calibration_states, dim, dim) if they are shared by all problems.
+        initial_guess_POVM (POVM or ndarray): Initial guess shared by all problems, or a stack of shape (n_problems, n_outcomes, dim, dim).
+        chunk_size (int): Maximal number of problems iterated together, limits memory usage.
+        perturb_param (float): Depolarizing noise mixed into the initial guess, see POVM_MLE.
+    Returns:
+        ndarray: Array of reconstructed POVM objects.
+    """
+    index_counts = np.asarray(index_counts)
+    n_problems = len(index_counts)
+    dim = 2**n_qubits
+    if isinstance(initial_guess_POVM, POVM):
+        initial_guess_POVM = initial_guess_POVM.get_POVM()
+    initial_guess_POVM = np.broadcast_to(initial_guess_POVM, (n_problems, *np.shape(initial_guess_POVM)[-3:]))
+    calibration_states = np.broadcast_to(calibration_states, (n_problems, *np.shape(calibration_states)[-3:]))
+
+    reconstructed_POVMs = np.zeros(initial_guess_POVM.shape, dtype=complex)
+    for start in range(0, n_problems, chunk_size):
+        chunk = slice(start, min(start + chunk_size, n_problems))
+        reconstructed_POVMs[chunk] = _POVM_MLE_stack(dim, index_counts[chunk], calibration_states[chunk], initial_guess_POVM[chunk], perturb_param)
+    return np.array([POVM(povm) for povm in reconstructed_POVMs])
+
+
+def _POVM_MLE_stack(dim, index_counts, calibration_states, initial_guess_POVM, perturb_param=0.01):
+    """
+    Iterates the POVM_MLE update on a stack of problems with a mask of the problems that have not converged.
+    """
+    optm='optimal'
+    # Apply small depolarizing noise such that channel does not yield zero-values
+    POVM_reconstruction = perturb_param/dim*np.eye(dim) + (1-perturb_param)*np.asarray(initial_guess_POVM, dtype=complex)
+    calibration_states = np.asarray(calibration_states, dtype=complex)
+    iter_max = 2*10**3
+    active = np.arange(len(POVM_reconstruction))
+    j=0
+    while j<iter_max and len(active)>0:
+        POVM_active = POVM_reconstruction[active]
+        states = calibration_states[active]
+        p=np.abs(np.real(np.einsum('bqij,bnji->bnq',POVM_active,states,optimize=optm)))
+        fp=index_counts[active]/p # Whenever p=0 it will be cancelled by the elemetns in G also being zero
+
+        A=np.einsum('bnq,bnij->bqij',fp,states,optimize=optm)
+        G=np.einsum('bqij,bqjk,bqkl->bil',A,POVM_active,A,optimize=optm)
+
+        eigV,U=np.linalg.eigh(G)
+        L=np.einsum('bij,bj,bkj->bik',U,1/np.sqrt(eigV),U.conj())
+
+        R=np.einsum('bij,bqjk->bqik',L,A,optimize=optm)
+        POVM_reconstruction[active]=np.einsum('bqij,bqjk,bqlk->bqil',R,POVM_active,R.conj(),optimize=optm)
+        j+=1
+        if j%50==0:
+            # Same convergence measure as POVM_convergence, evaluated for each problem.
+            dist = np.sqrt(np.sum(np.abs(POVM_reconstruction[active]-POVM_active)**2, axis=(1,2,3)))
+            active = active[dist>1e-9]
+    return POVM_reconstruction
+
+
+def merge_calibration_counts(calibration_instructions, index_counts, n_one_qubit_states=4):
+    """
+    Merges the counts of all rows with the same product calibration state onto the grid of all
+    n_one_qubit_states**n_qubits product states. Since rows with equal calibration states contribute
+    identically to the likelihood, the MLE on the merged counts is exactly the same.
+    Args:
+        calibration_instructions (ndarray): Index of the one qubit calibration state on each qubit, shape (n_rows, n_qubits).
+                                            The first entry is the leftmost qubit in the tensor product.
+        index_counts (ndarray): Counts of shape (n_rows, n_outcomes).
+    Returns:
+        ndarray: Merged counts of shape (n_one_qubit_states**n_qubits, n_outcomes), where the pattern index is
+                 the instruction read as a base n_one_qubit_states number.
+    """
+    calibration_instructions = np.asarray(calibration_instructions, dtype=int)
+    n_qubits = calibration_instructions.shape[1]
+    pattern_index = calibration_instructions @ (n_one_qubit_states**np.arange(n_qubits)[::-1])
+    pattern_counts = np.zeros((n_one_qubit_states**n_qubits, np.shape(index_counts)[-1]))
+    np.add.at(pattern_counts, pattern_index, index_counts)
+    return pattern_counts
+
+
+def _one_qubit_mode_products(tensor, matrix, n_qubits):
+    """
+    Applies matrix to every one qubit index of a tensor of shape (N, m, ..., m) with n_qubits indices of size m.
+    This is the action of the tensor product of n_qubits copies of matrix, without constructing it.
+    """
+    N = tensor.shape[0]
+    n_in = matrix.shape[1]
+    for i in range(n_qubits):
+        before = tensor.shape[1:1+i]
+        after = tensor.shape[2+i:]
+        tensor = (matrix @ tensor.reshape(N*int(np.prod(before)), n_in, -1)).reshape(N, *before, matrix.shape[0], *after)
+    return tensor
+
+
+def _operator_to_pair_tensor(operators, n_qubits):
+    """
+    Reorders operators of shape (N, 2**n_qubits, 2**n_qubits) into shape (N, 4, ..., 4),
+    where each index of size 4 is the (row, column) pair of one qubit.
+    """
+    N = operators.shape[0]
+    pair_order = [0] + [j for i in range(n_qubits) for j in (1 + i, 1 + n_qubits + i)]
+    return operators.reshape(N, *(2,)*(2*n_qubits)).transpose(pair_order).reshape(N, *(4,)*n_qubits)
+
+
+def _pair_tensor_to_operator(tensor, n_qubits):
+    """
+    Inverse of _operator_to_pair_tensor.
+    """
+    N = tensor.shape[0]
+    operator_order = [0] + [1 + 2*i for i in range(n_qubits)] + [2 + 2*i for i in range(n_qubits)]
+    return tensor.reshape(N, *(2,)*(2*n_qubits)).transpose(operator_order).reshape(N, 2**n_qubits, 2**n_qubits)
+
+
+def POVM_MLE_product(n_qubits, pattern_counts, one_qubit_calibration_states, initial_guess_POVM, perturb_param=0.01):
+    """
+    POVM_MLE for product calibration states, with counts merged onto the grid of all product states (see merge_calibration_counts).
+    The calibration states are never formed as dense matrices. The probabilities and the weighted sums of calibration
+    states that enter the G matrix are computed with one qubit contractions, which scales as
+    n_qubits * 4**n_qubits * 2**n_qubits instead of 4**n_qubits * 4**n_qubits for dense calibration states.
+    Returns a POVM object.
+    """
+    return POVM_MLE_product_batch(n_qubits, np.asarray(pattern_counts)[None], one_qubit_calibration_states, initial_guess_POVM, perturb_param=perturb_param)[0]
+
+
+def POVM_MLE_product_batch(n_qubits, pattern_counts, one_qubit_calibration_states, initial_guess_POVM, chunk_size=512, perturb_param=0.01):
+    """
+    Batched version of POVM_MLE_product, see POVM_MLE_batch.
+    Args:
+        pattern_counts (ndarray): Merged counts of shape (n_problems, n_one_qubit_states**n_qubits, n_outcomes).
+    Returns:
+        ndarray: Array of reconstructed POVM objects.
+    """
+    pattern_counts = np.asarray(pattern_counts)
+    n_problems = len(pattern_counts)
+    if isinstance(initial_guess_POVM, POVM):
+        initial_guess_POVM = initial_guess_POVM.get_POVM()
+    initial_guess_POVM = np.broadcast_to(initial_guess_POVM, (n_problems, *np.shape(initial_guess_POVM)[-3:]))
+    reconstructed_POVMs = np.zeros(initial_guess_POVM.shape, dtype=complex)
+    for start in range(0, n_problems, chunk_size):
+        chunk = slice(start, min(start + chunk_size, n_problems))
+        reconstructed_POVMs[chunk] = _POVM_MLE_product_stack(n_qubits, pattern_counts[chunk], one_qubit_calibration_states, initial_guess_POVM[chunk], perturb_param)
+    return np.array([POVM(povm) for povm in reconstructed_POVMs])
+
+
+def _POVM_MLE_product_stack(n_qubits, pattern_counts, one_qubit_calibration_states, initial_guess_POVM, perturb_param=0.01):
+    """
+    Iterates the POVM_MLE update on a stack of problems with product calibration states.
+    """
+    dim = 2**n_qubits
+    one_qubit_calibration_states = np.asarray(one_qubit_calibration_states, dtype=complex)
+    n_states = len(one_qubit_calibration_states)
+    POVM_reconstruction = perturb_param/dim*np.eye(dim) + (1-perturb_param)*np.asarray(initial_guess_POVM, dtype=complex)
+    n_problems, n_outcomes = POVM_reconstruction.shape[:2]
+    # frame[s, (a,b)] = rho_s[b,a] gives tr(M rho_s), and states[(a,b), s] = rho_s[a,b] gives sum_s w_s rho_s.
+    frame = np.transpose(one_qubit_calibration_states, axes=[0,2,1]).reshape(n_states, 4)
+    states = one_qubit_calibration_states.reshape(n_states, 4).T
+    # Only grid points with counts contribute, the others are masked out of the weights.
+    pattern_counts = np.transpose(pattern_counts, axes=[0,2,1])
+    measured = pattern_counts > 0
+
+    iter_max = 2*10**3
+    active = np.arange(n_problems)
+    j=0
+    while j<iter_max and len(active)>0:
+        POVM_active = POVM_reconstruction[active]
+        n_active = len(active)
+        pair_tensor = _operator_to_pair_tensor(POVM_active.reshape(-1, dim, dim), n_qubits)
+        p = np.abs(np.real(_one_qubit_mode_products(pair_tensor, frame, n_qubits))).reshape(n_active, n_outcomes, -1)
+        fp = np.divide(pattern_counts[active], p, out=np.zeros(p.shape), where=measured[active])
+        # A_q = sum_n fp[n,q] rho_n, computed with one qubit contractions.
+        weights = fp.reshape(n_active*n_outcomes, *(n_states,)*n_qubits).astype(complex)
+        A = _pair_tensor_to_operator(_one_qubit_mode_products(weights, states, n_qubits), n_qubits).reshape(n_active, n_outcomes, dim, dim)
+        G = np.sum(A @ POVM_active @ A, axis=1)
+
+        eigV,U = np.linalg.eigh(G)
+        L = (U / np.sqrt(eigV)[:, None, :]) @ np.transpose(U.conj(), axes=[0,2,1])
+        R = L[:, None] @ A
+        POVM_reconstruction[active] = R @ POVM_active @ np.transpose(R.conj(), axes=[0,1,3,2])
+        j+=1
+        if j%50==0:
+            dist = np.sqrt(np.sum(np.abs(POVM_reconstruction[active]-POVM_active)**2, axis=(1,2,3)))
+            active = active[dist>1e-9]
+    return POVM_reconstruction
+
+
+class IncrementalQDT():
+    """
+    Detector tomography for calibration data that arrives in batches.
+    Keeps a running count tensor for each problem (e.g. each cluster or qubit pair) and, when new counts
+    are added, re-solves the POVM MLE warm-started from the previous reconstruction.
+    Since the previous reconstruction is already close to the new maximum, only a small perturbation is mixed into
+    the warm start (warm_perturb_param), and the iteration converges in far fewer steps than from an ideal guess.
+
+    Optionally a re-solve is skipped when the new counts are consistent with the current reconstruction.
+    This is checked with a likelihood-ratio (G-) test of the counts added since the last solve against the
+    outcome probabilities of the current reconstruction, which costs one probability evaluation.
+    """
+
+    def __init__(self, n_qubits, calibration_states, initial_guess_POVM, n_problems=1,
+                 product_calibration=False, significance=None, warm_perturb_param=1e-4):
+        """
+        n_qubits:               Number of qubits of each problem.
+        calibration_states:     Calibration states of shape (n_calibration_states, dim, dim) shared by all problems.
+                                If product_calibration is True, the one qubit calibration states instead, and the counts
+                                are merged onto the grid of all product states (see merge_calibration_counts).
+        initial_guess_POVM:     POVM object or POVM array used for the first reconstruction, shared or one per problem.
+        n_problems:             Number of independent reconstructions that are kept.
+        significance:           Significance level of the G-test. If None, every update re-solves.
+        warm_perturb_param:     Depolarizing noise mixed into the previous reconstruction for warm starts.
+        """
+        self.n_qubits = n_qubits
+        self.n_problems = n_problems
+        self.product_calibration = product_calibration
+        self.calibration_states = np.asarray(calibration_states, dtype=complex)
+        self.significance = significance
+        self.warm_perturb_param = warm_perturb_param
+        dim = 2**n_qubits
+        if isinstance(initial_guess_POVM, POVM):
+            initial_guess_POVM = initial_guess_POVM.get_POVM()
+        self.POVM_array = np.array(np.broadcast_to(initial_guess_POVM, (n_problems, *np.shape(initial_guess_POVM)[-3:])), dtype=complex)
+        if product_calibration:
+            n_states = len(self.calibration_states)**n_qubits
+        else:
+            n_states = len(self.calibration_states)
+        self.index_counts = np.zeros((n_problems, n_states, dim))
+        self.new_counts = np.zeros((n_problems, n_states, dim))
+        self.is_solved = np.zeros(n_problems, dtype=bool)
+
+    def add_counts(self, index_counts, problems=None):
+        """
+        Adds counts of shape (len(problems), n_calibration_states, n_outcomes) to the running count tensors.
+        If problems is None, counts for all problems are expected.
+        """
+        if problems is None:
+            problems = np.arange(self.n_problems)
+        problems = np.atleast_1d(problems)
+        index_counts = np.reshape(index_counts, (len(problems), *self.index_counts.shape[1:]))
+        # np.add.at accumulates correctly if a problem is repeated in the same call
+        np.add.at(self.index_counts, problems, index_counts)
+        np.add.at(self.new_counts, problems, index_counts)
+
+    def _probabilities(self, problems):
+        """
+        Outcome probabilities of the current reconstruction for each calibration state, shape (len(problems), n_states, n_outcomes).
+        """
+        POVM_array = self.POVM_array[problems]
+        if self.product_calibration:
+            dim = 2**self.n_qubits
+            n_one_qubit_states = len(self.calibration_states)
+            frame = np.transpose(self.calibration_states, axes=[0,2,1]).reshape(n_one_qubit_states, 4)
+            pair_tensor = _operator_to_pair_tensor(POVM_array.reshape(-1, dim, dim), self.n_qubits)
+            p = np.real(_one_qubit_mode_products(pair_tensor, frame, self.n_qubits)).reshape(len(problems), dim, -1)
+            return np.transpose(p, axes=[0,2,1])
+        return np.real(np.einsum('bqij,nji->bnq', POVM_array, self.calibration_states))
+
+    def G_test(self, problems=None):
+        """
+        Likelihood-ratio test of the counts added since the last solve against the current reconstruction.
+        Returns the G statistic and the p-value for each problem. Problems without new counts get p-value 1.
+        """
+        if problems is None:
+            problems = np.arange(self.n_problems)
+        problems = np.atleast_1d(problems)
+        new_counts = self.new_counts[problems]
+        p = np.clip(self._probabilities(problems), 1e-12, None)
+        n_shots = np.sum(new_counts, axis=-1, keepdims=True)
+        expected = n_shots * p / np.sum(p, axis=-1, keepdims=True)
+        terms = np.where(new_counts > 0, new_counts * np.log(np.divide(new_counts, expected, out=np.ones(p.shape), where=new_counts > 0)), 0)
+        G = 2*np.sum(terms, axis=(1,2))
+        dof = np.sum(n_shots[..., 0] > 0, axis=1) * (self.index_counts.shape[-1] - 1)
+        p_value = np.ones(len(problems))
+        has_counts = dof > 0
+        p_value[has_counts] = sp.stats.chi2.sf(G[has_counts], dof[has_counts])
+        return G, p_value
+
+    def update(self, force=False):
+        """
+        Re-solves all problems with new counts. Unsolved problems start from the initial guess, solved problems
+        are warm-started from their previous reconstruction. If a significance level is set and force is False,
+        problems whose new counts pass the G-test are not re-solved, and their new counts are kept for the next test.
+        Returns the indices of the problems that were re-solved.
+        """
+        has_new_counts = np.sum(self.new_counts, axis=(1,2)) > 0
+        to_solve = has_new_counts.copy()
+        if self.significance is not None and not force:
+            warm = np.flatnonzero(has_new_counts & self.is_solved)
+            if len(warm) > 0:
+                _, p_value = self.G_test(warm)
+                to_solve[warm[p_value >= self.significance]] = False
+        cold = np.flatnonzero(to_solve & ~self.is_solved)
+        warm = np.flatnonzero(to_solve & self.is_solved)
+        for problems, perturb_param in [(cold, 0.01), (warm, self.warm_perturb_param)]:
+            if len(problems) == 0:
+                continue
+            if self.product_calibration:
+                POVM_list = POVM_MLE_product_batch(self.n_qubits, self.index_counts[problems], self.calibration_states, self.POVM_array[problems], perturb_param=perturb_param)
+            else:
+                POVM_list = POVM_MLE_batch(self.n_qubits, self.index_counts[problems], self.calibration_states, self.POVM_array[problems], perturb_param=perturb_param)
+            self.POVM_array[problems] = np.array([povm.get_POVM() for povm in POVM_list])
+        solved = np.flatnonzero(to_solve)
+        self.new_counts[solved] = 0
+        self.is_solved[solved] = True
+        return solved
+
+    def get_POVM_list(self):
+        """
+        Returns the current reconstructions as an array of POVM objects.
+        """
+        return np.array([POVM(povm) for povm in self.POVM_array])
+
+
 def POVM_convergence(POVM_reconstruction,POVM_reconstruction_old):
     """
     Computes the matrix norm of the difference of each element in the POVM.
@@ -181,42 +604,54 @@ def experimental_QDT(n_qubits,n_calibration_shots_each,exp_dictionary,n_cores =
     return reconstructed_POVM_list
 
 
-def downconvert_QDT_counts(index_counts,to_qubits,):
+def marginalize_QDT_counts(index_counts, keep_qubits):
     """
-    Converts any size index counts down to the qubit size desired. It removed qubits from the left in binary counting. 
-    
-    For a step by step explenation, paste the follwing code into a notebook or otherwise. 
-    
-    
-    print("Downconversion happens in 3 steps;") 
-    print(" 1) Outcomes")
-    print(" 2) Calibration states")
-    print(" 3) POVMs")
-    # n_qubits is the target qubit size. 
+    Marginalizes Pauli QDT index counts to any subset of qubits in one reshape-and-sum.
 
-    print("Step by step explaination of what happenes. Initial list created simplified 2 qubit structure." )
-    arr=np.reshape(np.arange(9*12*4),(9,12,4))
-    print( "Array has shape 9*12*4,  9 POVMs (xx, xy, ..) 12 calibration states, 4 outcomes (for simplicity)" )
+    The counts are indexed as (POVM, calibration state, outcome), where each index is the
+    tensor product (kron) order of 3 Pauli POVMs, 6 Pauli eigenstates and 2 outcomes per qubit.
+    Splitting every index into its per-qubit digits turns the marginalization into a sum over
+    the axes of the dropped qubits.
 
-    print(f'Select outcome of first POVM (XX) \n{arr[i]}')
-    print("Sum over calibration states (They go x+x+, x+x- ,...) so every 6.")
-    print(np.array([np.sum(arr[0,j::6**n_qubits],axis=0) for j in range(6**n_qubits) ]))
-    print("Perform for each of these rows sum over every second outcome")
-    print(np.array([np.sum(np.array([np.sum(arr[0,j::6**n_qubits],axis=0)[k::2**n_qubits] for k in range(2**n_qubits)]),axis=1) for j in range(6**n_qubits) ]))
-        
-    print("Now do this for each of the POVMS separatly")    
-    arr_2 = np.array([np.array([np.sum(np.array([np.sum(arr[k,i::6**n_qubits],axis=0)[j::2**n_qubits] for j in range(2**n_qubits)]),axis=1) for i in range(6**n_qubits)]) for k in range(len(arr))])
-    print(arr_2)
+    Args:
+        index_counts (ndarray): Counts of shape (3**n, 6**n, 2**n).
+        keep_qubits (array_like): Qubit labels to keep, with labels running [n-1, ..., 0] from left to right.
+            The reduced system keeps the same left-to-right order.
 
-    # Downconvert POVM
-    print("In the final step we need to downconver the POVMs, XX, XY, XZ, YX, so every 3rd POVM should be summed")
-    arr_3 = np.array([np.sum(arr_2[i::3**n_qubits],axis=0) for i in range(3**n_qubits)])
-    print(arr_3)
+    Returns:
+        reduced_counts (ndarray): Counts of shape (3**k, 6**k, 2**k), k = len(keep_qubits).
+        calibration_index_map (ndarray): For every full calibration state index, the index of the reduced calibration state.
+        POVM_index_map (ndarray): For every full POVM index, the index of the reduced POVM.
     """
-    
-    arr_1 = np.array([np.array([np.sum(np.array([np.sum(index_counts[k,i::6**to_qubits],axis=0)[j::2**to_qubits] for j in range(2**to_qubits)]),axis=1) for i in range(6**to_qubits)]) for k in range(len(index_counts))])
-    arr_2 = np.array([np.sum(arr_1[i::3**to_qubits],axis=0) for i in range(3**to_qubits)])
-    return arr_2
+    index_counts = np.asarray(index_counts)
+    n_qubits = int(np.log2(index_counts.shape[-1]))
+    keep_qubits = np.sort(np.atleast_1d(keep_qubits))[::-1]
+    if len(np.unique(keep_qubits)) != len(keep_qubits) or np.any(keep_qubits < 0) or np.any(keep_qubits >= n_qubits):
+        raise ValueError(f'Invalid qubit labels {keep_qubits} for {n_qubits} qubits.')
+    keep_index = n_qubits - 1 - keep_qubits # Position of the qubits from the left
+    drop_index = np.setdiff1d(np.arange(n_qubits), keep_index)
+    n_keep = len(keep_index)
+
+    tensor = index_counts.reshape((3,)*n_qubits + (6,)*n_qubits + (2,)*n_qubits)
+    drop_axes = tuple(np.concatenate([drop_index, n_qubits + drop_index, 2*n_qubits + drop_index]))
+    reduced_counts = np.sum(tensor, axis=drop_axes).reshape(3**n_keep, 6**n_keep, 2**n_keep)
+
+    def index_map(base):
+        # Digits of every full index, recombined from the kept positions only.
+        digits = np.array(np.unravel_index(np.arange(base**n_qubits), (base,)*n_qubits))
+        return np.ravel_multi_index(digits[keep_index], (base,)*n_keep) if n_keep > 0 else np.zeros(base**n_qubits, dtype=int)
+
+    return reduced_counts, index_map(6), index_map(3)
+
+
+def downconvert_QDT_counts(index_counts,to_qubits,):
+    """
+    Converts any size index counts down to the qubit size desired. It removed qubits from the left in binary counting,
+    i.e. the rightmost to_qubits qubits (labels to_qubits-1, ..., 0) are kept.
+    See marginalize_QDT_counts for general qubit subsets.
+    """
+    reduced_counts, _, _ = marginalize_QDT_counts(index_counts, np.arange(to_qubits))
+    return reduced_counts
 
 if __name__=="__main__":
     main()
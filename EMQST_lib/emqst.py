@@ -5,6 +5,7 @@ import matplotlib.pyplot as plt
 from datetime import datetime
 import time
 from scipy.optimize import curve_fit
+from joblib import Parallel, delayed
 
 
 from EMQST_lib import support_functions as sf
@@ -33,23 +34,7 @@ def emqst(n_qubits,n_QST_shots_each,n_calibration_shots_each,true_state_list,
 
     
 
-    # Check if restuls exist:
-    check_path='results'
-    path_exists=os.path.exists(check_path)
-    if not path_exists:
-        print("Created results dictionary.")
-        os.makedirs('results')
-
-
-
-    # Generate new dictionary for current run
-    now=datetime.now()
-    now_string = now.strftime("%Y-%m-%d_%H-%M-%S_")
-    dir_name= now_string+str(uuid.uuid4())
-
-
-    data_path=f'results/{dir_name}'
-    os.mkdir(data_path)
+    data_path = create_data_path()
 
     with open(f'{data_path}/experimental_settings.npy','wb') as f:
         np.save(f,exp_dictionary)
@@ -85,43 +70,8 @@ def emqst(n_qubits,n_QST_shots_each,n_calibration_shots_each,true_state_list,
         noise_mode=0
         print("Noise mode is disabled as experimental measurements are performed.")
 
-    if noise_mode:
-        print(f'Synthetic noise mode {noise_mode}.')
-        if  n_qubits<=2:
-            noisy_POVM_list=np.array([POVM.generate_noisy_POVM(povm,noise_mode) for povm in POVM_list])
-            
-        else: # Only depolarizing noise is implemented for more than 2 qubits
-            noisy_POVM_list=np.array([POVM.depolarized_POVM(povm) for povm in POVM_list])
-    else:
-        noisy_POVM_list=POVM_list
-        print("No synthetic noise.")
-    dt_start=time.time()
-    
-    reconstructed_POVM_list = dt.device_tomography(n_qubits,n_calibration_shots_each,noisy_POVM_list,calibration_states,n_cores=n_cores, bool_exp_meaurements=bool_exp_measurements,exp_dictionary=exp_dictionary,initial_guess_POVM=POVM_list,calibration_angles=calibration_angles)
-
-    dt_end = time.time()
-    print(f'Runtime of DT reconstruction {dt_end - dt_start}')
-    DT_settings={
-        "n_qubits": n_qubits,
-        "calibration_states": calibration_states,
-        "n_calibration_shots": n_calibration_shots_each,
-        "initial_POVM": POVM_list,
-        "reconstructed_POVM_list": reconstructed_POVM_list,
-        "bool_exp_meaurements": bool_exp_measurements,
-        "noise_mode": noise_mode,
-        "noisy_POVM_list" : noisy_POVM_list,
-        "reconstructed_POVM_matrix":  np.array([povm.get_POVM() for povm in reconstructed_POVM_list])
-    }
-
-    with open(f'{data_path}/DT_settings.npy','wb') as f:
-        np.save(f,DT_settings)
-
-    
-
-    for i in range (len(reconstructed_POVM_list)):
-        print(f'Distance between reconstructed and noisy POVM: {sf.POVM_distance(reconstructed_POVM_list[i].get_POVM(),noisy_POVM_list[i].get_POVM())}')
-
-    print("POVM calibration complete.\n----------------------------")
+    noisy_POVM_list, reconstructed_POVM_list = device_calibration(n_qubits,n_calibration_shots_each,POVM_list,calibration_states,calibration_angles,
+                                                                  noise_mode,bool_exp_measurements,exp_dictionary,n_cores,data_path)
     
     # Define placeholder variables in case QST is not run. 
     uncorrected_infidelity=np.empty(0)
@@ -132,48 +82,15 @@ def emqst(n_qubits,n_QST_shots_each,n_calibration_shots_each,true_state_list,
     if n_QST_shots_each == 0:
         print("QST not performed.")
     else:       
-        qst=QST(POVM_list,true_state_list,n_QST_shots_each,n_qubits,bool_exp_measurements,exp_dictionary,n_cores=n_cores,noise_corrected_POVM_list=reconstructed_POVM_list,true_state_angles_list=true_state_angles_list)
-        qst.generate_data(override_POVM_list=noisy_POVM_list)
-        
-        # Save data settings
-        qst.save_QST_settings(data_path,noise_mode)
-        print("Generated data.")
-
-        print("Start corrected QST.")
-        if method=="MLE":
-            qst.perform_MLE(override_POVM_list=reconstructed_POVM_list)
-        elif method=="BME":
-            qst.perform_BME(override_POVM_list=reconstructed_POVM_list)
-        corrected_infidelity=qst.get_infidelity()
-        corrected_rho_estm=qst.get_rho_estm()
-
-        print("Corrected QST complete.\n----------------------------")
-        
-        # Run comparative BME with uncorrected POVMs
-        
-        if perform_unmitigated_QST:
-            print("Start uncorrected QST.")
-            if method=="MLE":
-                qst.perform_MLE()
-            elif method=="BME":
-                qst.perform_BME()
-            uncorrected_infidelity=qst.get_infidelity()
-            uncorrected_rho_estm=qst.get_rho_estm()
-            
-            
-            print("Uncorrected QST complete.\n----------------------------") 
+        corrected_infidelity,corrected_rho_estm,uncorrected_infidelity,uncorrected_rho_estm = run_QST(
+            n_qubits,POVM_list,noisy_POVM_list,reconstructed_POVM_list,true_state_list,n_QST_shots_each,method,
+            bool_exp_measurements,exp_dictionary,n_cores,noise_mode,true_state_angles_list,perform_unmitigated_QST,data_path)
 
         n_averages=len(true_state_list)
         sample_step=np.arange(len(corrected_infidelity[0]))
         corrected_average=np.sum(corrected_infidelity,axis=0)/n_averages
         uncorrected_average=np.sum(uncorrected_infidelity,axis=0)/n_averages
 
-        with open(f'{data_path}/QST_results.npy','wb') as f:
-            np.save(f,corrected_infidelity )
-            np.save(f,uncorrected_infidelity)
-            np.save(f,corrected_rho_estm)
-            np.save(f,uncorrected_rho_estm)
-
         
         # Generate plots if not run on a cluster.
         if n_cores < 10 and method == "BME" and perform_unmitigated_QST and n_QST_shots_each > 999:
@@ -213,6 +130,193 @@ def emqst(n_qubits,n_QST_shots_each,n_calibration_shots_each,true_state_list,
     return result
 
 
+def create_data_path():
+    """
+    Creates a new uniquely named folder for the current run in the results folder.
+    returns the path of the folder
+    """
+    # Check if restuls exist:
+    check_path='results'
+    path_exists=os.path.exists(check_path)
+    if not path_exists:
+        print("Created results dictionary.")
+        os.makedirs('results')
+
+    # Generate new dictionary for current run
+    now=datetime.now()
+    now_string = now.strftime("%Y-%m-%d_%H-%M-%S_")
+    dir_name= now_string+str(uuid.uuid4())
+
+    data_path=f'results/{dir_name}'
+    os.mkdir(data_path)
+    return data_path
+
+
+def device_calibration(n_qubits,n_calibration_shots_each,POVM_list,calibration_states,calibration_angles,
+                       noise_mode,bool_exp_measurements,exp_dictionary,n_cores=1,data_path=None):
+    """
+    Calibration stage of emqst. Applies the synthetic noise mode to the ideal POVMs and performs device tomography.
+    The DT settings are saved in data_path if it is given.
+    For more than 2 qubits the noise modes of POVM.generate_noisy_POVM_list are used: modes 1-4 and 7 apply the local
+    and depolarizing channels, while modes 5 and 6 apply POVM.depolarized_POVM.
+
+    returns noisy POVM list, reconstructed POVM list
+    """
+    if noise_mode:
+        print(f'Synthetic noise mode {noise_mode}.')
+        if  n_qubits<=2:
+            noisy_POVM_list=np.array([POVM.generate_noisy_POVM(povm,noise_mode) for povm in POVM_list])
+            
+        else: # Noise is applied to all POVMs in a single batched channel application
+            noisy_POVM_list=POVM.generate_noisy_POVM_list(POVM_list,noise_mode)
+    else:
+        noisy_POVM_list=POVM_list
+        print("No synthetic noise.")
+    dt_start=time.time()
+    
+    reconstructed_POVM_list = dt.device_tomography(n_qubits,n_calibration_shots_each,noisy_POVM_list,calibration_states,n_cores=n_cores, bool_exp_meaurements=bool_exp_measurements,exp_dictionary=exp_dictionary,initial_guess_POVM=POVM_list,calibration_angles=calibration_angles)
+
+    dt_end = time.time()
+    print(f'Runtime of DT reconstruction {dt_end - dt_start}')
+    DT_settings={
+        "n_qubits": n_qubits,
+        "calibration_states": calibration_states,
+        "n_calibration_shots": n_calibration_shots_each,
+        "initial_POVM": POVM_list,
+        "reconstructed_POVM_list": reconstructed_POVM_list,
+        "bool_exp_meaurements": bool_exp_measurements,
+        "noise_mode": noise_mode,
+        "noisy_POVM_list" : noisy_POVM_list,
+        "reconstructed_POVM_matrix":  np.array([povm.get_POVM() for povm in reconstructed_POVM_list])
+    }
 
-      
+    if data_path is not None:
+        with open(f'{data_path}/DT_settings.npy','wb') as f:
+            np.save(f,DT_settings)
+
+    POVM_distances = sf.POVM_distance_batch(np.array([povm.get_POVM() for povm in reconstructed_POVM_list]),np.array([povm.get_POVM() for povm in noisy_POVM_list]))
+    for i in range (len(reconstructed_POVM_list)):
+        print(f'Distance between reconstructed and noisy POVM: {POVM_distances[i]}')
 
+    print("POVM calibration complete.\n----------------------------")
+    return noisy_POVM_list, reconstructed_POVM_list
+
+
+def run_QST(n_qubits,POVM_list,noisy_POVM_list,reconstructed_POVM_list,true_state_list,n_QST_shots_each,method,
+            bool_exp_measurements,exp_dictionary,n_cores=1,noise_mode=0,true_state_angles_list=None,perform_unmitigated_QST=True,data_path=None,seed=None):
+    """
+    QST stage of emqst. Generates data with the noisy POVMs and reconstructs the states with the reconstructed POVMs,
+    and optionally with the ideal POVMs for comparison. The QST settings and results are saved in data_path if it is given.
+    If a seed is given, the global random state is seeded before the data is generated.
+
+    returns corrected infidelity, corrected rho estimates, uncorrected infidelity, uncorrected rho estimates
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    uncorrected_infidelity=np.empty(0)
+    uncorrected_rho_estm=np.empty(0)
+
+    qst=QST(POVM_list,true_state_list,n_QST_shots_each,n_qubits,bool_exp_measurements,exp_dictionary,n_cores=n_cores,noise_corrected_POVM_list=reconstructed_POVM_list,true_state_angles_list=true_state_angles_list)
+    qst.generate_data(override_POVM_list=noisy_POVM_list)
+    
+    # Save data settings
+    if data_path is not None:
+        qst.save_QST_settings(data_path,noise_mode)
+    print("Generated data.")
+
+    print("Start corrected QST.")
+    if method=="MLE":
+        qst.perform_MLE(override_POVM_list=reconstructed_POVM_list)
+    elif method=="BME":
+        qst.perform_BME(override_POVM_list=reconstructed_POVM_list)
+    corrected_infidelity=qst.get_infidelity()
+    corrected_rho_estm=qst.get_rho_estm()
+
+    print("Corrected QST complete.\n----------------------------")
+    
+    # Run comparative BME with uncorrected POVMs
+    if perform_unmitigated_QST:
+        print("Start uncorrected QST.")
+        if method=="MLE":
+            qst.perform_MLE()
+        elif method=="BME":
+            qst.perform_BME()
+        uncorrected_infidelity=qst.get_infidelity()
+        uncorrected_rho_estm=qst.get_rho_estm()
+        
+        print("Uncorrected QST complete.\n----------------------------") 
+
+    if data_path is not None:
+        with open(f'{data_path}/QST_results.npy','wb') as f:
+            np.save(f,corrected_infidelity )
+            np.save(f,uncorrected_infidelity)
+            np.save(f,corrected_rho_estm)
+            np.save(f,uncorrected_rho_estm)
+    return corrected_infidelity,corrected_rho_estm,uncorrected_infidelity,uncorrected_rho_estm
+
+
+def emqst_batch(n_qubits,n_calibration_shots_each,jobs,calibration_mode=None,bool_exp_measurements=False,exp_dictionary={},
+                n_cores=1,perform_unmitigated_QST=True):
+    """
+    Runs a sweep of EMQST jobs that share the detector calibration.
+    Device tomography is performed once for each distinct noise mode in the jobs, and the reconstructed POVMs are
+    shared by all jobs with that noise mode. The QST jobs are then run in parallel over n_cores.
+    All results are stored in a single results folder, with the DT settings of each noise mode in
+    noise_mode_<noise_mode> and the QST settings and results of each job in job_<index>.
+
+    jobs                    List of dictionaries with the keys
+                            "true_state_list"           List of true states.
+                            "n_QST_shots_each"          # shots in QST reconstruction for each POVM used.
+                            "method"                    "MLE" (default) or "BME".
+                            "noise_mode"                Synthetic noise mode, default 0.
+                            "true_state_angles_list"    Optional angle representation of the true states.
+    Other arguments are as in emqst.
+
+    returns list of result dictionaries of emqst, one for each job
+    """
+    data_path = create_data_path()
+    with open(f'{data_path}/experimental_settings.npy','wb') as f:
+        np.save(f,exp_dictionary)
+
+    POVM_list=POVM.generate_Pauli_POVM(n_qubits)
+    if calibration_mode is None or calibration_mode == 'Pauli':
+        calibration_states,calibration_angles=sf.get_calibration_states(n_qubits)    
+    elif calibration_mode == 'SIC':
+        calibration_states,calibration_angles=sf.get_calibration_states(n_qubits,"SIC")
+
+    # If experimental measurements are set, do not apply noise methods.
+    job_noise_modes = [0 if bool_exp_measurements else job.get("noise_mode",0) for job in jobs]
+    calibrations = {}
+    for noise_mode in dict.fromkeys(job_noise_modes):
+        calibration_path = f'{data_path}/noise_mode_{noise_mode}'
+        os.mkdir(calibration_path)
+        calibrations[noise_mode] = device_calibration(n_qubits,n_calibration_shots_each,POVM_list,calibration_states,calibration_angles,
+                                                      noise_mode,bool_exp_measurements,exp_dictionary,n_cores,calibration_path)
+    print(f'{len(calibrations)} calibration(s) shared by {len(jobs)} QST jobs.')
+
+    job_paths = [f'{data_path}/job_{i}' for i in range(len(jobs))]
+    for job_path in job_paths:
+        os.mkdir(job_path)
+    # Each job is seeded from the global random state so that the sweep is reproducible.
+    seeds = np.random.randint(2**31, size=len(jobs))
+    # Experimental measurements are performed one job at a time.
+    n_jobs = 1 if bool_exp_measurements else n_cores
+    QST_results = Parallel(n_jobs=n_jobs)(delayed(run_QST)(n_qubits,POVM_list,*calibrations[noise_mode],job["true_state_list"],job["n_QST_shots_each"],
+                                                          job.get("method","MLE"),bool_exp_measurements,exp_dictionary,1,noise_mode,
+                                                          job.get("true_state_angles_list"),perform_unmitigated_QST,job_path,seed)
+                                          for job, noise_mode, job_path, seed in zip(jobs, job_noise_modes, job_paths, seeds))
+
+    results = []
+    for noise_mode, QST_result in zip(job_noise_modes, QST_results):
+        noisy_POVM_list, reconstructed_POVM_list = calibrations[noise_mode]
+        corrected_infidelity,corrected_rho_estm,uncorrected_infidelity,uncorrected_rho_estm = QST_result
+        results.append({
+            "corrected_infidelity" : corrected_infidelity,
+            "uncorrected_infidelity": uncorrected_infidelity,
+            "corrected_rho_estm" : corrected_rho_estm,
+            "uncorrected_rho_estm" : uncorrected_rho_estm,
+            "reconstructed_POVM" : np.array([povm.get_POVM() for povm in reconstructed_POVM_list]),
+            "synthetic_POVM": np.array([povm.get_POVM() for povm in noisy_POVM_list])
+        })
+    print("EMQST batch complete.")
+    return results
@@ -2,7 +2,9 @@ import numpy as np
 import scipy as sp
 from EMQST_lib import support_functions as sf
 from EMQST_lib import overlapping_tomography as ot
-from EMQST_lib.povm import POVM
+from EMQST_lib.povm import POVM, get_POVM_buffer, get_statevector_histogram
+from EMQST_lib.outcomes import ClusterCounts
+from EMQST_lib.mps import MPS
 from functools import reduce
 
 
@@ -17,7 +19,7 @@ def measurement(n_shots, povm, rho, bool_exp_measurements = False, exp_dictionar
             if state_angle_representation is None:
                 print("Experimental measurement: No angle representation has been given! Returning None.")
                 return np.array([None]*n_shots) 
-            outcome_index = exp_dictionary["standard_measurement_function"](n_shots,povm.get_angles(),state_angle_representation,exp_dictionary)
+            outcome_index = experimental_measurements(n_shots, [povm.get_angles()], [state_angle_representation], exp_dictionary)[0]
         else:
             outcome_index = custom_measurement_function(n_shots,povm.get_angles(),exp_dictionary)
     else:
@@ -26,6 +28,20 @@ def measurement(n_shots, povm, rho, bool_exp_measurements = False, exp_dictionar
     return outcome_index
 
 
+def experimental_measurements(n_shots, measurement_angles_list, state_angles_list, exp_dictionary):
+    """
+    Performs a list of experimental measurement settings, one for each pair of measurement and state angles.
+    If exp_dictionary contains a "measurement_backend" (see backend.MeasurementBackend) all settings are submitted as one batch,
+    otherwise exp_dictionary["standard_measurement_function"] is called for one setting at a time.
+    The caller owns the backend and is responsible for shutting it down, e.g. with backend.shutdown() or by using it in a with block.
+    Returns a list with the outcomes of each setting.
+    """
+    if exp_dictionary.get("measurement_backend") is not None:
+        jobs = [(n_shots, measurement_angles, state_angles) for measurement_angles, state_angles in zip(measurement_angles_list, state_angles_list)]
+        return exp_dictionary["measurement_backend"].run(jobs)
+    return [exp_dictionary["standard_measurement_function"](n_shots, measurement_angles, state_angles, exp_dictionary) for measurement_angles, state_angles in zip(measurement_angles_list, state_angles_list)]
+
+
 def simulated_measurement(n_shots,povm,rho, return_frequencies = False):
     """
     Takes in number of shots required from a single POVM on a single quantum states.
@@ -51,6 +67,28 @@ def simulated_measurement(n_shots,povm,rho, return_frequencies = False):
     else:    
         return outcome_list
 
+def simulated_measurement_counts(n_shots, povm_list, rho_list, rng = None):
+    """
+    Simulates n_shots measurements of every POVM on every state and returns only the outcome counts.
+    All probabilities are computed in a single contraction and the counts are drawn with vectorized multinomial sampling,
+    such that no individual outcomes are created.
+    Args:
+        n_shots (int): Number of shots for each POVM and state pair.
+        povm_list (list/POVMArray): List of POVMs with the same number of outcomes.
+        rho_list (ndarray): States of shape (n_states, dim, dim).
+        rng (numpy.random.Generator, optional): Random generator. By default it is seeded from the global numpy random state.
+    Returns:
+        ndarray: Counts of shape (n_povms, n_states, n_outcomes).
+    """
+    if rng is None:
+        rng = np.random.default_rng(np.random.randint(2**31))
+    povm_buffer = get_POVM_buffer(povm_list)
+    probabilities = np.real(np.einsum('iqab,jba->ijq', povm_buffer, np.asarray(rho_list), optimize=True))
+    probabilities = np.clip(probabilities, 0, None)
+    probabilities /= np.sum(probabilities, axis=-1, keepdims=True)
+    return rng.multinomial(n_shots, probabilities)
+
+
 def outcomes_to_frequencies(outcomes,min_lenght):
     # Count the occurrences of each outcome
     unique_outcomes, frequencies = np.unique(outcomes, return_counts=True)
@@ -79,14 +117,37 @@ def measure_separable_state(n_shots, povm_array, rho_array):
     Returns:
     - outcomes (ndarray): A numpy array of shape (n_shots, n_qubits) containing the outcomes for each qubit.
     """
-    
-    n_qubits = len(rho_array)
-    outcomes_temp = np.array([simulated_measurement(n_shots, povm_array[i], rho_array[i]) for i in range(n_qubits)])
-    # Change axis such that order matches what is expected from experiments.
-    outcomes = np.moveaxis(outcomes_temp, 0, -1)
-    return outcomes
+    return measure_separable_states(n_shots, get_POVM_buffer(povm_array), np.asarray(rho_array)[None])[0]
 
 
+def measure_separable_states(n_shots, povm_stack, rho_stack):
+    """
+    Vectorized measure_separable_state for a stack of rows, e.g. all hashed instructions.
+    The single qubit histograms of all rows and qubits are computed in one contraction, and the outcomes of the
+    whole (rows x qubits x shots) block are sampled with one uniform draw and a broadcasted comparison with the cumulative histograms.
+    The uniform draw consumes the global random state in the same order as calling measure_separable_state row by row.
+
+    Parameters:
+    - n_shots (int): The number of shots for each row.
+    - povm_stack (ndarray): Single qubit POVM elements of shape (n_rows, n_qubits, n_outcomes, 2, 2),
+                            or (n_qubits, n_outcomes, 2, 2) if all rows are measured with the same POVMs.
+    - rho_stack (ndarray): Single qubit states of shape (n_rows, n_qubits, 2, 2),
+                           or (n_qubits, 2, 2) if all rows measure the same states.
+
+    Returns:
+    - outcomes (ndarray): A numpy array of shape (n_rows, n_shots, n_qubits) containing the outcomes for each qubit.
+    """
+    histograms = np.real(np.einsum('...ijk,...kj->...i', povm_stack, rho_stack))
+    if histograms.ndim == 2: # Neither POVMs nor states are given per row
+        histograms = histograms[None]
+    cumulative_sum = np.cumsum(histograms, axis=-1)
+    r = np.random.random((*histograms.shape[:2], n_shots))
+    # Same as np.searchsorted(cumulative_sum, r), the outcome is the number of cumulative probabilities below r.
+    outcomes = np.zeros(r.shape, dtype=int)
+    for k in range(cumulative_sum.shape[-1]):
+        outcomes += cumulative_sum[..., k, None] < r
+    # Change axis such that order matches what is expected from experiments.
+    return np.moveaxis(outcomes, 1, -1)
 
 
 def measure_hashed_calibration_states(n_shots, povm_array, one_qubit_calibration_states, hashed_QDT_instructions, experimental_dictionary = {"Experimental_run": False}):
@@ -115,12 +176,12 @@ def measure_hashed_calibration_states(n_shots, povm_array, one_qubit_calibration
         one_qubit_calibration_angles = experimental_dictionary["one_qubit_calibration_angles"]
         comp_measurement_angles = experimental_dictionary["comp_measurement_angles"]
         hashed_state_angles = np.array([ot.instruction_equivalence(instruction, possible_instruction_array, one_qubit_calibration_angles) for instruction in hashed_QDT_instructions])
-        outcomes = np.array([experimental_dictionary["standard_measurement_function"](n_shots, comp_measurement_angles, state_angles, experimental_dictionary) for state_angles in hashed_state_angles])
+        outcomes = np.array(experimental_measurements(n_shots, [comp_measurement_angles]*len(hashed_state_angles), hashed_state_angles, experimental_dictionary))
     else:
-        # Create hashed calibration states
-        hashed_calib_states = np.array([ot.calibration_states_from_instruction(instruction, one_qubit_calibration_states) for instruction in hashed_QDT_instructions])
+        # Create hashed calibration states, the instructions are the indices of the calibration states.
+        hashed_calib_states = np.asarray(one_qubit_calibration_states)[np.asarray(hashed_QDT_instructions, dtype=int)]
         # Simulate measurements
-        outcomes = np.array([measure_separable_state(n_shots,povm_array, rho_array) for rho_array in hashed_calib_states])
+        outcomes = measure_separable_states(n_shots, get_POVM_buffer(povm_array), hashed_calib_states)
     return outcomes
 
 
@@ -148,24 +209,27 @@ def measure_hashed_POVM(n_shots, rho_array, single_qubit_pauli_6, hashed_QST_ins
         true_state_angles = experimental_dictionary["true_state_angles"]
         single_qubit_measurement_angles = experimental_dictionary["single_qubit_measurement_angles"]
         hashed_POVM_angles = np.array([ot.instruction_equivalence(instruction, possible_instruction_array, single_qubit_measurement_angles) for instruction in hashed_QST_instructions])
-        outcomes = np.array([experimental_dictionary["standard_measurement_function"](n_shots, POVM_angles, true_state_angles, experimental_dictionary) for POVM_angles in hashed_POVM_angles])
+        outcomes = np.array(experimental_measurements(n_shots, hashed_POVM_angles, [true_state_angles]*len(hashed_POVM_angles), experimental_dictionary))
     else:
-        hashed_POVM = np.array([ot.instruction_equivalence(instruction, possible_instruction_array, single_qubit_pauli_6) for instruction in hashed_QST_instructions])
+        # Index of each instruction in the possible instructions, used to pick the POVM elements of each qubit.
+        instruction_index = np.argmax(np.asarray(hashed_QST_instructions)[..., None] == possible_instruction_array, axis=-1)
+        hashed_POVM = get_POVM_buffer(single_qubit_pauli_6)[instruction_index]
         # Measure with the hashed POVMs
-        outcomes = np.array([measure_separable_state(n_shots, povm, rho_array) for povm in hashed_POVM])
+        outcomes = measure_separable_states(n_shots, hashed_POVM, np.asarray(rho_array))
 
     return outcomes
 
 
 
-def measure_clusters(n_shots, povm_array, factorized_rho, cluster_size):
+def measure_clusters(n_shots, povm_array, factorized_rho, cluster_size, packed = False):
     """
-    This function takes in a factorized density matrix and measures it using the cluster noise povm_list.
+    This function takes in a factorized density matrix (or factorized statevectors) and measures it using the cluster noise povm_list.
+    The outcomes are stored as uint8, and if packed is True the qubit axis is bit-packed with np.packbits (see outcomes.PackedOutcomes).
     """
 
     n_qubits = np.sum(cluster_size)
     n_clusters = len(cluster_size)
-    full_outcomes = np.zeros((n_shots, n_qubits),dtype = int)
+    full_outcomes = np.zeros((n_shots, n_qubits),dtype = np.uint8)
     for i in range(n_clusters):
 
         sub_rho = factorized_rho[sum(cluster_size[:i]):sum(cluster_size[:i+1])]
@@ -175,18 +239,124 @@ def measure_clusters(n_shots, povm_array, factorized_rho, cluster_size):
         outcome = simulated_measurement(n_shots, povm_array[i], rho)
 
         # Add outcomes to the full_outcomes array in binary form
-        full_outcomes[:,sum(cluster_size[:i]):sum(cluster_size[:i+1])] = sf.decimal_to_binary_array(outcome, cluster_size[i])
+        full_outcomes[:,sum(cluster_size[:i]):sum(cluster_size[:i+1])] = sf.decimal_to_binary_array(outcome, cluster_size[i], dtype = np.uint8)
 
         # Concatinate all outcomes into a single array
-
+    if packed:
+        return np.packbits(full_outcomes, axis = -1)
     return full_outcomes 
 
 
 
+def measure_hashed_clusters(n_shots, povm_array, one_qubit_calibration_states, hashed_QDT_instructions, cluster_size, packed = False, max_block_size = 2**24):
+    """
+    Performs measure_clusters for all hashed calibration states at once.
+    A cluster of k qubits only sees 4**k distinct local calibration patterns, while there are many hashed rows. The histogram of each cluster
+    is therefore computed once for each distinct local pattern and looked up for every row, which removes the tensor products and
+    histogram contractions from the row loop. The outcomes are sampled in blocks of rows with one uniform draw per block, which consumes
+    the global random state in the same order as calling measure_clusters row by row.
+    Args:
+        n_shots (int): Number of shots for each row.
+        povm_array (list): Cluster POVMs, one for each cluster.
+        one_qubit_calibration_states (ndarray): One qubit calibration states.
+        hashed_QDT_instructions (ndarray): Index of the calibration state of each qubit, shape (n_rows, n_qubits).
+        cluster_size (list): Number of qubits in each cluster.
+        packed (bool): If True the outcomes are returned bit-packed along the qubit axis (see outcomes.PackedOutcomes).
+        max_block_size (int): Maximal number of uniforms drawn at once, limits memory usage.
+    Returns:
+        ndarray: Outcomes of shape (n_rows, n_shots, n_qubits) as uint8, or the packed outcomes of shape (n_rows, n_shots, ceil(n_qubits/8)).
+    """
+    instructions = np.asarray(hashed_QDT_instructions, dtype=int)
+    one_qubit_calibration_states = np.asarray(one_qubit_calibration_states)
+    n_rows, n_qubits = instructions.shape
+    n_clusters = len(cluster_size)
+    cluster_index_array = np.concatenate([[0], np.cumsum(cluster_size)]).astype(int)
+
+    # Cumulative histograms of each distinct local pattern, and the pattern of each row.
+    pattern_index = np.zeros((n_rows, n_clusters), dtype=int)
+    cumulative_sums = []
+    for i in range(n_clusters):
+        local_instructions = instructions[:, cluster_index_array[i]:cluster_index_array[i+1]]
+        patterns, inverse = np.unique(local_instructions, axis=0, return_inverse=True)
+        pattern_index[:, i] = inverse.reshape(-1)
+        histograms = np.array([povm_array[i].get_histogram(reduce(np.kron, one_qubit_calibration_states[pattern])) for pattern in patterns])
+        cumulative_sums.append(np.cumsum(histograms, axis=-1))
+
+    if packed:
+        full_outcomes = np.zeros((n_rows, n_shots, (n_qubits + 7)//8), dtype=np.uint8)
+    else:
+        full_outcomes = np.zeros((n_rows, n_shots, n_qubits), dtype=np.uint8)
+    rows_per_block = max(1, max_block_size//(n_clusters*n_shots))
+    for block_start in range(0, n_rows, rows_per_block):
+        block = slice(block_start, min(block_start + rows_per_block, n_rows))
+        r = np.random.random((block.stop - block.start, n_clusters, n_shots))
+        block_outcomes = np.zeros((block.stop - block.start, n_shots, n_qubits), dtype=np.uint8)
+        for i in range(n_clusters):
+            cumulative_sum = cumulative_sums[i][pattern_index[block, i]]
+            # Same as np.searchsorted(cumulative_sum, r) for each row.
+            outcome = np.zeros(r[:, i].shape, dtype=int)
+            for k in range(cumulative_sum.shape[-1]):
+                outcome += cumulative_sum[:, k, None] < r[:, i]
+            # Add outcomes in binary form
+            size = cluster_index_array[i+1] - cluster_index_array[i]
+            block_outcomes[..., cluster_index_array[i]:cluster_index_array[i+1]] = (outcome[..., None] >> np.arange(size)[::-1]) & 1
+        if packed:
+            full_outcomes[block] = np.packbits(block_outcomes, axis=-1)
+        else:
+            full_outcomes[block] = block_outcomes
+    return full_outcomes
+
+
+def _multinomial_counts(n_shots, povm_elements, rho_stack, rng, state_index = None):
+    """
+    Draws the outcome counts of n_shots measurements of one POVM (given as an array of elements) on a stack of states.
+    If state_index is given, row j is measured on rho_stack[state_index[j]]. Pure states can be given as a stack of statevectors.
+    """
+    if np.ndim(rho_stack) == 2:
+        probabilities = np.clip(get_statevector_histogram(povm_elements, rho_stack), 0, None)
+    else:
+        probabilities = np.clip(np.real(np.einsum('qij,nji->nq', povm_elements, rho_stack, optimize=True)), 0, None)
+    probabilities /= np.sum(probabilities, axis=-1, keepdims=True)
+    if state_index is not None:
+        probabilities = probabilities[state_index]
+    return rng.multinomial(n_shots, probabilities)
+
+
+def measure_clusters_counts(n_shots, povm_array, factorized_rho_array, cluster_size, rng = None):
+    """
+    Counts-native version of measure_clusters for a stack of factorized states, e.g. all hashed calibration states.
+    Instead of sampling every shot, the joint outcome counts of each cluster are drawn with multinomial sampling for all rows at once.
+    Args:
+        n_shots (int): Number of shots for each row.
+        povm_array (list): Cluster POVMs, one for each cluster.
+        factorized_rho_array (ndarray): Single qubit states of shape (n_rows, n_qubits, 2, 2).
+        cluster_size (list): Number of qubits in each cluster.
+        rng (numpy.random.Generator, optional): Random generator. By default it is seeded from the global numpy random state.
+    Returns:
+        ClusterCounts: Counts container with the joint counts of each cluster, shapes (n_rows, 2**cluster_size[i]).
+    """
+    if rng is None:
+        rng = np.random.default_rng(np.random.randint(2**31))
+    factorized_rho_array = np.asarray(factorized_rho_array)
+    n_rows = len(factorized_rho_array)
+    cluster_counts = []
+    start = 0
+    for i, size in enumerate(cluster_size):
+        # Tensor together the cluster states of all rows
+        rho = factorized_rho_array[:, start]
+        for j in range(start + 1, start + size):
+            dim = 2*rho.shape[-1]
+            rho = np.einsum('nij,nkl->nikjl', rho, factorized_rho_array[:, j]).reshape(n_rows, dim, dim)
+        cluster_counts.append(_multinomial_counts(n_shots, povm_array[i].get_POVM(), rho, rng))
+        start += size
+    return ClusterCounts(cluster_counts, cluster_size, seed = rng.integers(2**31))
+
+
 def measure_cluster_QST(n_QST_shots, povm_array, rho_true_array, hashed_QST_instructions,cluster_size):
     """
     Because we have genuine clusted POVMs, we need to apply the rotations to the qubits rather than the POVMs for the meaurements.
     Luckily the instructions are are single qubit rotations, so we can simply create a copy of the factorized rhos and apply the appropriete unitary in accordance with the hashed_QST_instructions.
+    Pure states can be given as statevectors, rho_true_array of shape (n_qubits, 2), which are rotated with matrix-vector products.
     """
     
     possible_instructions = np.array(["X", "Y", "Z"])
@@ -203,21 +373,28 @@ def measure_cluster_QST(n_QST_shots, povm_array, rho_true_array, hashed_QST_inst
     #conjugate_rotation_matrices = np.array([rot_x_to_z.conj().T, rot_y_to_z.conj().T, np.eye(2)]) 
     hashed_unitaries = np.array([ot.instruction_equivalence(hashed_QST_instruction, possible_instructions , rotation_matrices) for hashed_QST_instruction in hashed_QST_instructions])
     #hashed_conjugate_unitaries = ot.instruction_equivalence(hashed_QST_instructions, possible_instructions , conjugate_rotation_matrices)
-    hashed_factorized_rhos = np.einsum('nmij,mjk,nmlk->nmil', hashed_unitaries, rho_true_array,hashed_unitaries.conj()) # Note that the second hashed_unitaries are swapped to perform a transpose. 
+    if np.ndim(rho_true_array) == 2: # Statevectors
+        hashed_factorized_rhos = np.einsum('nmij,mj->nmi', hashed_unitaries, rho_true_array)
+    else:
+        hashed_factorized_rhos = np.einsum('nmij,mjk,nmlk->nmil', hashed_unitaries, rho_true_array,hashed_unitaries.conj()) # Note that the second hashed_unitaries are swapped to perform a transpose. 
     outcomes = np.array([measure_clusters(n_QST_shots, povm_array, rho_array, cluster_size) for rho_array in hashed_factorized_rhos])
     return outcomes 
 
 
 
-def measure_hashed_chunk_QST(n_shots, chunk_size, povm_array, povm_size_array, state_array, state_size_array, hashed_QST_instructions):
+def _hashed_chunk_QST_states(chunk_size, povm_array, povm_size_array, state_array, state_size_array, hashed_QST_instructions):
     """
-    Measures sets of qubits as genuine chunk-size states and POVMs.
-    Assumes that the states and POVMs are already split into chunks of spesificed size. This function is only for QST, as calibration states should always be factorized.
-    n_shots: number of shots used for each possible computational basis measurement, XX, XY, XZ, YX, YY, YZ, ZX, ZY, ZZ etc.
+    Generator over the independent blocks of measure_hashed_chunk_QST. Within a chunk the state factors and POVM clusters are only joined
+    where they overlap, so a chunk splits into connected blocks that end where both a state factor and a POVM cluster end.
+    Each block is rotated and measured on its own, such that product states never build the full chunk density matrix.
+    Most rows share the same local instruction pattern within a block (there are at most 3**block_size patterns),
+    so the rows are grouped by pattern and the rotation is only done once per pattern.
+    For each block it yields the first qubit index and size of the block, the block POVM,
+    the block state rotated by each distinct pattern, shape (n_patterns, 2**block_size, 2**block_size), and the pattern index of every row.
+    Pure states can be given as statevectors, in which case blocks of statevectors are rotated with matrix-vector products
+    and yielded as statevectors of shape (n_patterns, 2**block_size).
     """
     n_qubits = np.sum(state_size_array)
-    n_hashes = len(hashed_QST_instructions)
-    full_outcomes = np.zeros((n_hashes,n_shots, n_qubits) ,dtype = int)
     # Each chunk constitutes chunck_size qubits. We assume that the states and POVMs are already split into chunks of spesificed size.
     # The stratergy is to create chunks of size chunk_size, and then create a geneuine state and POVM on that chunk, and measure it. 
     # Find index to partition the POVM array and state array
@@ -239,37 +416,212 @@ def measure_hashed_chunk_QST(n_shots, chunk_size, povm_array, povm_size_array, s
 
     #conjugate_rotation_matrices = np.array([rot_x_to_z.conj().T, rot_y_to_z.conj().T, np.eye(2)]) 
     
-    hashed_unitaries = np.array([ot.instruction_equivalence(hashed_QST_instruction, possible_instructions , rotation_matrices) for hashed_QST_instruction in hashed_QST_instructions])
-    # These unitaries will have the shape: # (unique measurements x n_qubits)
-    # print(f'Hashed unitaries: {hashed_unitaries.shape}')
-    # print(f'State index array: {state_index_array}' )
+    # Index of each instruction in the possible instructions, shape (n_hashes, n_qubits)
+    instruction_index = np.argmax(np.asarray(hashed_QST_instructions)[..., None] == possible_instructions, axis=-1)
     for i in range(len(povm_index_array)-1): # Loop over chunks
-        # Tensor together objects for current chunk
-        tensored_unitaries = np.array([reduce(np.kron,hashed_unitaries[unitary_index_array[i]:unitary_index_array[i+1]]) for hashed_unitaries in hashed_unitaries])
-        # for unitary in tensored_unitaries:
-        #     print(unitary.shape)
-        if state_index_array[i+1]-state_index_array[i] == 1: # If only single entry in chunk no reduction call is needed.
-            tensored_chunk_rho = state_array[state_index_array[i]]
-        else:
-            tensored_chunk_rho = reduce(np.kron,state_array[state_index_array[i]:state_index_array[i+1]])
-        if povm_index_array[i+1]-povm_index_array[i] == 1: # If only single entry in chunk no reduction call is needed.
-            sub_povm = povm_array[povm_index_array[i]]
-        else:
-            sub_povm = reduce(POVM.tensor_POVM, povm_array[povm_index_array[i]:povm_index_array[i+1]])[0]
-        
-        # Einsum is split into two operations as it is too slow for larger chunk sizes. 
-        # Note that the second hashed_unitaries are swapped to perform a transpose.
-        rotated_rhos = np.einsum('nij,jk,nlk->nil', tensored_unitaries, tensored_chunk_rho,tensored_unitaries.conj(), optimize=True) 
-        
+        # Qubit index (within the chunk) where each state factor and POVM cluster ends.
+        state_ends = np.cumsum(np.asarray(state_size_array[state_index_array[i]:state_index_array[i+1]], dtype=int))
+        povm_ends = np.cumsum(np.asarray(povm_size_array[povm_index_array[i]:povm_index_array[i+1]], dtype=int))
+        # Blocks end where both a state factor and a POVM cluster end.
+        block_ends = np.intersect1d(state_ends, povm_ends)
+        block_starts = np.concatenate(([0], block_ends[:-1]))
+        for block_start, block_end in zip(block_starts, block_ends):
+            block_states = [state_array[state_index_array[i] + j] for j in np.flatnonzero((state_ends > block_start) & (state_ends <= block_end))]
+            block_povms = [povm_array[povm_index_array[i] + j] for j in np.flatnonzero((povm_ends > block_start) & (povm_ends <= block_end))]
+            qubit_start = unitary_index_array[i] + block_start
+            # Group the rows by their local instruction pattern, and tensor together the unitaries of each pattern once.
+            patterns, pattern_index = np.unique(instruction_index[:, qubit_start:unitary_index_array[i] + block_end], axis=0, return_inverse=True)
+            tensored_unitaries = np.array([reduce(np.kron, rotation_matrices[pattern]) for pattern in patterns])
+            if any(np.ndim(state) == 2 for state in block_states): # Statevectors are only turned into density matrices when joined with mixed states
+                block_states = [np.outer(state, state.conj()) if np.ndim(state) == 1 else state for state in block_states]
+            if len(block_states) == 1: # If only single entry in block no reduction call is needed.
+                tensored_block_rho = block_states[0]
+            else:
+                tensored_block_rho = reduce(np.kron, block_states)
+            if len(block_povms) == 1: # If only single entry in block no reduction call is needed.
+                sub_povm = block_povms[0]
+            else:
+                sub_povm = reduce(POVM.tensor_POVM, block_povms)[0]
+
+            # Einsum is split into two operations as it is too slow for larger chunk sizes. 
+            # Note that the second hashed_unitaries are swapped to perform a transpose.
+            if np.ndim(tensored_block_rho) == 1:
+                rotated_rhos = np.einsum('nij,j->ni', tensored_unitaries, tensored_block_rho)
+            else:
+                rotated_rhos = np.einsum('nij,jk,nlk->nil', tensored_unitaries, tensored_block_rho, tensored_unitaries.conj(), optimize=True) 
+            yield qubit_start, block_end - block_start, sub_povm, rotated_rhos, pattern_index.reshape(-1)
+
 
-        # Chunk measurements
-        outcomes = np.array([simulated_measurement(n_shots, sub_povm, rho) for rho in rotated_rhos])
+def measure_hashed_chunk_QST(n_shots, chunk_size, povm_array, povm_size_array, state_array, state_size_array, hashed_QST_instructions):
+    """
+    Measures sets of qubits as genuine chunk-size states and POVMs.
+    Assumes that the states and POVMs are already split into chunks of spesificed size. This function is only for QST, as calibration states should always be factorized.
+    n_shots: number of shots used for each possible computational basis measurement, XX, XY, XZ, YX, YY, YZ, ZX, ZY, ZZ etc.
+    """
+    n_qubits = np.sum(state_size_array)
+    n_hashes = len(hashed_QST_instructions)
+    full_outcomes = np.zeros((n_hashes,n_shots, n_qubits) ,dtype = np.uint8)
+    for qubit_start, block_size, sub_povm, rotated_rhos, pattern_index in _hashed_chunk_QST_states(chunk_size, povm_array, povm_size_array, state_array, state_size_array, hashed_QST_instructions):
+        # Block measurements, the histogram of each pattern is computed once and all rows are sampled together.
+        # The uniforms are drawn in the same order as sampling the rows one by one with simulated_measurement.
+        if rotated_rhos.ndim == 2: # Statevectors
+            histograms = get_statevector_histogram(sub_povm.get_POVM(), rotated_rhos)
+        else:
+            histograms = np.array([sub_povm.get_histogram(rho) for rho in rotated_rhos])
+        cumulative_sum = np.cumsum(histograms, axis=-1)[pattern_index]
+        r = np.random.random((n_hashes, n_shots))
+        outcomes = np.zeros((n_hashes, n_shots), dtype=int)
+        for k in range(cumulative_sum.shape[-1]):
+            outcomes += cumulative_sum[:, k, None] < r
      
         # Add outcomes to the full_outcomes array in binary form
-        full_outcomes[:,:,chunk_size*i:chunk_size*(i+1)] = np.array([sf.decimal_to_binary_array(hashed_outcome, chunk_size) for hashed_outcome in outcomes])
+        full_outcomes[:,:,qubit_start:qubit_start + block_size] = (outcomes[..., None] >> np.arange(block_size)[::-1]) & 1
+    return full_outcomes
+
+
+def measure_hashed_chunk_QST_counts(n_shots, chunk_size, povm_array, povm_size_array, state_array, state_size_array, hashed_QST_instructions, rng = None):
+    """
+    Counts-native version of measure_hashed_chunk_QST. The joint outcome counts of each chunk are drawn with multinomial sampling
+    for all hashed rows at once, and are returned in a ClusterCounts container with one cluster per independent block of each chunk.
+    """
+    if rng is None:
+        rng = np.random.default_rng(np.random.randint(2**31))
+    block_counts = []
+    block_sizes = []
+    for _, block_size, sub_povm, rotated_rhos, pattern_index in _hashed_chunk_QST_states(chunk_size, povm_array, povm_size_array, state_array, state_size_array, hashed_QST_instructions):
+        block_counts.append(_multinomial_counts(n_shots, sub_povm.get_POVM(), rotated_rhos, rng, pattern_index))
+        block_sizes.append(block_size)
+    return ClusterCounts(block_counts, block_sizes, seed = rng.integers(2**31))
+
+
+def measure_hashed_QST_sequential(n_shots, povm_array, povm_size_array, state_array, state_size_array, hashed_QST_instructions):
+    """
+    Measures product states of entangled state blocks with cluster POVMs under the hashed Pauli rotations, where the state blocks
+    and POVM clusters can be arbitrary partitions of the qubits, i.e. they do not have to tile a common chunk size.
+    The POVM clusters are sampled one after the other from the left. A cluster is measured on the state blocks it overlaps,
+    and the qubits of the last block that are not yet measured are kept as a state conditioned on the outcomes already drawn.
+    The next cluster is sampled from this conditional state, which gives the exact joint distribution of the outcomes,
+    while only the state blocks that overlap a single cluster are joined together. Shots that share the same instruction
+    pattern and conditioning outcomes share the same conditional state, so the states are only computed once for each of them.
+    n_shots: number of shots for each hashed row.
+    Returns the outcomes of shape (n_hashes, n_shots, n_qubits) as uint8.
+    """
+    n_qubits = int(np.sum(state_size_array))
+    if int(np.sum(povm_size_array)) != n_qubits:
+        raise ValueError(f'POVM clusters of total size {np.sum(povm_size_array)} do not match states of total size {n_qubits}.')
+    n_hashes = len(hashed_QST_instructions)
+    possible_instructions = np.array(["X", "Y", "Z"])
+    sigma_x = np.array([[0,1], [1,0]])
+    sigma_y = np.array([[0,-1j], [1j,0]])
+    # Same rotations to the computational basis as in measure_hashed_chunk_QST.
+    rot_x_to_z = sp.linalg.expm(-1j * (-np.pi/4) * sigma_y)
+    rot_y_to_z = sp.linalg.expm(-1j * (np.pi/4) * sigma_x)
+    rotation_matrices = np.array([rot_x_to_z, rot_y_to_z, np.eye(2)])
+    instruction_index = np.argmax(np.asarray(hashed_QST_instructions)[..., None] == possible_instructions, axis=-1)
+
+    state_ends = np.cumsum(np.asarray(state_size_array, dtype=int))
+    state_starts = state_ends - np.asarray(state_size_array, dtype=int)
+    full_outcomes = np.zeros((n_hashes, n_shots, n_qubits), dtype=np.uint8)
+    # Rotated state of the qubits [povm_start, conditional_end) that belong to a partially measured state block,
+    # conditioned on the outcomes drawn so far. Each shot points to one of the conditional states.
+    conditional_states = np.ones((1, 1, 1), dtype=complex)
+    conditional_index = np.zeros((n_hashes, n_shots), dtype=int)
+    conditional_end = 0
+    povm_start = 0
+    for povm, povm_size in zip(povm_array, povm_size_array):
+        povm_end = povm_start + povm_size
+        # State blocks that are not yet touched, but overlap the cluster.
+        fresh_blocks = np.flatnonzero((state_starts >= conditional_end) & (state_starts < povm_end))
+        fresh_end = state_ends[fresh_blocks[-1]] if len(fresh_blocks) else conditional_end
+        if len(fresh_blocks):
+            fresh_states = [np.outer(state_array[j], np.conj(state_array[j])) if np.ndim(state_array[j]) == 1 else state_array[j] for j in fresh_blocks]
+            fresh_rho = fresh_states[0] if len(fresh_states) == 1 else reduce(np.kron, fresh_states)
+            patterns, fresh_pattern_index = np.unique(instruction_index[:, conditional_end:fresh_end], axis=0, return_inverse=True)
+            tensored_unitaries = np.array([reduce(np.kron, rotation_matrices[pattern]) for pattern in patterns])
+            rotated_fresh_rhos = np.einsum('nij,jk,nlk->nil', tensored_unitaries, fresh_rho, tensored_unitaries.conj(), optimize=True)
+        else:
+            fresh_pattern_index = np.zeros(n_hashes, dtype=int)
+            rotated_fresh_rhos = np.ones((1, 1, 1), dtype=complex)
+        fresh_pattern_index = np.broadcast_to(fresh_pattern_index.reshape(-1, 1), (n_hashes, n_shots))
+
+        # Joint states of the cluster and the unmeasured rest of the last state block, one for each combination of conditional state and fresh pattern.
+        combinations, combination_index = np.unique(np.stack((conditional_index.reshape(-1), fresh_pattern_index.reshape(-1)), axis=-1), axis=0, return_inverse=True)
+        combination_index = combination_index.reshape(n_hashes, n_shots)
+        joint_rhos = np.einsum('nij,nkl->nikjl', conditional_states[combinations[:, 0]], rotated_fresh_rhos[combinations[:, 1]])
+        cluster_dim = 2**povm_size
+        rest_dim = 2**(max(conditional_end, fresh_end) - povm_end)
+        joint_rhos = joint_rhos.reshape(len(combinations), cluster_dim, rest_dim, cluster_dim, rest_dim)
+
+        # Sample the cluster outcomes from the reduced state on the cluster.
+        povm_elements = povm.get_POVM()
+        cluster_rhos = np.einsum('nikjk->nij', joint_rhos)
+        histograms = np.clip(np.real(np.einsum('qij,nji->nq', povm_elements, cluster_rhos)), 0, None)
+        histograms /= np.sum(histograms, axis=-1, keepdims=True)
+        cumulative_sum = np.cumsum(histograms, axis=-1)[combination_index]
+        r = np.random.random((n_hashes, n_shots))
+        outcomes = np.minimum(np.sum(cumulative_sum < r[..., None], axis=-1), len(povm_elements) - 1)
+        full_outcomes[:, :, povm_start:povm_end] = (outcomes[..., None] >> np.arange(povm_size)[::-1]) & 1
+
+        # Condition the unmeasured rest on the drawn outcomes, Tr_cluster[(E_q x 1) rho]/p(q).
+        if rest_dim > 1:
+            conditions, conditional_index = np.unique(np.stack((combination_index.reshape(-1), outcomes.reshape(-1)), axis=-1), axis=0, return_inverse=True)
+            conditional_index = conditional_index.reshape(n_hashes, n_shots)
+            conditional_states = np.einsum('nij,njkil->nkl', povm_elements[conditions[:, 1]], joint_rhos[conditions[:, 0]])
+            traces = np.real(np.einsum('nkk->n', conditional_states))
+            conditional_states /= np.where(traces > 0, traces, 1)[:, None, None]
+        else:
+            conditional_states = np.ones((1, 1, 1), dtype=complex)
+            conditional_index = np.zeros((n_hashes, n_shots), dtype=int)
+        conditional_end = max(conditional_end, fresh_end)
+        povm_start = povm_end
     return full_outcomes
 
 
+def measure_hashed_MPS_QST(n_shots, mps, povm_array, cluster_size, hashed_QST_instructions):
+    """
+    Measures a matrix product true state (see mps.MPS) with the cluster POVMs under the hashed Pauli rotations.
+    For each hashed row the MPS is rotated with the single qubit unitaries of the instructions and the clusters are sampled
+    one after the other from the MPS, so the state can be entangled across all qubits without building dense states.
+    n_shots: number of shots for each hashed row.
+    Returns the outcomes of shape (n_hashes, n_shots, n_qubits) as uint8.
+    """
+    possible_instructions = np.array(["X", "Y", "Z"])
+    sigma_x = np.array([[0,1], [1,0]])
+    sigma_y = np.array([[0,-1j], [1j,0]])
+    # Same rotations to the computational basis as in measure_hashed_chunk_QST.
+    rot_x_to_z = sp.linalg.expm(-1j * (-np.pi/4) * sigma_y)
+    rot_y_to_z = sp.linalg.expm(-1j * (np.pi/4) * sigma_x)
+    rotation_matrices = np.array([rot_x_to_z, rot_y_to_z, np.eye(2)])
+
+    instruction_index = np.argmax(np.asarray(hashed_QST_instructions)[..., None] == possible_instructions, axis=-1)
+    return np.array([mps.apply_single_qubit_unitaries(rotation_matrices[instruction]).sample(n_shots, povm_array, cluster_size) for instruction in instruction_index])
+
+
+def is_chunk_aligned(chunk_size, povm_size_array, state_size_array):
+    """
+    Checks if the POVM clusters and the state blocks both tile chunks of chunk_size qubits, as required by measure_hashed_chunk_QST.
+    """
+    n_qubits = int(np.sum(state_size_array))
+    chunk_ends = np.arange(chunk_size, n_qubits + 1, chunk_size)
+    return bool(n_qubits % chunk_size == 0 and np.all(np.isin(chunk_ends, np.cumsum(state_size_array)))
+                and np.all(np.isin(chunk_ends, np.cumsum(povm_size_array))))
+
+
+def measure_hashed_true_state_QST(n_shots, chunk_size, povm_array, povm_size_array, true_state, state_size_array, hashed_QST_instructions):
+    """
+    Simulates the hashed QST measurements of one true state with the simulation that fits the state:
+    MPS true states with measure_hashed_MPS_QST, state blocks that tile the chunks with measure_hashed_chunk_QST,
+    and state blocks that straddle the chunks with measure_hashed_QST_sequential.
+    true_state: An MPS or a list of state blocks (density matrices or statevectors) with sizes state_size_array.
+    Returns the outcomes of shape (n_hashes, n_shots, n_qubits) as uint8.
+    """
+    if isinstance(true_state, MPS):
+        return measure_hashed_MPS_QST(n_shots, true_state, povm_array, povm_size_array, hashed_QST_instructions)
+    if not is_chunk_aligned(chunk_size, povm_size_array, state_size_array):
+        return measure_hashed_QST_sequential(n_shots, povm_array, povm_size_array, true_state, state_size_array, hashed_QST_instructions)
+    return measure_hashed_chunk_QST(n_shots, chunk_size, povm_array, povm_size_array, true_state, state_size_array, hashed_QST_instructions)
+
+
 def measure_and_QST_target_qubit_only(two_point_array,noise_cluster_labels,n_QST_shots, n_qubits, chunk_size, povm_array, cluster_size, rho_true_array, state_size_array,clustered_QDOT):
     """
     QST method that both measures and reconstructs the state for the spesific correlators given in two_point_array.
@@ -283,7 +635,7 @@ def measure_and_QST_target_qubit_only(two_point_array,noise_cluster_labels,n_QST
     target_qubits = np.sort(target_qubits)[::-1]
     QST_only_instructions = ot.create_QST_instructions(n_qubits, target_qubits)
 
-    QST_outcomes_reduced_instructions = measure_hashed_chunk_QST(n_QST_shots, chunk_size, povm_array, cluster_size, rho_true_array, state_size_array, QST_only_instructions)
+    QST_outcomes_reduced_instructions = measure_hashed_true_state_QST(n_QST_shots, chunk_size, povm_array, cluster_size, rho_true_array, state_size_array, QST_only_instructions)
 
     print(f'Target Qubits: {target_qubits}')
     rho_recon_1 = ot.QST_from_instructions(QST_outcomes_reduced_instructions, QST_only_instructions,two_point_array, target_qubits, clustered_QDOT, noise_cluster_labels)
@@ -325,6 +677,6 @@ def correlator_spesific_QST_measurements(noise_cluster_labels, two_point_corr_la
     #print(f'Qubit labels to be reconstructed: {target_qubits}.')
     QST_only_instructions = ot.create_QST_instructions(n_qubits, target_qubits)
     #print(f'QST instructions: {QST_only_instructions}.')
-    QST_outcomes_reduced_instructions = [measure_hashed_chunk_QST(n_shots_pr_basis, chunk_size, povm_array, cluster_size, rho_true_array[i], state_size_array, QST_only_instructions) for i in range(n_averages)]
+    QST_outcomes_reduced_instructions = [measure_hashed_true_state_QST(n_shots_pr_basis, chunk_size, povm_array, cluster_size, rho_true_array[i], state_size_array, QST_only_instructions) for i in range(n_averages)]
     #print(len(QST_outcomes_reduced_instructions))
     return QST_outcomes_reduced_instructions, target_qubits, QST_only_instructions
\ No newline at end of file
@@ -0,0 +1,170 @@
+import numpy as np
+
+
+class MPS:
+    """
+    Matrix product state used as true state for entangled targets that span more qubits than a dense chunk can hold.
+    The tensors have shape (chi_left, 2, chi_right) and are ordered as the qubits in the outcome arrays,
+    i.e. tensor i belongs to qubit label n_qubits-1-i. The state is kept normalized and right-canonical,
+    such that the environment to the right of any bond is the identity. Reduced density matrices and measurement
+    samples are computed by contracting the tensors, the dense 2**n_qubits statevector is never built.
+    """
+
+    def __init__(self, tensors):
+        """
+        tensors: List of n_qubits tensors of shape (chi_left, 2, chi_right), with chi_left = 1 for the first and chi_right = 1 for the last tensor.
+        """
+        self._tensors = [np.array(tensor, dtype=complex) for tensor in tensors]
+        if self._tensors[0].shape[0] != 1 or self._tensors[-1].shape[-1] != 1:
+            raise ValueError('The outer bond dimensions of an MPS must be 1.')
+        for left, right in zip(self._tensors[:-1], self._tensors[1:]):
+            if left.shape[-1] != right.shape[0] or right.shape[1] != 2:
+                raise ValueError(f'Bond dimensions {left.shape} and {right.shape} do not match.')
+        self._right_canonicalize()
+
+    @classmethod
+    def product_state(cls, statevectors):
+        """
+        Creates a product state from a list of single qubit statevectors.
+        """
+        return cls([np.asarray(psi, dtype=complex).reshape(1, 2, 1) for psi in statevectors])
+
+    @classmethod
+    def GHZ(cls, n_qubits):
+        """
+        Creates the GHZ state (|0...0> + |1...1>)/sqrt(2), bond dimension 2.
+        """
+        tensor = np.zeros((2, 2, 2))
+        tensor[0, 0, 0] = 1
+        tensor[1, 1, 1] = 1
+        tensors = [tensor.copy() for _ in range(n_qubits)]
+        tensors[0] = tensor[:1] + tensor[1:]
+        tensors[-1] = tensor.sum(axis=-1, keepdims=True)
+        return cls(tensors)
+
+    @classmethod
+    def cluster_state(cls, n_qubits):
+        """
+        Creates the one dimensional cluster state, CZ gates between all neighbours applied to |+>^n_qubits, bond dimension 2.
+        The bond carries the value of the previous qubit, which sets the phase (-1)^(a*s) of the CZ gate.
+        """
+        tensor = np.zeros((2, 2, 2))
+        for a in range(2):
+            for s in range(2):
+                tensor[a, s, s] = (-1)**(a*s)
+        tensors = [tensor.copy() for _ in range(n_qubits)]
+        tensors[0] = tensor[:1]
+        tensors[-1] = tensor.sum(axis=-1, keepdims=True)
+        return cls(tensors)
+
+    @classmethod
+    def random_state(cls, n_qubits, bond_dim, rng = None):
+        """
+        Creates a random state with complex Gaussian tensors of at most bond dimension bond_dim.
+        """
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(2**31))
+        bond_dims = [1] + [min(bond_dim, 2**(i + 1), 2**(n_qubits - i - 1)) for i in range(n_qubits - 1)] + [1]
+        return cls([rng.normal(size=(bond_dims[i], 2, bond_dims[i+1])) + 1j*rng.normal(size=(bond_dims[i], 2, bond_dims[i+1])) for i in range(n_qubits)])
+
+    @property
+    def n_qubits(self):
+        return len(self._tensors)
+
+    @property
+    def bond_dims(self):
+        return [tensor.shape[-1] for tensor in self._tensors[:-1]]
+
+    def get_tensors(self):
+        return [np.copy(tensor) for tensor in self._tensors]
+
+    def _right_canonicalize(self):
+        """
+        Brings the tensors into right-canonical form, sum_s B^s B^s^dagger = 1, with LQ decompositions from the right and normalizes the state.
+        """
+        for i in range(self.n_qubits - 1, 0, -1):
+            chi_left, _, chi_right = self._tensors[i].shape
+            # LQ decomposition from the QR decomposition of the conjugate transpose
+            q, r = np.linalg.qr(self._tensors[i].reshape(chi_left, 2*chi_right).conj().T)
+            self._tensors[i] = q.conj().T.reshape(-1, 2, chi_right)
+            self._tensors[i-1] = np.einsum('asb,bc->asc', self._tensors[i-1], r.conj().T)
+        self._tensors[0] /= np.linalg.norm(self._tensors[0])
+
+    def to_statevector(self):
+        """
+        Contracts the full statevector, only meant for small numbers of qubits.
+        """
+        psi = self._tensors[0]
+        for tensor in self._tensors[1:]:
+            psi = np.einsum('asb,btc->astc', psi, tensor).reshape(1, -1, tensor.shape[-1])
+        return psi.reshape(-1)
+
+    def apply_single_qubit_unitaries(self, unitaries):
+        """
+        Returns the state with one single qubit unitary applied to each qubit, unitaries of shape (n_qubits, 2, 2).
+        """
+        return MPS([np.einsum('st,atb->asb', unitary, tensor) for unitary, tensor in zip(unitaries, self._tensors)])
+
+    def reduced_density_matrix(self, qubit_labels):
+        """
+        Returns the reduced density matrix of the given qubits, with the qubits in descending label order.
+        The tensors are contracted from the left, and the contraction stops at the last kept qubit as the right environment is the identity.
+        """
+        keep_index = np.sort(self.n_qubits - 1 - np.asarray(qubit_labels, dtype=int))
+        if len(np.unique(keep_index)) != len(keep_index) or keep_index[0] < 0 or keep_index[-1] >= self.n_qubits:
+            raise ValueError(f'Invalid qubit labels {qubit_labels} for {self.n_qubits} qubits.')
+        # Environment with open ket and bra indices of the kept qubits, shape (ket_dim, bra_dim, chi, chi)
+        environment = np.ones((1, 1, 1, 1), dtype=complex)
+        for i in range(keep_index[-1] + 1):
+            tensor = self._tensors[i]
+            if i in keep_index:
+                environment = np.einsum('pqab,asc,btd->psqtcd', environment, tensor, tensor.conj(), optimize=True)
+                environment = environment.reshape(2*environment.shape[0], 2*environment.shape[2], *environment.shape[-2:])
+            else:
+                environment = np.einsum('pqab,asc,bsd->pqcd', environment, tensor, tensor.conj(), optimize=True)
+        rho = np.einsum('pqcc->pq', environment)
+        return rho/np.trace(rho)
+
+    def _cluster_tensor(self, start, stop):
+        """
+        Contracts the tensors of the qubits start to stop-1 into a tensor of shape (chi_left, 2**(stop-start), chi_right).
+        """
+        cluster_tensor = self._tensors[start]
+        for tensor in self._tensors[start + 1:stop]:
+            cluster_tensor = np.einsum('asb,btc->astc', cluster_tensor, tensor).reshape(cluster_tensor.shape[0], -1, tensor.shape[-1])
+        return cluster_tensor
+
+    def sample(self, n_shots, povm_array, cluster_size):
+        """
+        Samples n_shots measurements of the state with one POVM on each cluster of consecutive qubits.
+        The clusters are sampled one after the other from the left. For every shot the left environment conditioned on the
+        previous cluster outcomes is kept, which gives the exact joint distribution of the POVM outcomes, also when
+        the state is entangled across clusters.
+        Returns the outcomes as an array of shape (n_shots, n_qubits) of uint8, the cluster outcome index in binary form.
+        """
+        if np.sum(cluster_size) != self.n_qubits:
+            raise ValueError(f'Clusters of total size {np.sum(cluster_size)} do not match {self.n_qubits} qubits.')
+        outcomes = np.zeros((n_shots, self.n_qubits), dtype=np.uint8)
+        left_environment = np.ones((n_shots, 1, 1), dtype=complex)
+        start = 0
+        for povm, size in zip(povm_array, cluster_size):
+            povm_elements = povm.get_POVM()
+            cluster_tensor = self._cluster_tensor(start, start + size)
+            chi_left, dim, chi_right = cluster_tensor.shape
+            # Contractions are staged as matrix products, with the ket index of the environment contracted first.
+            # X[n, b, s, c] = sum_a L[n, a, b] T[a, s, c], stored as (n, s, b*c)
+            ket_contraction = np.tensordot(left_environment, cluster_tensor, axes=(1, 0)).transpose(0, 2, 1, 3).reshape(n_shots, dim, chi_left*chi_right)
+            bra_tensor = cluster_tensor.conj()
+            # Cluster state of every shot conditioned on the previous outcomes, the right environment is the identity.
+            rho = (ket_contraction.reshape(n_shots*dim, -1) @ bra_tensor.transpose(0, 2, 1).reshape(chi_left*chi_right, dim)).reshape(n_shots, dim, dim)
+            probabilities = np.clip(np.real(rho.reshape(n_shots, -1) @ povm_elements.transpose(0, 2, 1).reshape(len(povm_elements), -1).T), 0, None)
+            cumulative_sum = np.cumsum(probabilities/np.sum(probabilities, axis=-1, keepdims=True), axis=-1)
+            r = np.random.random(n_shots)
+            outcome = np.minimum(np.sum(cumulative_sum < r[:, None], axis=-1), len(povm_elements) - 1)
+            outcomes[:, start:start + size] = (outcome[:, None] >> np.arange(size)[::-1]) & 1
+            # Condition the environment on the sampled outcome, L[n, c, d] = sum X[n, b, s, c] E[t, s] conj(T[b, t, d])
+            conditioned_contraction = (povm_elements[outcome] @ ket_contraction).reshape(n_shots, dim, chi_left, chi_right).transpose(0, 3, 2, 1)
+            left_environment = (conditioned_contraction.reshape(n_shots*chi_right, chi_left*dim) @ bra_tensor.reshape(chi_left*dim, chi_right)).reshape(n_shots, chi_right, chi_right)
+            left_environment /= probabilities[np.arange(n_shots), outcome][:, None, None]
+            start += size
+        return outcomes
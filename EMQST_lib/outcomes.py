@@ -0,0 +1,437 @@
+import numpy as np
+import os
+import json
+
+
+class ClusterCounts:
+    """
+    Counts-native storage of simulated outcomes on a set of independent clusters (or chunks) of qubits.
+
+    For every hashed row only the joint outcome counts of each cluster are stored, shape (n_rows, 2**cluster_size),
+    instead of the (n_rows, n_shots, n_qubits) outcome array. Marginal counts on qubits within one cluster are
+    exact sums over the joint cluster counts. Marginals across clusters need the shot-by-shot pairing of the
+    cluster outcomes, which is only created for the clusters involved: the outcomes of each cluster are expanded
+    from its counts and put in a uniformly random order. Since the clusters are measured independently, this pairing
+    has exactly the same distribution as the per-shot simulation. The order of each cluster is fixed by a seed,
+    such that all marginals are consistent with a single set of shots (see to_outcomes).
+
+    Qubits are ordered as in measure_clusters: the first cluster holds the leftmost qubits, and the qubit labels
+    run [n_qubits-1, ..., 0] from left to right.
+    """
+
+    def __init__(self, cluster_counts, cluster_size, seed=None):
+        """
+        cluster_counts:     List with the counts of each cluster, shapes (n_rows, 2**cluster_size[i]).
+        cluster_size:       Number of qubits in each cluster.
+        seed:               Seed of the shot pairing between clusters. Defaults to a draw from the global numpy random state.
+        """
+        self._cluster_counts = [np.asarray(counts) for counts in cluster_counts]
+        self._cluster_size = np.asarray(cluster_size, dtype=int)
+        if len(self._cluster_counts) != len(self._cluster_size):
+            raise ValueError("The number of count arrays and cluster sizes does not match.")
+        self._n_qubits = int(np.sum(self._cluster_size))
+        self._n_rows = self._cluster_counts[0].shape[0]
+        self._n_shots = int(np.sum(self._cluster_counts[0][0]))
+        if seed is None:
+            seed = np.random.randint(2**31)
+        self._seed = seed
+        # Cluster and position within the cluster of each qubit, indexed by list index (leftmost qubit first).
+        self._qubit_cluster = np.repeat(np.arange(len(self._cluster_size)), self._cluster_size)
+        self._qubit_position = np.concatenate([np.arange(size) for size in self._cluster_size])
+
+    @property
+    def n_qubits(self):
+        return self._n_qubits
+
+    @property
+    def n_rows(self):
+        return self._n_rows
+
+    @property
+    def n_shots(self):
+        return self._n_shots
+
+    @property
+    def shape(self):
+        """
+        Shape of the equivalent outcome array, (n_rows, n_shots, n_qubits).
+        """
+        return (self._n_rows, self._n_shots, self._n_qubits)
+
+    def __len__(self):
+        return self._n_rows
+
+    def get_cluster_size(self):
+        return self._cluster_size.copy()
+
+    def get_cluster_counts(self, cluster_index):
+        return self._cluster_counts[cluster_index].copy()
+
+    def get_cluster_shot_outcomes(self, cluster_index):
+        """
+        Returns the decimal outcomes of one cluster shot by shot, shape (n_rows, n_shots), in the fixed random order of the cluster.
+        """
+        counts = self._cluster_counts[cluster_index]
+        n_outcomes = counts.shape[1]
+        outcomes = np.repeat(np.tile(np.arange(n_outcomes), self._n_rows), counts.reshape(-1)).reshape(self._n_rows, self._n_shots)
+        rng = np.random.default_rng([self._seed, cluster_index])
+        return rng.permuted(outcomes, axis=1)
+
+    def get_index_counts(self, qubit_labels):
+        """
+        Returns the counts of the joint outcomes of the qubits in the given order, shape (n_rows, 2**len(qubit_labels)).
+        The first label is the most significant bit of the outcome index.
+        """
+        qubit_labels = np.atleast_1d(qubit_labels)
+        qubit_index = self._n_qubits - 1 - qubit_labels
+        clusters = self._qubit_cluster[qubit_index]
+        positions = self._qubit_position[qubit_index]
+        n_subsystem_qubits = len(qubit_labels)
+
+        if np.all(clusters == clusters[0]): # Exact marginal of a single cluster
+            size = self._cluster_size[clusters[0]]
+            counts = self._cluster_counts[clusters[0]].reshape(self._n_rows, *(2,)*size)
+            traced_axes = tuple(1 + np.setdiff1d(np.arange(size), positions))
+            counts = np.sum(counts, axis=traced_axes)
+            # Remaining axes are in increasing position order, reorder them to the requested order.
+            counts = np.transpose(counts, axes=[0, *(1 + np.argsort(np.argsort(positions)))])
+            return counts.reshape(self._n_rows, 2**n_subsystem_qubits)
+
+        # Pair the shots of the involved clusters and read out the requested bits.
+        decimal_outcomes = np.zeros((self._n_rows, self._n_shots), dtype=int)
+        for cluster in np.unique(clusters):
+            shot_outcomes = self.get_cluster_shot_outcomes(cluster)
+            size = self._cluster_size[cluster]
+            for j in np.flatnonzero(clusters == cluster):
+                bit = (shot_outcomes >> (size - 1 - positions[j])) & 1
+                decimal_outcomes += bit << (n_subsystem_qubits - 1 - j)
+        row_offset = (np.arange(self._n_rows) * 2**n_subsystem_qubits)[:, None]
+        index_counts = np.bincount((decimal_outcomes + row_offset).reshape(-1), minlength=self._n_rows * 2**n_subsystem_qubits)
+        return index_counts.reshape(self._n_rows, 2**n_subsystem_qubits)
+
+    def get_traced_out_index_counts(self, subsystem_label):
+        """
+        Same as overlapping_tomography.get_traced_out_index_counts, the counts are returned in descending order of the subsystem labels.
+        """
+        return self.get_index_counts(np.sort(subsystem_label)[::-1])
+
+    def to_outcomes(self):
+        """
+        Expands the counts to the outcome array of shape (n_rows, n_shots, n_qubits) with the same pairing as get_index_counts.
+        """
+        outcomes = np.zeros(self.shape, dtype=int)
+        start = 0
+        for cluster, size in enumerate(self._cluster_size):
+            shot_outcomes = self.get_cluster_shot_outcomes(cluster)
+            outcomes[..., start:start + size] = (shot_outcomes[..., None] >> np.arange(size)[::-1]) & 1
+            start += size
+        return outcomes
+
+
+class PackedOutcomes:
+    """
+    Bit-packed storage of outcome arrays of shape (..., n_shots, n_qubits), e.g. the hashed QDT outcomes (n_rows, n_shots, n_qubits).
+    The qubit axis is packed with np.packbits, so every shot takes ceil(n_qubits/8) bytes instead of one integer per qubit.
+    Marginal counts are read directly from the bytes that hold the requested qubits, without unpacking the full array.
+    The qubit order is the same as in the outcome array, qubit labels run [n_qubits-1, ..., 0] from left to right.
+    """
+
+    def __init__(self, packed_outcomes, n_qubits):
+        """
+        packed_outcomes:    Packed outcomes of shape (..., n_shots, ceil(n_qubits/8)), as returned by np.packbits(outcomes, axis=-1).
+        n_qubits:           Number of qubits.
+        """
+        self._packed = np.asarray(packed_outcomes, dtype=np.uint8)
+        self._n_qubits = n_qubits
+        if self._packed.shape[-1] != (n_qubits + 7)//8:
+            raise ValueError(f'Packed outcomes with {self._packed.shape[-1]} bytes per shot do not match {n_qubits} qubits.')
+
+    @classmethod
+    def from_outcomes(cls, outcomes):
+        """
+        Packs an outcome array of shape (..., n_shots, n_qubits) with entries 0 and 1.
+        """
+        outcomes = np.asarray(outcomes)
+        return cls(np.packbits(outcomes.astype(np.uint8), axis=-1), outcomes.shape[-1])
+
+    @property
+    def n_qubits(self):
+        return self._n_qubits
+
+    @property
+    def shape(self):
+        """
+        Shape of the unpacked outcome array.
+        """
+        return (*self._packed.shape[:-1], self._n_qubits)
+
+    @property
+    def nbytes(self):
+        return self._packed.nbytes
+
+    def __len__(self):
+        return len(self._packed)
+
+    def get_packed_outcomes(self):
+        return self._packed
+
+    def _get_bits(self, qubit_labels):
+        """
+        Returns the bits of the qubits in the given order, each of shape (..., n_shots).
+        """
+        qubit_index = self._n_qubits - 1 - np.atleast_1d(qubit_labels)
+        # np.packbits stores the first qubit of each byte in the most significant bit.
+        return [(self._packed[..., index//8] >> (7 - index%8)) & 1 for index in qubit_index]
+
+    def trace_out(self, qubit_to_keep_labels):
+        """
+        Same as overlapping_tomography.trace_out, returns the unpacked outcomes of the kept qubits in descending label order.
+        """
+        bits = self._get_bits(np.sort(qubit_to_keep_labels)[::-1])
+        return np.stack(bits, axis=-1)
+
+    def get_index_counts(self, qubit_labels):
+        """
+        Returns the counts of the joint outcomes of the qubits in the given order, shape (..., 2**len(qubit_labels)).
+        The first label is the most significant bit of the outcome index.
+        """
+        bits = self._get_bits(qubit_labels)
+        n_subsystem_qubits = len(bits)
+        decimal_outcomes = np.zeros(bits[0].shape, dtype=np.int64)
+        for j, bit in enumerate(bits):
+            decimal_outcomes |= bit.astype(np.int64) << (n_subsystem_qubits - 1 - j)
+        lead_shape = decimal_outcomes.shape[:-1]
+        n_lead = int(np.prod(lead_shape))
+        row_offset = (np.arange(n_lead) * 2**n_subsystem_qubits)[:, None]
+        index_counts = np.bincount((decimal_outcomes.reshape(n_lead, -1) + row_offset).reshape(-1), minlength=n_lead * 2**n_subsystem_qubits)
+        return index_counts.reshape(*lead_shape, 2**n_subsystem_qubits)
+
+    def get_traced_out_index_counts(self, subsystem_label):
+        """
+        Same as overlapping_tomography.get_traced_out_index_counts, the counts are returned in descending order of the subsystem labels.
+        """
+        return self.get_index_counts(np.sort(subsystem_label)[::-1])
+
+    def to_outcomes(self):
+        """
+        Unpacks the full outcome array.
+        """
+        return np.unpackbits(self._packed, axis=-1, count=self._n_qubits)
+
+
+class OutcomeStore:
+    """
+    On-disk storage of hashed outcomes of shape (n_rows, n_shots, n_qubits), for outcome sets that do not fit in memory.
+    The outcomes are stored bit-packed (as in PackedOutcomes) in a .npy file in a dedicated folder and are opened with np.memmap,
+    such that only the rows that are read or written are loaded. Rows can be written incrementally with write_rows,
+    both from simulation and from experimental data, and marginal counts are computed in blocks of rows.
+    A pickled OutcomeStore only holds its path, so pickled QREM objects can be reloaded without regenerating the outcomes.
+    """
+
+    _outcome_file = 'outcomes.npy'
+    _metadata_file = 'metadata.json'
+
+    def __init__(self, path, mode = 'r', row_block_size = 1024):
+        """
+        Opens an existing store.
+        path:           Folder of the store.
+        mode:           'r' for read-only access, 'r+' to write rows.
+        row_block_size: Number of rows read at once when computing counts.
+        """
+        self._path = path
+        self._mode = mode
+        self._row_block_size = row_block_size
+        with open(os.path.join(path, self._metadata_file), 'r') as f:
+            metadata = json.load(f)
+        self._n_qubits = metadata['n_qubits']
+        self._packed = np.load(os.path.join(path, self._outcome_file), mmap_mode = mode)
+
+    @classmethod
+    def create(cls, path, n_rows, n_shots, n_qubits, row_block_size = 1024):
+        """
+        Creates an empty store for n_rows hashed rows of n_shots shots on n_qubits qubits, opened for writing.
+        """
+        os.makedirs(path, exist_ok = True)
+        with open(os.path.join(path, cls._metadata_file), 'w') as f:
+            json.dump({'n_qubits': int(n_qubits)}, f)
+        packed = np.lib.format.open_memmap(os.path.join(path, cls._outcome_file), mode = 'w+', dtype = np.uint8, shape = (n_rows, n_shots, (n_qubits + 7)//8))
+        del packed
+        return cls(path, mode = 'r+', row_block_size = row_block_size)
+
+    @classmethod
+    def from_outcomes(cls, path, outcomes, row_block_size = 1024):
+        """
+        Writes an outcome array (or PackedOutcomes) of shape (n_rows, n_shots, n_qubits) to a new store.
+        """
+        store = cls.create(path, *outcomes.shape, row_block_size = row_block_size)
+        store.write_rows(0, outcomes)
+        store.flush()
+        return store
+
+    def __getstate__(self):
+        return {'path': self._path, 'mode': self._mode, 'row_block_size': self._row_block_size}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['mode'], state['row_block_size'])
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def row_block_size(self):
+        return self._row_block_size
+
+    @property
+    def n_qubits(self):
+        return self._n_qubits
+
+    @property
+    def shape(self):
+        return (*self._packed.shape[:-1], self._n_qubits)
+
+    def __len__(self):
+        return len(self._packed)
+
+    def write_rows(self, start_row, outcomes):
+        """
+        Writes consecutive rows starting at start_row. The outcomes are either an outcome array
+        of shape (n_new_rows, n_shots, n_qubits) or a PackedOutcomes container.
+        """
+        if self._mode == 'r':
+            raise ValueError('The outcome store is opened read-only.')
+        if not isinstance(outcomes, PackedOutcomes):
+            outcomes = PackedOutcomes.from_outcomes(outcomes)
+        if outcomes.n_qubits != self._n_qubits:
+            raise ValueError(f'Outcomes on {outcomes.n_qubits} qubits do not match the {self._n_qubits} qubits of the store.')
+        packed = outcomes.get_packed_outcomes()
+        self._packed[start_row:start_row + len(packed)] = packed
+
+    def flush(self):
+        if self._mode != 'r':
+            self._packed.flush()
+
+    def get_rows(self, rows):
+        """
+        Loads the selected rows (slice or index array) into memory as a PackedOutcomes container.
+        """
+        return PackedOutcomes(np.array(self._packed[rows]), self._n_qubits)
+
+    def _row_blocks(self):
+        for start in range(0, len(self._packed), self._row_block_size):
+            yield self.get_rows(slice(start, start + self._row_block_size))
+
+    def trace_out(self, qubit_to_keep_labels):
+        """
+        Same as overlapping_tomography.trace_out, the result is loaded into memory.
+        """
+        return np.concatenate([block.trace_out(qubit_to_keep_labels) for block in self._row_blocks()])
+
+    def get_index_counts(self, qubit_labels):
+        """
+        Same as PackedOutcomes.get_index_counts, computed one block of rows at a time.
+        """
+        return np.concatenate([block.get_index_counts(qubit_labels) for block in self._row_blocks()])
+
+    def get_traced_out_index_counts(self, subsystem_label):
+        """
+        Same as overlapping_tomography.get_traced_out_index_counts, computed one block of rows at a time.
+        """
+        return self.get_index_counts(np.sort(subsystem_label)[::-1])
+
+    def to_outcomes(self):
+        """
+        Loads and unpacks the full outcome array.
+        """
+        return self.get_rows(slice(None)).to_outcomes()
+
+
+class MarginalCountAccumulator:
+    """
+    Streaming alternative to storing outcome arrays when the subsystems that are needed are known in advance.
+    The subsystems (e.g. all qubit pairs, noise clusters or correlator unions) are registered first, and batches of outcomes
+    are then added with update, which adds the marginal counts of every registered subsystem in place and discards the batch.
+    The peak memory is therefore set by the batch size, not by the total number of shots.
+    The accumulator can be used in place of the outcome array in the overlapping_tomography functions that read counts
+    with get_traced_out_index_counts, as long as the subsystems they use were registered.
+    """
+
+    def __init__(self, n_qubits, n_rows, subsystem_labels=None):
+        """
+        n_qubits:           Number of qubits.
+        n_rows:             Number of hashed rows of the outcome batches.
+        subsystem_labels:   Optional list of subsystem labels to register.
+        """
+        self._n_qubits = n_qubits
+        self._n_rows = n_rows
+        self._n_shots = 0
+        self._count_tables = {}
+        if subsystem_labels is not None:
+            self.register(subsystem_labels)
+
+    @staticmethod
+    def _subsystem_key(subsystem_label):
+        # Counts are stored in descending label order, as returned by get_traced_out_index_counts.
+        return tuple(int(label) for label in np.sort(subsystem_label)[::-1])
+
+    def register(self, subsystem_labels):
+        """
+        Registers a list of subsystems. Subsystems can only be registered before any outcomes are added.
+        """
+        for subsystem_label in subsystem_labels:
+            key = self._subsystem_key(subsystem_label)
+            if key in self._count_tables:
+                continue
+            if self._n_shots > 0:
+                raise ValueError(f'Subsystem {key} can not be registered after outcomes have been added.')
+            if key[0] >= self._n_qubits or key[-1] < 0:
+                raise ValueError(f'Invalid subsystem {key} for {self._n_qubits} qubits.')
+            self._count_tables[key] = np.zeros((self._n_rows, 2**len(key)), dtype=np.int64)
+
+    @property
+    def n_shots(self):
+        return self._n_shots
+
+    @property
+    def shape(self):
+        """
+        Shape of the equivalent outcome array of all added shots, (n_rows, n_shots, n_qubits).
+        """
+        return (self._n_rows, self._n_shots, self._n_qubits)
+
+    def __len__(self):
+        return self._n_rows
+
+    def get_subsystem_labels(self):
+        return [np.array(key) for key in self._count_tables]
+
+    def update(self, outcomes):
+        """
+        Adds the marginal counts of a batch of outcomes to all registered subsystems.
+        The batch is an outcome array of shape (n_rows, n_batch_shots, n_qubits), or a container such as PackedOutcomes or ClusterCounts.
+        """
+        if hasattr(outcomes, "get_traced_out_index_counts"):
+            for key, count_table in self._count_tables.items():
+                count_table += outcomes.get_traced_out_index_counts(key)
+            self._n_shots += outcomes.shape[1]
+            return
+        outcomes = np.asarray(outcomes)
+        if outcomes.shape[0] != self._n_rows or outcomes.shape[-1] != self._n_qubits:
+            raise ValueError(f'Outcomes of shape {outcomes.shape} do not match {self._n_rows} rows and {self._n_qubits} qubits.')
+        n_batch_shots = outcomes.shape[1]
+        for key, count_table in self._count_tables.items():
+            n_subsystem_qubits = len(key)
+            qubit_index = self._n_qubits - 1 - np.array(key)
+            decimal_outcomes = outcomes[..., qubit_index].astype(np.int64) @ (1 << np.arange(n_subsystem_qubits)[::-1])
+            row_offset = (np.arange(self._n_rows) * 2**n_subsystem_qubits)[:, None]
+            count_table += np.bincount((decimal_outcomes + row_offset).reshape(-1), minlength=self._n_rows * 2**n_subsystem_qubits).reshape(self._n_rows, -1)
+        self._n_shots += n_batch_shots
+
+    def get_traced_out_index_counts(self, subsystem_label):
+        """
+        Same as overlapping_tomography.get_traced_out_index_counts for a registered subsystem.
+        """
+        key = self._subsystem_key(subsystem_label)
+        if key not in self._count_tables:
+            raise ValueError(f'Subsystem {key} was not registered before the outcomes were added.')
+        return self._count_tables[key].copy()
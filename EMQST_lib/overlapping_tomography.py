@@ -4,7 +4,7 @@ from joblib import Parallel, delayed
 from functools import reduce
 from itertools import product, chain, combinations
 from EMQST_lib import support_functions as sf
-from EMQST_lib.povm import POVM, generate_pauli_6_rotation_matrice
+from EMQST_lib.povm import POVM, POVMArray, get_POVM_buffer, generate_pauli_6_rotation_matrice
 from EMQST_lib import dt
 
 
@@ -19,6 +19,8 @@ def trace_out(qubit_to_keep_labels, qubit_array):
     Returns:
         ndarray: The traced out array.
     """
+    if hasattr(qubit_array, "trace_out"): # Outcome containers such as outcomes.PackedOutcomes
+        return qubit_array.trace_out(qubit_to_keep_labels)
     # Sort labels such that input order does not matter.
     # Note the last conversion as we order our qubits in reverse order, [3,2,1,0]
     qubit_to_keep_labels = np.sort(qubit_to_keep_labels)[::-1]
@@ -172,10 +174,10 @@ def get_index_counts_from_decimal_outcomes(decimal_outcomes,n_subsysten_qubits):
 
 
 
-def create_traced_out_calibration_states(subsystem_labels, hash_family, one_qubit_calibration_states, n_hash_symbols, n_qubits_total):
+def create_traced_out_calibration_instructions(subsystem_labels, hash_family, n_hash_symbols, n_qubits_total):
     """
-    Takes in index of the qubits of intrest and the full set of measurements on the whole system and
-    traces it down to the outcomes on the system of interest, and provies the set of calibraton states on the relevant system. 
+    Returns the calibration instructions of each hashed row traced down to the subsystem, shape (n_rows, n_subsystem_qubits).
+    The instructions are the index of the one qubit calibration state on each subsystem qubit, in descending qubit label order.
     """
   
     # Sort labels in descending order  
@@ -188,20 +190,20 @@ def create_traced_out_calibration_states(subsystem_labels, hash_family, one_qubi
     subsystem_qubit_index = qubit_label_to_list_index(subsystem_labels,n_qubits_total)
     # Create the instructions for the hashed subsystem (NOTE we slice out only the subsystem qubits from the hash family)
     hashed_subsystem_instructions = np.array([hash_to_instruction(function, instructin_list, n_hash_symbols) for function in hash_family[:,subsystem_qubit_index]]).reshape(-1, n_subsystem_qubits)
-    #print(hashed_subsystem_instructions.shape)
     # Base instructions are the same for all subsystems.
     base_subsystem_instructions = np.array([[0]*n_subsystem_qubits,[1]*n_subsystem_qubits,[2]*n_subsystem_qubits,[3]*n_subsystem_qubits])
     combined_hashed_subsystem_instructions = np.vstack((hashed_subsystem_instructions,base_subsystem_instructions))
+    return combined_hashed_subsystem_instructions
+
+
+def create_traced_out_calibration_states(subsystem_labels, hash_family, one_qubit_calibration_states, n_hash_symbols, n_qubits_total):
+    """
+    Takes in index of the qubits of intrest and the full set of measurements on the whole system and
+    traces it down to the outcomes on the system of interest, and provies the set of calibraton states on the relevant system. 
+    """
+    combined_hashed_subsystem_instructions = create_traced_out_calibration_instructions(subsystem_labels, hash_family, n_hash_symbols, n_qubits_total)
     # The calibration states are tensored together, to be at most 4 qubit operators, according to the traced down hash. 
     traced_out_calib_states = np.array([calibration_states_from_instruction(instruction,one_qubit_calibration_states,True) for instruction in combined_hashed_subsystem_instructions])
-    #traced_out_base_states = np.array([ot.calibration_states_from_instruction(instruction,one_qubit_calibration_states,True) for instruction in base_subsystem_instructions])
-    #print(traced_out_calib_states.shape)
-    # Reshape and combine the calibration sates with the base states into one large set of measurements. 
-    #traced_out_calib_states = traced_out_calib_states.reshape(-1,*traced_out_calib_states.shape[-2:])
-    
-    # Combine the outcomes and calibration states into one large array.
-    #combined_calib_states = np.concatenate((traced_out_calib_states.reshape(-1,*traced_out_calib_states.shape[-2:]),traced_out_base_states), axis = 0)
-
     return traced_out_calib_states 
 
 
@@ -210,7 +212,7 @@ def create_traced_out_calibration_states(subsystem_labels, hash_family, one_qubi
 def create_traced_out_reconstructed_POVM(subsystem_labels, reconstructed_comp_POVM, hash_family, n_hash_symbols, n_qubits_total):
     # Create a fully Pauli POVM from reconstructed computational basis POVM
     subsystem_labels = np.sort(subsystem_labels)[::-1]
-    reconstructed_Pauli_POVM = POVM.generate_Pauli_from_comp(reconstructed_comp_POVM)
+    reconstructed_Pauli_POVM = POVMArray.generate_Pauli_from_comp(reconstructed_comp_POVM)
 
     n_subsystem_qubits = len(subsystem_labels)
     # ii) Create the POVM list that assosicated to each row in the downconverted frequency list
@@ -255,8 +257,10 @@ def subsystem_instructions_to_POVM(instructions, reconstructed_Pauli_POVM, n_sub
     """
 
     base_3 = np.array([3**i for i in range(n_subsystem_qubits)])[::-1]
-    
-    povm_array = np.array([reconstructed_Pauli_POVM[np.dot(instruction,base_3)] for instruction in instructions])
+    povm_index = np.asarray(instructions, dtype=int).reshape(-1, n_subsystem_qubits) @ base_3
+    if isinstance(reconstructed_Pauli_POVM, POVMArray):
+        return reconstructed_Pauli_POVM[povm_index]
+    povm_array = np.asarray(reconstructed_Pauli_POVM)[povm_index]
     return povm_array
 
 
@@ -266,7 +270,10 @@ def get_traced_out_index_counts(outcomes, subsystem_label):
     Takes in outcomes and subsystem labels and returns the index counts for the subsystem.
     The order of the input subsystem labels does not matter.
     The index counts are returned in the decending order of the subsystem labels. E.g subsystem label 0 is always the last entry in the returned array.
+    Count containers such as outcomes.ClusterCounts compute the index counts themselves.
     """
+    if hasattr(outcomes, "get_traced_out_index_counts"):
+        return outcomes.get_traced_out_index_counts(subsystem_label)
     n_subsystem_qubits = len(subsystem_label)
     traced_out_outcomes = trace_out(subsystem_label,outcomes)
     decimal_outcomes = sf.binary_to_decimal_array(traced_out_outcomes)
@@ -287,7 +294,7 @@ def OT_MLE(hashed_subsystem_reconstructed_Pauli_6, index_counts):
 
     """
 
-    full_operator_list = np.array([a.get_POVM() for a in hashed_subsystem_reconstructed_Pauli_6])
+    full_operator_list = get_POVM_buffer(hashed_subsystem_reconstructed_Pauli_6)
     dim = full_operator_list.shape[-1]
     OP_list = full_operator_list.reshape(-1,dim,dim)
     index_counts = index_counts.reshape(-1)
@@ -436,12 +443,51 @@ def QDT(subsystem_label, QDT_index_counts, hash_family, n_hash_symbols, n_qubits
 
     """
     n_subsystem_qubits = len(subsystem_label)
-    hashed_subsystem_calibration_states = create_traced_out_calibration_states(subsystem_label, hash_family, one_qubit_calibration_states, n_hash_symbols, n_qubits)
+    # The hashed calibration states are products of the one qubit calibration states, so the counts are merged
+    # onto the grid of all product states, and the MLE works directly with the one qubit states.
+    calibration_instructions = create_traced_out_calibration_instructions(subsystem_label, hash_family, n_hash_symbols, n_qubits)
+    pattern_counts = dt.merge_calibration_counts(calibration_instructions, QDT_index_counts, len(one_qubit_calibration_states))
     guess_POVM = POVM.generate_computational_POVM(n_subsystem_qubits)[0]
-    reconstructed_comp_POVM = dt.POVM_MLE(n_subsystem_qubits, QDT_index_counts, hashed_subsystem_calibration_states, guess_POVM)
+    reconstructed_comp_POVM = dt.POVM_MLE_product(n_subsystem_qubits, pattern_counts, one_qubit_calibration_states, guess_POVM)
     return reconstructed_comp_POVM
 
 
+def QDT_batch(subsystem_labels, QDT_index_counts, hash_family, n_hash_symbols, n_qubits, one_qubit_calibration_states):
+    """
+    Performs QDT on a stack of subsystems with the same number of qubits, solving all reconstructions in one batched MLE.
+
+    Args:
+        subsystem_labels (ndarray): Labels of the subsystems, shape (n_subsystems, n_subsystem_qubits).
+        QDT_index_counts (ndarray): Index counts of each subsystem, see QDT.
+        Remaining arguments are the same as for QDT.
+
+    Returns:
+        ndarray: Array of reconstructed computational POVMs, in the order of subsystem_labels.
+    """
+    n_subsystem_qubits = len(subsystem_labels[0])
+    pattern_counts = np.array([dt.merge_calibration_counts(create_traced_out_calibration_instructions(subsystem_labels[i], hash_family, n_hash_symbols, n_qubits), QDT_index_counts[i], len(one_qubit_calibration_states)) for i in range(len(subsystem_labels))])
+    guess_POVM = POVM.generate_computational_POVM(n_subsystem_qubits)[0]
+    return dt.POVM_MLE_product_batch(n_subsystem_qubits, pattern_counts, one_qubit_calibration_states, guess_POVM)
+
+
+def batched_QDOT(QDT_subsystem_labels, QDT_index_counts, hash_family, n_hash_symbols, n_qubits, one_qubit_calibration_states, n_cores, verbose = 1):
+    """
+    Reconstructs the POVMs of all subsystems. Subsystems are grouped by size, and each group is split into
+    one batch per core, such that each parallel task solves a whole stack of problems with QDT_batch.
+    Returns the reconstructed POVMs in the order of QDT_subsystem_labels.
+    """
+    subsystem_sizes = np.array([len(label) for label in QDT_subsystem_labels])
+    reconstructed_POVMs = np.empty(len(QDT_subsystem_labels), dtype=object)
+    for size in np.unique(subsystem_sizes):
+        group_index = np.flatnonzero(subsystem_sizes == size)
+        batches = [batch for batch in np.array_split(group_index, max(1, min(n_cores, len(group_index)))) if len(batch) > 0]
+        results = Parallel(n_jobs = n_cores, verbose = verbose)(delayed(QDT_batch)(np.array([QDT_subsystem_labels[i] for i in batch]), np.array([QDT_index_counts[i] for i in batch]), hash_family, n_hash_symbols, n_qubits, one_qubit_calibration_states) for batch in batches)
+        for batch, batch_POVMs in zip(batches, results):
+            for i, povm in zip(batch, batch_POVMs):
+                reconstructed_POVMs[i] = povm
+    return reconstructed_POVMs
+
+
 def create_2RDM_hash(n_total_qubits):
     """
     Create a hash family for the 2-RDM (two-particle reduced density matrix) using the Wilczek hashing function.
@@ -782,15 +828,6 @@ def POVM_reduction_premade_cluster_QST(two_point, noise_cluster_labels, QST_outc
     relevant_cluste_index = get_cluster_index_from_correlator_labels(noise_cluster_labels, two_point)
     relevant_cluster_labels = [np.sort(noise_cluster_labels[index])[::-1] for index in relevant_cluste_index]
     relevant_cluster_POVMs = [clustered_QDOT[index] for index in relevant_cluste_index]
-    # Trace down to the relevant cluster qubits.
-    traced_out_cluster_outcomes = [trace_out(cluster,QST_outcomes) for cluster in relevant_cluster_labels]
-    
-    # Join the outcomes if there are two clusters.
-    if len(relevant_cluster_labels) == 1:
-        joined_outcomes = traced_out_cluster_outcomes[0]
-    else:
-        joined_outcomes = np.array([np.concatenate(tuple(traced_out_cluster_outcomes),axis = 2)])[0]
-
     # Find the total number of qubits.
     n_cluster_qubits = sum([len(cluster) for cluster in relevant_cluster_labels])
     # Reduce down the POVMs to the relevant correlator qubits while keeping full cluster outcome structure. 
@@ -801,8 +838,19 @@ def POVM_reduction_premade_cluster_QST(two_point, noise_cluster_labels, QST_outc
     else:
         tensored_reduced_POVM = POVM(np.array([np.kron(reduced_POVM_A,reduced_POVM_B) for reduced_POVM_A in reduced_POVM[0]  for reduced_POVM_B in reduced_POVM[1]]))
     # Collect outcomes to index-counts for the new tensor-product POVM structure. 
-    decimal_outcomes = sf.binary_to_decimal_array(joined_outcomes)
-    index_counts = np.array([np.bincount(outcomes,minlength =2**n_cluster_qubits) for outcomes in decimal_outcomes])
+    if hasattr(QST_outcomes, "get_index_counts"):
+        index_counts = QST_outcomes.get_index_counts(np.concatenate(relevant_cluster_labels))
+    else:
+        # Trace down to the relevant cluster qubits.
+        traced_out_cluster_outcomes = [trace_out(cluster,QST_outcomes) for cluster in relevant_cluster_labels]
+        
+        # Join the outcomes if there are two clusters.
+        if len(relevant_cluster_labels) == 1:
+            joined_outcomes = traced_out_cluster_outcomes[0]
+        else:
+            joined_outcomes = np.array([np.concatenate(tuple(traced_out_cluster_outcomes),axis = 2)])[0]
+        decimal_outcomes = sf.binary_to_decimal_array(joined_outcomes)
+        index_counts = np.array([np.bincount(outcomes,minlength =2**n_cluster_qubits) for outcomes in decimal_outcomes])
     # Reconstruct the RDM for the two-point correlator.
     rho_recon = QST(two_point, index_counts, hash_family, n_hash_symbols, n_qubits,  tensored_reduced_POVM)
     return rho_recon
@@ -1133,7 +1181,7 @@ def QST_from_instructions(QST_outcomes, QST_instructions, two_point_correlators,
         
     n_local_qubits = len(relevant_qubit_labels_sorted)
     if n_local_qubits < 6: # Run faster MLE
-        reconstructed_Pauli_POVM = POVM.generate_Pauli_from_comp(sorted_POVM_list)
+        reconstructed_Pauli_POVM = POVMArray.generate_Pauli_from_comp(sorted_POVM_list)
         combined_povm_array = subsystem_instructions_to_POVM(translated_instruction, reconstructed_Pauli_POVM, n_local_qubits) 
         rho_recon = OT_MLE(combined_povm_array, cluster_QST_index_counts)
     
@@ -1184,8 +1232,7 @@ def reconstruct_all_two_qubit_POVMs(QDT_outcomes, n_qubits, hash_family, n_hash_
 def reconstruct_spesific_two_qubit_POVMs(QDT_outcomes, QDT_subsystem_labels , n_qubits, hash_family, n_hash_symbols, one_qubit_calibration_states, n_cores):
     QDT_index_counts =  Parallel(n_jobs = 1, verbose = 1)(delayed(get_traced_out_index_counts)(QDT_outcomes, subsystem_label) for subsystem_label in QDT_subsystem_labels)
     QDT_index_counts = np.asarray(QDT_index_counts)
-    two_point_POVM = Parallel(n_jobs = n_cores, verbose = 1)(delayed(parallel_QDOT)(QDT_subsystem_labels[i], QDT_index_counts[i], hash_family, n_hash_symbols, n_qubits, one_qubit_calibration_states) for i in range(len(QDT_subsystem_labels)))
-    two_point_POVM = np.asarray(two_point_POVM)
+    two_point_POVM = batched_QDOT(QDT_subsystem_labels, QDT_index_counts, hash_family, n_hash_symbols, n_qubits, one_qubit_calibration_states, n_cores)
     return two_point_POVM
 
 
@@ -1193,15 +1240,16 @@ def reconstruct_all_one_qubit_POVMs(QDT_outcomes, n_qubits, hash_family, n_hash_
     # Create all 1 qubit POVMS for comparison
     one_qubit_subsystem_labels = np.array([[i] for i in range(n_qubits)])[::-1] # This creates qubit label order [..., 3,2,1,0]
     one_qubit_QDT_index_counts = [get_traced_out_index_counts(QDT_outcomes, subsystem_label) for subsystem_label in one_qubit_subsystem_labels]
-    one_qubit_POVMs = Parallel(n_jobs = n_cores,verbose = 1)(delayed(parallel_QDOT)(one_qubit_subsystem_labels[i], one_qubit_QDT_index_counts[i], hash_family, n_hash_symbols, n_qubits, one_qubit_calibration_states) for i in range(len(one_qubit_subsystem_labels)))
-    return one_qubit_POVMs
+    one_qubit_POVMs = batched_QDOT(one_qubit_subsystem_labels, one_qubit_QDT_index_counts, hash_family, n_hash_symbols, n_qubits, one_qubit_calibration_states, n_cores)
+    return list(one_qubit_POVMs)
 
 
 def reconstruct_POVMs_from_noise_labels(QDT_outcomes,noise_cluster_labels, n_qubits, hash_family, n_hash_symbols, one_qubit_calibration_states, n_cores ):
     # Create a all POVMS for the noise clusters
     QDT_index_counts = [get_traced_out_index_counts(QDT_outcomes, subsystem_label) for subsystem_label in noise_cluster_labels]
-    clustered_QDOT = Parallel(n_jobs = n_cores,verbose = 10)(delayed(parallel_QDOT)(noise_cluster_labels[i], QDT_index_counts[i], hash_family, n_hash_symbols, n_qubits, one_qubit_calibration_states) for i in range(len(noise_cluster_labels)))
-    return clustered_QDOT
+    # Clusters are grouped by size, such that all clusters of the same size are reconstructed in batches.
+    clustered_QDOT = batched_QDOT(noise_cluster_labels, QDT_index_counts, hash_family, n_hash_symbols, n_qubits, one_qubit_calibration_states, n_cores, verbose = 10)
+    return list(clustered_QDOT)
 
 
 
@@ -1356,7 +1404,7 @@ def perform_comparative_QST(noise_cluster_labels,  two_point_corr_label, QST_out
     
     if 0 in comparison_methods: # No QREM
         # To create naiv instruction we supply a standard Pauli-POVM
-        naive_POVM =  POVM.generate_Pauli_POVM(len(two_point_corr_label))
+        naive_POVM =  POVMArray.generate_Pauli_POVM(len(two_point_corr_label))
         naive_POVM_instructions = subsystem_instructions_to_POVM(two_point_POVM_instuctions, naive_POVM, len(two_point_corr_label))
         no_QREM_two_RDM_recon = [OT_MLE(naive_POVM_instructions, index_counts)for index_counts in traced_index_counts] # Each index count is for one of the n_averages states
         result_array.append(no_QREM_two_RDM_recon)
@@ -1365,13 +1413,13 @@ def perform_comparative_QST(noise_cluster_labels,  two_point_corr_label, QST_out
         
         two_index = qubit_label_to_list_index(np.sort(two_point_corr_label)[::-1], n_qubits)
         factorized_POVMs = POVM.tensor_POVM(one_qubit_POVMs[two_index[0]],one_qubit_POVMs[two_index[1]])[0]
-        factorized_pauli_POVM = POVM.generate_Pauli_from_comp(factorized_POVMs)
+        factorized_pauli_POVM = POVMArray.generate_Pauli_from_comp(factorized_POVMs)
         factorized_POVM_instructions = subsystem_instructions_to_POVM(two_point_POVM_instuctions, factorized_pauli_POVM, len(two_point_corr_label))
         factorized_rho_recon =  [OT_MLE(factorized_POVM_instructions, index_counts) for index_counts in traced_index_counts]
         result_array.append(factorized_rho_recon)
         
     if 2 in comparison_methods: # Two-point REMST method
-        two_point_Pauli_POVM = POVM.generate_Pauli_from_comp(two_point_POVM)
+        two_point_Pauli_POVM = POVMArray.generate_Pauli_from_comp(two_point_POVM)
         two_point_POVM_instructions = subsystem_instructions_to_POVM(two_point_POVM_instuctions, two_point_Pauli_POVM, len(two_point_corr_label))
         two_point_rho_recon = [OT_MLE(two_point_POVM_instructions, index_counts) for index_counts in traced_index_counts]
         result_array.append(two_point_rho_recon)
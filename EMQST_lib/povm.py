@@ -1,6 +1,8 @@
 import numpy as np
 import scipy as sp
 import glob
+import os
+import json
 from scipy.stats import unitary_group
 from scipy.optimize import curve_fit
 from scipy.linalg import sqrtm
@@ -8,6 +10,7 @@ from functools import reduce
 from itertools import repeat, chain, product
 from scipy.optimize import minimize
 from EMQST_lib import support_functions as sf
+from EMQST_lib import channels
 
 
 
@@ -25,7 +28,7 @@ class POVM():
 
     
     def __eq__(self,other):
-        if not isinstance(other, POVM):
+        if not isinstance(other, (POVM, POVMView)):
             return False
         if self.POVM_list.shape != other.get_POVM().shape:
             return False
@@ -207,12 +210,14 @@ class POVM():
 
         Parameters:
         - rho: numpy.ndarray
-            The state of arbitrary dimension.
+            The state of arbitrary dimension, either a density matrix or a statevector of a pure state.
 
         Returns:
         - numpy.ndarray
             The histogram of probabilities for all outcomes defined by POVM.
         """
+        if np.ndim(rho) == 1:
+            return get_statevector_histogram(self.POVM_list, rho)
         return np.real(np.einsum('ijk,kj->i', self.POVM_list, rho))
     
     def get_POVM(self):
@@ -265,10 +270,7 @@ class POVM():
             POVM: The depolarized POVM.
 
         """
-        base_POVM_list = base_POVM.get_POVM()
-        dim = int(len(base_POVM_list[0]))
-        new_list = strength/dim * np.eye(dim) + (1-strength) * base_POVM_list
-        return cls(new_list)
+        return cls(channels.mix_with_identity(base_POVM.get_POVM(), strength))
 
     @classmethod
     def generate_noisy_POVM(cls, base_POVM ,noise_mode):
@@ -302,23 +304,7 @@ class POVM():
             return cls(base_POVM_list)
         
         if n_qubits == 1:
-        
-            if noise_mode == 1: # Constant depolarizing noise
-                p=0.05   
-                Krauss_op=np.array([np.sqrt(1-(3*p)/4)*np.eye(2),np.sqrt(p)*X/2,np.sqrt(p)*Y/2,np.sqrt(p)*Z/2],dtype=complex)
-            elif noise_mode == 2: # Stronger depolarizing noise
-                p=0.2
-                Krauss_op=np.array([np.sqrt(1-(3*p)/4)*np.eye(2),np.sqrt(p)/2*X,np.sqrt(p)*Y/2,np.sqrt(p)*Z/2],dtype=complex)
-            elif noise_mode == 3: # Amplitude damping noise
-                gamma=0.2
-                K0=np.array([[1,0],[0,np.sqrt(1-gamma)]],dtype=complex)
-                K1=np.array([[0,np.sqrt(gamma)],[0,0]],dtype=complex)
-                Krauss_op=np.array([K0.conj().T,K1.conj().T])
-            elif noise_mode == 4: # Constant over-rotation
-                rotAngle=np.pi/5
-                U = np.cos(rotAngle/2)*np.eye(2) - 1j* np.sin(rotAngle/2)*np.array([[0,1],[1,0]])
-                Krauss_op=np.array([U],dtype=complex)
-
+            Krauss_op = channels.single_qubit_kraus(noise_mode)
             noisy_POVM_list=np.einsum('nij,qjk,nlk->qil',Krauss_op,base_POVM_list,Krauss_op.conj())
             return cls(noisy_POVM_list)
         
@@ -375,13 +361,40 @@ class POVM():
                 return cls(noisy_POVM_list)
             
             elif noise_mode == 7: # Strong 2 qubit depolarizing
-                p=0.2
-                new_list=p/2**n_qubits*np.eye(2**n_qubits) + (1-p)*base_POVM_list
-                return cls(new_list)
+                return cls(channels.mix_with_identity(base_POVM_list, 0.2))
                 
             else:
                 print(f'Invalid 2 qubit noise mode {noise_mode}, returning None.')
                 return None
+
+        else: # Arbitrary number of qubits
+            return cls.generate_noisy_POVM_list(np.array([base_POVM]), noise_mode)[0]
+
+    @classmethod
+    def generate_noisy_POVM_list(cls, base_POVM_list, noise_mode):
+        """
+        Applies noise to a list of POVMs of arbitrary qubit number in a single batched contraction.
+        noise_mode (n qubits)
+        0: No noise
+        1-4: The single qubit noise modes of generate_noisy_POVM applied independently to every qubit.
+        5, 6: Only defined for 2 qubits, falls back to depolarized_POVM with the default strength 0.1.
+        7: Strong depolarizing, the same as the 2 qubit noise mode 7 of generate_noisy_POVM.
+        For 1 and 2 qubits, use generate_noisy_POVM to get the dedicated noise modes.
+        Raises ValueError for unknown noise modes.
+        """
+        POVM_stack = get_POVM_buffer(base_POVM_list)
+        n_qubits = int(np.log2(POVM_stack.shape[-1]))
+        if noise_mode == 0:
+            noisy_stack = POVM_stack
+        elif noise_mode in [1, 2, 3, 4]:
+            noisy_stack = channels.apply_local_kraus(POVM_stack, channels.single_qubit_kraus(noise_mode), n_qubits)
+        elif noise_mode in [5, 6]: # No n-qubit definition, same noise as depolarized_POVM
+            noisy_stack = channels.mix_with_identity(POVM_stack, 0.1)
+        elif noise_mode == 7:
+            noisy_stack = channels.mix_with_identity(POVM_stack, 0.2)
+        else:
+            raise ValueError(f'Invalid {n_qubits} qubit noise mode {noise_mode}.')
+        return np.array([cls(np.array(povm)) for povm in noisy_stack])
             
             
     
@@ -554,35 +567,11 @@ class POVM():
         if len(self.POVM_list[0]) != 4:
             print("The POVM is not a two qubit POVM")
             return None
-        states = np.array([[[1,0], [0,0]],[[0,0], [0,1]] ])
-        if mode == 'AC': # Uses the average case measure	
-            POVM_A = self.reduce_POVM_two_to_one(states[0],0)    
-            POVM_B = self.reduce_POVM_two_to_one(states[1],0)
-            diff = POVM_A.get_POVM()[0] - POVM_B.get_POVM()[0]
-            c_0_to_1 = 1/2 * np.sqrt(np.linalg.norm(diff)**2 + np.abs(np.trace(diff))**2)
-            
-            
-            POVM_A = self.reduce_POVM_two_to_one(states[0],1)    
-            POVM_B = self.reduce_POVM_two_to_one(states[1],1)
-            diff = POVM_A.get_POVM()[0] - POVM_B.get_POVM()[0]
-            # print(f'norm {np.linalg.norm(diff)}')
-            #print(f"trace {np.real(np.trace(diff))}")
-            c_1_to_0 = 1/2 * np.sqrt(np.linalg.norm(diff)**2 + np.abs(np.trace(diff))**2)
-            
-        elif mode == 'WC': # Uses the wors case measure
-            POVM_A = self.reduce_POVM_two_to_one(states[0],0)    
-            POVM_B = self.reduce_POVM_two_to_one(states[1],0)
-            c_0_to_1 = np.linalg.norm(POVM_A.get_POVM()[0] - POVM_B.get_POVM()[0], ord = np.inf)
-
-            POVM_A = self.reduce_POVM_two_to_one(states[0],1)    
-            POVM_B = self.reduce_POVM_two_to_one(states[1],1)
-            c_1_to_0 = np.linalg.norm(POVM_A.get_POVM()[0] - POVM_B.get_POVM()[0], ord = np.inf)
-        
-        else:
+        if mode not in ['AC', 'WC']:
             print("Invalid mode. Please select either 'AC' or 'WC' ")
             return None
-  
-        return np.array([c_0_to_1,c_1_to_0])
+        # 'AC' uses the average case measure, 'WC' uses the worst case measure.
+        return get_classical_correlation_coefficient_batch(self.POVM_list[None], mode)[0]
         
              
         
@@ -596,21 +585,7 @@ class POVM():
             print("The POVM is not a two qubit POVM")
             return None
         
-        povm_array = self.POVM_list
-        
-
-        if qubit == 0:
-            op = np.kron(np.eye(2),rho)
-            combined_op = np.einsum('ijk,kl->ijl',povm_array,op).reshape((-1,2,2,2,2))
-            traced_down_povm = np.einsum('ijklk->ijl',combined_op)
-            summed_povm = np.array([traced_down_povm[0] + traced_down_povm[1], traced_down_povm[2] + traced_down_povm[3]])
-        else: 
-            op = np.kron(rho, np.eye(2))
-            combined_op = np.einsum('ijk,kl->ijl',povm_array,op).reshape((-1,2,2,2,2))
-            traced_down_povm = np.einsum('ikjkl->ijl',combined_op)
-            summed_povm = np.array([traced_down_povm[0] + traced_down_povm[2],traced_down_povm[1] + traced_down_povm[3]])
-        
-        return POVM(summed_povm)
+        return POVM(reduce_POVM_two_to_one_batch(self.POVM_list[None], rho, qubit)[0])
     
     
     def get_classical_POVM(self):
@@ -642,12 +617,261 @@ class POVM():
         
         return sf.ac_POVM_distance(self.get_POVM(), M.get_POVM())    
         
+class POVMView():
+    """
+    Light-weight element of a POVMArray. It behaves like a POVM object, but does not own any data.
+    get_POVM() returns a read-only view into the buffer of the parent array instead of a copy.
+    """
+    __slots__ = ('_parent', '_index')
+
+    def __init__(self, parent, index):
+        self._parent = parent
+        self._index = index
+
+    @property
+    def POVM_list(self):
+        return self._parent._buffer[self._index]
+
+    def __eq__(self, other):
+        if not isinstance(other, (POVM, POVMView)):
+            return False
+        if self.POVM_list.shape != other.POVM_list.shape:
+            return False
+        return np.all(self.POVM_list==other.POVM_list)
+
+    def __str__(self):
+        return f"Printing of POVM view:\n{self.POVM_list}"
+
+    def get_POVM(self):
+        """
+        Returns a read-only view of the POVM elements.
+        """
+        return self.POVM_list
+
+    def get_angles(self):
+        """
+        Returns a copy of the angle representation of the POVM.
+        """
+        if self._parent._angles is None:
+            return np.array([])
+        return np.copy(self._parent._angles[self._index])
+
+    def get_histogram(self, rho):
+        if np.ndim(rho) == 1:
+            return get_statevector_histogram(self.POVM_list, rho)
+        return np.real(np.einsum('ijk,kj->i', self.POVM_list, rho))
+
+    def get_n_qubits(self):
+        return self._parent.get_n_qubits()
+
+    def to_POVM(self):
+        """
+        Returns an independent POVM object with a copy of the data.
+        """
+        return POVM(np.copy(self.POVM_list), self.get_angles())
+
+
+class POVMArray():
+    """
+    Structure-of-arrays container for many POVMs of equal size.
+    All POVMs are stored in a single contiguous buffer of shape (n_povms, n_outcomes, dim, dim), which is only
+    exposed through read-only views. Indexing with an integer returns a POVMView, while indexing with a slice
+    or an index array returns a new POVMArray.
+    """
+    __slots__ = ('_buffer', '_angles')
+
+    def __init__(self, povm_buffer, angle_buffer=None):
+        """
+        Args:
+            povm_buffer (ndarray): Array of shape (n_povms, n_outcomes, dim, dim).
+            angle_buffer (ndarray, optional): Angle representation of shape (n_povms, n_outcomes, n_qubits, 2).
+        """
+        buffer = np.ascontiguousarray(povm_buffer, dtype=complex)
+        if buffer.ndim != 4:
+            raise ValueError(f"POVM buffer must have shape (n_povms, n_outcomes, dim, dim), got {buffer.shape}.")
+        buffer = buffer.view()
+        buffer.flags.writeable = False
+        self._buffer = buffer
+        if angle_buffer is not None:
+            angle_buffer = np.asarray(angle_buffer)
+            if angle_buffer.size == 0 or len(angle_buffer) != len(buffer):
+                angle_buffer = None
+        self._angles = angle_buffer
+
+    @classmethod
+    def from_POVM_list(cls, POVM_list):
+        """
+        Stacks a list (or object array) of equal-sized POVM objects into one buffer.
+        """
+        if isinstance(POVM_list, POVMArray):
+            return POVM_list
+        buffer = np.array([povm.POVM_list for povm in POVM_list], dtype=complex)
+        angles = [povm.get_angles() for povm in POVM_list]
+        if any(angle.size == 0 for angle in angles) or len({angle.shape for angle in angles}) != 1:
+            return cls(buffer)
+        return cls(buffer, np.array(angles))
+
+    @classmethod
+    def tensor_POVM(cls, POVM_1, POVM_2):
+        """
+        Tensor product of all combinations of two POVM arrays, in the same order as POVM.tensor_POVM.
+        """
+        POVM_1 = cls.from_POVM_list(POVM_1)
+        POVM_2 = cls.from_POVM_list(POVM_2)
+        A = POVM_1._buffer
+        B = POVM_2._buffer
+        n_a, n_out_a, d_a = A.shape[:3]
+        n_b, n_out_b, d_b = B.shape[:3]
+        buffer = np.einsum('aixy,bjzw->abijxzyw', A, B).reshape(n_a*n_b, n_out_a*n_out_b, d_a*d_b, d_a*d_b)
+        angles = None
+        if POVM_1._angles is not None and POVM_2._angles is not None:
+            angle_a = POVM_1._angles
+            angle_b = POVM_2._angles
+            angles = np.concatenate((np.broadcast_to(angle_a[:,None,:,None], (n_a, n_b, n_out_a, n_out_b, *angle_a.shape[2:])),
+                                     np.broadcast_to(angle_b[None,:,None,:], (n_a, n_b, n_out_a, n_out_b, *angle_b.shape[2:]))), axis=4)
+            angles = angles.reshape(n_a*n_b, n_out_a*n_out_b, *angles.shape[4:])
+        return cls(buffer, angles)
+
+    @classmethod
+    def generate_Pauli_POVM(cls, n_qubits):
+        """
+        Returns the 3**n_qubits Pauli POVMs in the same order as POVM.generate_Pauli_POVM.
+        """
+        single = cls.from_POVM_list(POVM.generate_Pauli_POVM(1))
+        POVM_array = single
+        for _ in range(n_qubits - 1):
+            POVM_array = cls.tensor_POVM(POVM_array, single)
+        return POVM_array
+
+    @classmethod
+    def generate_Pauli_from_comp(cls, comp_POVM):
+        """
+        Equivalent of POVM.generate_Pauli_from_comp, but the rotated POVMs are returned in one contiguous buffer.
+        """
+        comp_list = np.asarray(comp_POVM.POVM_list)
+        n_qubits = int(np.log2(len(comp_list[0])))
+        tensored_rot = generate_pauli_6_rotation_matrice(n_qubits)
+        new_mesh = np.einsum('nij, mjk, nkl->nmil', tensored_rot, comp_list, np.transpose(tensored_rot, axes=[0,2,1]).conj())
+        return cls(new_mesh)
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def __iter__(self):
+        for i in range(len(self._buffer)):
+            yield POVMView(self, i)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self._buffer)
+            if index < 0 or index >= len(self._buffer):
+                raise IndexError("POVMArray index out of range.")
+            return POVMView(self, int(index))
+        angles = None if self._angles is None else self._angles[index]
+        return POVMArray(self._buffer[index], angles)
+
+    def get_POVM_array(self):
+        """
+        Returns a read-only view of the full buffer of shape (n_povms, n_outcomes, dim, dim).
+        """
+        return self._buffer
+
+    def get_operator_list(self):
+        """
+        Returns a read-only view of all POVM elements flattened to shape (n_povms*n_outcomes, dim, dim).
+        """
+        return self._buffer.reshape(-1, *self._buffer.shape[-2:])
+
+    def get_n_qubits(self):
+        return int(np.log2(self._buffer.shape[-1]))
+
+    def get_histograms(self, rho):
+        """
+        Returns the outcome probabilities of all POVMs for the state rho, shape (n_povms, n_outcomes).
+        """
+        return np.real(np.einsum('pijk,kj->pi', self._buffer, rho))
+
+    def to_POVM_list(self):
+        """
+        Returns an object array of independent POVM objects.
+        """
+        return np.array([view.to_POVM() for view in self])
+
+
+def get_POVM_buffer(POVM_list):
+    """
+    Returns the POVM elements of a list of POVMs as an array of shape (n_povms, n_outcomes, dim, dim).
+    A POVMArray is returned as a view without copying, lists of POVM objects are stacked.
+    """
+    if isinstance(POVM_list, POVMArray):
+        return POVM_list.get_POVM_array()
+    return np.array([a.get_POVM() for a in POVM_list])
+
+
+def get_statevector_histogram(povm_elements, psi):
+    """
+    Outcome probabilities <psi|E_i|psi> of pure states given as statevectors, psi of shape (..., dim).
+    POVMs that are diagonal in the computational basis only need the computational basis probabilities |<e|psi>|^2.
+    Returns an array of shape (..., n_outcomes).
+    """
+    povm_elements = np.asarray(povm_elements)
+    diagonals = np.einsum('ijj->ij', povm_elements)
+    if np.count_nonzero(povm_elements) == np.count_nonzero(diagonals):
+        return np.real(np.abs(psi)**2 @ diagonals.T)
+    return np.real(np.einsum('...j,ijk,...k->...i', np.conj(psi), povm_elements, psi, optimize=True))
+
+
 def get_classical_correlation_coefficient(povm_array,  mode = 'WC'):
     """
     Takes in numpy array of POVMs and computes the classical correlation coefficient.
     """
     return np.array(POVM(povm_array).get_classical_correlation_coefficient(mode = mode))
 
+def reduce_POVM_two_to_one_batch(povm_stack, rho, qubit=0):
+    """
+    Batched version of POVM.reduce_POVM_two_to_one.
+    Traces down a stack of two qubit POVMs to single qubit POVMs, with rho the single qubit state of the traced out qubit.
+    Args:
+        povm_stack (ndarray): Two qubit POVMs of shape (n_pairs, 4, 4, 4).
+        rho (ndarray): Single qubit state of shape (2, 2).
+        qubit (int): Qubit that is traced out.
+    Returns:
+        ndarray: Single qubit POVMs of shape (n_pairs, 2, 2, 2).
+    """
+    # Index order [pair, outcome_1, outcome_0, row_1, row_0, col_1, col_0]
+    povm_tensor = np.asarray(povm_stack).reshape(-1, 2, 2, 2, 2, 2, 2)
+    if qubit == 0:
+        return np.einsum('pxyakbm,mk->pxab', povm_tensor, rho)
+    else:
+        return np.einsum('pyxkamb,mk->pxab', povm_tensor, rho)
+
+
+def get_classical_correlation_coefficient_batch(povm_stack, mode = 'WC'):
+    """
+    Batched version of POVM.get_classical_correlation_coefficient for a stack of two qubit POVMs.
+    Since the environment states are computational basis states, the reduced POVMs are read off as slices of the POVM tensor.
+    Args:
+        povm_stack (ndarray): Two qubit POVMs of shape (n_pairs, 4, 4, 4).
+        mode (str): 'WC' for the worst case or 'AC' for the average case measure.
+    Returns:
+        ndarray: Coefficients [c_0->1, c_1->0] of shape (n_pairs, 2).
+    """
+    povm_tensor = np.asarray(povm_stack).reshape(-1, 2, 2, 2, 2, 2, 2)
+    # First outcome of the reduced POVM, with the traced out qubit in state |0> minus in state |1>.
+    reduced_0 = povm_tensor[:, 0].sum(axis=1)  # [pair, row_1, row_0, col_1, col_0]
+    reduced_1 = povm_tensor[:, :, 0].sum(axis=1)
+    diff = np.array([reduced_0[:, :, 0, :, 0] - reduced_0[:, :, 1, :, 1],
+                     reduced_1[:, 0, :, 0, :] - reduced_1[:, 1, :, 1, :]])
+    if mode == 'AC':
+        coefficients = 1/2 * np.sqrt(np.sum(np.abs(diff)**2, axis=(-2,-1)) + np.abs(np.einsum('...ii->...', diff))**2)
+    elif mode == 'WC':
+        coefficients = np.max(np.sum(np.abs(diff), axis=-1), axis=-1)
+    else:
+        raise ValueError("Invalid mode. Please select either 'AC' or 'WC' ")
+    return coefficients.T
+
+
 def get_quantum_correlation_coefficient(povm_array, mode = 'WC'):
     """
     Takes in numpy array of POVMs and computes the quantum correlation coefficient.
@@ -711,9 +935,128 @@ def generate_pauli_6_rotation_matrice(n_qubits):
     
     return tensored_rot
     
+class ExpPOVMLibrary():
+    """
+    Index of the experimental POVMs supplied in folder structure 1,2,3... with appropriate label file.
+    The folder tree is scanned once, and all POVMs of a given qubit number are stored as a single
+    stacked array of shape (n_files, n_labels, n_outcomes, 2**n_qubit, 2**n_qubit).
+    The index and the stacked arrays can be saved to disk as plain .npy files, such that
+    later instances only read the index and memory-map the POVMs instead of unpickling every DT_settings.npy.
+    """
+    index_name = "exp_povm_index.json"
+
+    def __init__(self, path, cache_path=None):
+        """
+        Args:
+            path (str): The base directory path where the experimental POVM data is stored.
+            cache_path (str, optional): Directory of a saved index. If it contains an index,
+                it is loaded instead of scanning the folder tree.
+        """
+        self.path = path
+        self._index = {}
+        self._povms = {}
+        if cache_path is not None and os.path.isfile(os.path.join(cache_path, self.index_name)):
+            self._load_index(cache_path)
+        else:
+            self._scan()
+
+    def _scan(self):
+        """
+        Scans all qubit number folders and stacks the reconstructed POVMs.
+        """
+        for folder in sorted(os.listdir(self.path)) if os.path.isdir(self.path) else []:
+            if not folder.isdigit():
+                continue
+            n_qubit = int(folder)
+            paths = glob.glob(self.path + f"/{n_qubit}/**/DT_settings.npy",recursive=True)
+            label_path = glob.glob(self.path + f"/{n_qubit}/**/label_order.txt",recursive=True)
+            if len(paths) == 0 or len(label_path) == 0:
+                continue
+            with open(label_path[0], "r") as label_file:
+                label_list = label_file.read().split("\n")
+
+            povm_array = []
+            for dt_path in paths:
+                dt_settings = np.load(dt_path, allow_pickle=True).item()
+                povm_array.append([povm.get_POVM() for povm in dt_settings["reconstructed_POVM_list"]])
+            self._index[n_qubit] = {"paths": paths, "labels": label_list}
+            self._povms[n_qubit] = np.array(povm_array, dtype=complex)
+
+    def _load_index(self, cache_path):
+        """
+        Loads a saved index. The POVM arrays are memory-mapped.
+        """
+        with open(os.path.join(cache_path, self.index_name), "r") as index_file:
+            index = json.load(index_file)
+        for key, entry in index.items():
+            n_qubit = int(key)
+            self._index[n_qubit] = {"paths": entry["paths"], "labels": entry["labels"]}
+            self._povms[n_qubit] = np.load(os.path.join(cache_path, entry["file"]), mmap_mode='r')
+
+    def save(self, cache_path=None):
+        """
+        Saves the index as json and the POVMs as one plain .npy array per qubit number.
+        Args:
+            cache_path (str, optional): Directory to save to. Defaults to the library path.
+        """
+        if cache_path is None:
+            cache_path = self.path
+        os.makedirs(cache_path, exist_ok=True)
+        index = {}
+        for n_qubit, entry in self._index.items():
+            file_name = f"exp_povms_{n_qubit}_qubit.npy"
+            np.save(os.path.join(cache_path, file_name), np.asarray(self._povms[n_qubit]))
+            index[str(n_qubit)] = {"paths": entry["paths"], "labels": entry["labels"], "file": file_name}
+        with open(os.path.join(cache_path, self.index_name), "w") as index_file:
+            json.dump(index, index_file)
+
+    def get_n_qubits(self):
+        return sorted(self._index.keys())
+
+    def get_labels(self, n_qubit):
+        return list(self._index[n_qubit]["labels"])
+
+    def get_POVM_array(self, n_qubit):
+        """
+        Returns the stacked (possibly memory-mapped) POVM array of shape (n_files, n_labels, n_outcomes, dim, dim).
+        """
+        return self._povms[n_qubit]
+
+    def draw_random(self, n_qubit, use_Z_basis_only = False):
+        """
+        Draws a random POVM and sublabel. The draw order is identical to load_random_exp_povm.
+        Returns:
+            tuple: (POVM object, [path of file, label])
+        """
+        if n_qubit not in self._index:
+            raise ValueError(f"No experimental POVMs for {n_qubit} qubits found in {self.path}.")
+        paths = self._index[n_qubit]["paths"]
+        label_list = self._index[n_qubit]["labels"]
+        rand_povm = np.random.randint(len(paths))
+        if use_Z_basis_only:
+            label_index = label_list.index('Z'*n_qubit)
+        else:
+            label_index = np.random.randint(len(label_list))
+        return_povm = POVM(np.array(self._povms[n_qubit][rand_povm, label_index]))
+        return return_povm, [paths[rand_povm], label_list[label_index]]
+
+
+_exp_POVM_libraries = {}
+
+def get_exp_POVM_library(path):
+    """
+    Returns the experimental POVM library of path. The library is only scanned the first time it is requested.
+    If a saved index exists in path, it is used instead of scanning.
+    """
+    if path not in _exp_POVM_libraries:
+        _exp_POVM_libraries[path] = ExpPOVMLibrary(path, cache_path=path)
+    return _exp_POVM_libraries[path]
+
+
 def load_random_exp_povm(path, n_qubit, use_Z_basis_only = False):
     """"
     Loads a random POVM (Positive Operator-Valued Measure) from experimental data supplied in folder structure 1,2,3... with appropriate label file.
+    The folder is only scanned once per path, see ExpPOVMLibrary.
     Args:
         path (str): The base directory path where the experimental POVM data is stored.
         n_qubit (int): The number of qubits for which the POVM data is relevant.
@@ -724,33 +1067,7 @@ def load_random_exp_povm(path, n_qubit, use_Z_basis_only = False):
                 - paths[rand_povm] (str): The path to the file from which the POVM was loaded.
                 - label_list[rand_label] (str): The specific label used within the file.
     """
-    # Load paths. 
-    paths = glob.glob(path + f"/{n_qubit}/**/DT_settings.npy",recursive=True)
-    label_path = glob.glob(path + f"/{n_qubit}/**/label_order.txt",recursive=True)
-    # Load povm sublabels.
-    label_file = open(label_path[0], "r") 
-    data = label_file.read()  
-    label_list = data.split("\n") 
-    label_file.close()
-    n_labels = len(label_list)
-    
-    # Load povm arrays
-    povm_array = []
-    for path in paths:
-        #print(path)
-        dt_settings = np.load(path, allow_pickle=True).item()
-        povm_array.append(dt_settings["reconstructed_POVM_list"])
-        #print(dt_settings["reconstructed_POVM_list"])
-    n_povms = len(povm_array)
-    # Draw random povm and sublabel. 
-    rand_povm = np.random.randint(n_povms)
-    if use_Z_basis_only:
-        label_index = label_list.index('Z'*n_qubit)
-    else:
-        label_index = np.random.randint(n_labels)
-    return_povm = povm_array[rand_povm][label_index]
-    path = [paths[rand_povm],label_list[label_index]]
-    return return_povm, path
+    return get_exp_POVM_library(path).draw_random(n_qubit, use_Z_basis_only)
 
 
 def rotate_and_save_POVMs(input_path):
@@ -2,6 +2,8 @@ import numpy as np
 import os
 from joblib import Parallel, delayed
 from functools import reduce
+from itertools import combinations
+from math import comb
 import scipy as sp
 import pickle 
 
@@ -10,7 +12,10 @@ from EMQST_lib import overlapping_tomography as ot
 from EMQST_lib import measurement_functions as mf
 from EMQST_lib import support_functions as sf
 from EMQST_lib import clustering as cl
-from EMQST_lib.povm import POVM, load_random_exp_povm
+from EMQST_lib import channels
+from EMQST_lib.povm import POVM, get_exp_POVM_library
+from EMQST_lib.outcomes import PackedOutcomes, MarginalCountAccumulator, OutcomeStore
+from EMQST_lib.mps import MPS
 
 
 class QREM:
@@ -37,6 +42,13 @@ class QREM:
         if self._two_point_corr_labels is not None:
             self._n_two_point_correlators = len(self._two_point_corr_labels)
         self._chunk_size = kwargs.get('chunk_size', 4) # Chunk size is to simplify state measurement simulation
+        # 'outcomes' stores every simulated shot, 'packed' stores every shot bit-packed (see outcomes.PackedOutcomes),
+        # 'counts' only stores the joint counts of each cluster/chunk (see outcomes.ClusterCounts),
+        # and 'disk' writes every shot bit-packed to memory-mapped files in outcome_store_path (see outcomes.OutcomeStore).
+        self._outcome_storage = kwargs.get('outcome_storage', 'outcomes')
+        if self._outcome_storage not in ['outcomes', 'packed', 'counts', 'disk']:
+            raise ValueError("Outcome storage not supported, please use 'outcomes', 'packed', 'counts' or 'disk'.")
+        self._outcome_store_path = kwargs.get('outcome_store_path', os.path.join(self._data_path if self._data_path is not None else '.', 'outcome_store'))
 
 
         # Automatic parameters 
@@ -238,14 +250,15 @@ class QREM:
 
         self._n_clusters = len(self._initial_cluster_size)
         self._povm_array = []
+        library = get_exp_POVM_library(self._path_to_exp_POVMs)
         for size in self._initial_cluster_size:
             if noise_mode == 'strong':
                 self._noise_mode = 'strong' + ' exp'
-                noisy_POVM_list, load_path = load_random_exp_povm(self._path_to_exp_POVMs, size)
+                noisy_POVM_list, load_path = library.draw_random(size)
                 self._exp_povms_used.append(load_path)
             elif noise_mode == 'weak':
                 self._noise_mode = 'weak' + ' exp'
-                noisy_POVM_list, load_path = load_random_exp_povm(self._path_to_exp_POVMs, size, use_Z_basis_only=True)
+                noisy_POVM_list, load_path = library.draw_random(size, use_Z_basis_only=True)
                 self._exp_povms_used.append(load_path)
             self._povm_array.append(noisy_POVM_list)
         self.true_cluster_labels = cl.get_true_cluster_labels(self._initial_cluster_size)
@@ -299,41 +312,10 @@ class QREM:
         
         if self._initial_cluster_size is None:
             raise ValueError("Please set the cluster size before setting the POVM array.")
-        X = np.array([[0,1],[1,0]], dtype = complex)
-        Id = np.eye(2)
-        XX = np.kron(X,X)
         self._n_clusters = len(self._initial_cluster_size)
-        self._povm_array = []
         self._noise_mode = 'coherent' + 'angle=' + str(angle)
-        for size in self._initial_cluster_size:
-            rotation_matrix = np.zeros((2**size,2**size),dtype=complex)
-            
-            if size == 1 or size == 2:
-                rot_angle = angle #+ (np.random.random(1)*2-1)*angle*0.2
-                rotation_matrix = sf.rot_about_collective_X(rot_angle, size)
-            else: # If size is larger than 2, iterative next neighbor rotations
-                #print(f'We use the nn rotation model, size = {size}.')
-                
-                full_H = np.zeros((2**size,2**size),dtype=complex)
-                for i in range(size-1): 
-                    H_temp = [Id]*(size-1)
-                    H_temp[i] = XX
-                    #print(H_temp)
-                    #print(len(H_temp))
-                    rot_angle = angle #+ (np.random.random(1)*2-1)*angle*0.2
-                    full_H += -1j/2 *reduce(np.kron,H_temp) * rot_angle
-                #print(size-1)
-                rotation_matrix = sp.linalg.expm(full_H)
-                #print(rotation_matrix)
-            print("Check unitary:")
-            print(np.all(np.isclose(rotation_matrix@rotation_matrix.conj().T,np.eye(2**size))))
-            comp_povm_array = POVM.generate_computational_POVM(size)[0].get_POVM()
-            rotated_POVM = np.einsum('jk,ikl,lm->ijm',rotation_matrix,comp_povm_array,rotation_matrix.conj().T)
-            #print(np.sum(rotated_POVM,axis=0))
-            is_valid = np.all(np.isclose(np.sum(rotated_POVM, axis=0), np.eye(len(rotated_POVM[0]))))
-            print(f'is_valid: {is_valid}')
-            self._povm_array.append(POVM(rotated_POVM))
-                
+        # The rotated POVMs are cached by cluster size and angle, such that each size is only computed once.
+        self._povm_array = [POVM(np.array(channels.coherent_XX_POVM(int(size), angle))) for size in self._initial_cluster_size]
         self.true_cluster_labels = cl.get_true_cluster_labels(self._initial_cluster_size)
 
 
@@ -372,8 +354,57 @@ class QREM:
 
         # Simulate all instruction measurements
         print(f'Simulating QDT measurements for {self._n_qubits} qubits.')
-        QDT_outcomes_parallel = Parallel(n_jobs = self._n_cores, verbose = 1)(delayed(mf.measure_clusters)(self._n_QDT_shots, self._povm_array, rho_array, self._initial_cluster_size) for rho_array in self._hashed_calib_states)
-        self._QDT_outcomes = np.asarray(QDT_outcomes_parallel)
+        if self._outcome_storage == 'counts':
+            self._QDT_outcomes = mf.measure_clusters_counts(self._n_QDT_shots, self._povm_array, self._hashed_calib_states, self._initial_cluster_size)
+        elif self._outcome_storage == 'packed': # Blocks of rows are packed as they are sampled to keep the peak memory low
+            packed_outcomes = mf.measure_hashed_clusters(self._n_QDT_shots, self._povm_array, self._one_qubit_calibration_states, self._hashed_QDT_instructions, self._initial_cluster_size, packed = True)
+            self._QDT_outcomes = PackedOutcomes(packed_outcomes, self._n_qubits)
+        elif self._outcome_storage == 'disk':
+            self._QDT_outcomes = OutcomeStore.create(os.path.join(self._outcome_store_path, 'QDT_outcomes'), len(self._hashed_QDT_instructions), self._n_QDT_shots, self._n_qubits)
+            for start in range(0, len(self._hashed_QDT_instructions), self._QDT_outcomes.row_block_size):
+                block_instructions = self._hashed_QDT_instructions[start:start + self._QDT_outcomes.row_block_size]
+                packed_outcomes = mf.measure_hashed_clusters(self._n_QDT_shots, self._povm_array, self._one_qubit_calibration_states, block_instructions, self._initial_cluster_size, packed = True)
+                self._QDT_outcomes.write_rows(start, PackedOutcomes(packed_outcomes, self._n_qubits))
+            self._QDT_outcomes.flush()
+        else: # Cluster histograms are cached for each distinct local calibration pattern
+            self._QDT_outcomes = mf.measure_hashed_clusters(self._n_QDT_shots, self._povm_array, self._one_qubit_calibration_states, self._hashed_QDT_instructions, self._initial_cluster_size)
+
+    def perform_streamed_QDT_measurements(self, subsystem_labels = None, n_shots_per_batch = 1000, max_registered_counts = 2**26):
+        """
+        Streaming alternative to perform_QDT_measurements. The QDT shots are simulated in batches of n_shots_per_batch
+        and only the counts of the registered subsystems are kept (see outcomes.MarginalCountAccumulator),
+        such that the peak memory is set by the batch size rather than by the number of QDT shots.
+        All single qubits, all qubit pairs and the true clusters are always registered, which covers perform_clustering,
+        reconstruct_all_one_qubit_POVMs and reconstruct_cluster_with_perfect_clustering.
+        To cover reconstruct_cluster_POVMs for any clusters found by perform_clustering, all subsystems of at most
+        max_cluster_size qubits are registered as well, unless their counts would exceed max_registered_counts entries.
+        In that case the noise clusters have to be given with subsystem_labels.
+        subsystem_labels (list): Additional subsystems to register, e.g. known noise clusters.
+        max_registered_counts (int): Maximal number of count entries for registering all subsystems of at most max_cluster_size qubits.
+        """
+        if self._povm_array is None:
+            raise ValueError("No POVM array set, please set the POVM array before performing measurements.")
+        n_rows = len(self._hashed_QDT_instructions)
+        two_point_labels, _ = ot.get_all_subsystem_labels(self._n_qubits)
+        registered_labels = [[qubit] for qubit in range(self._n_qubits)] + list(two_point_labels) + list(self.true_cluster_labels)
+        cluster_sizes = range(3, self._max_cluster_size + 1)
+        n_cluster_counts = n_rows * sum(comb(self._n_qubits, size) * 2**size for size in cluster_sizes)
+        if n_cluster_counts <= max_registered_counts:
+            registered_labels += [list(labels) for size in cluster_sizes for labels in combinations(range(self._n_qubits - 1, -1, -1), size)]
+        elif subsystem_labels is None:
+            raise ValueError(f"Registering all subsystems of at most {self._max_cluster_size} qubits requires {n_cluster_counts} counts, "
+                             f"more than max_registered_counts = {max_registered_counts}. Please pass the noise clusters with subsystem_labels.")
+        if subsystem_labels is not None:
+            registered_labels += list(subsystem_labels)
+        accumulator = MarginalCountAccumulator(self._n_qubits, n_rows, registered_labels)
+
+        print(f'Simulating streamed QDT measurements for {self._n_qubits} qubits.')
+        n_remaining_shots = self._n_QDT_shots
+        while n_remaining_shots > 0:
+            n_batch_shots = min(n_shots_per_batch, n_remaining_shots)
+            accumulator.update(mf.measure_hashed_clusters(n_batch_shots, self._povm_array, self._one_qubit_calibration_states, self._hashed_QDT_instructions, self._initial_cluster_size))
+            n_remaining_shots -= n_batch_shots
+        self._QDT_outcomes = accumulator
 
     def delete_QDT_outcomes(self):
         del self._QDT_outcomes
@@ -462,7 +493,7 @@ class QREM:
 
 
 
-    def set_chunked_true_states(self, n_averages = 1, mode = 'random', chunk_size = None):
+    def set_chunked_true_states(self, n_averages = 1, mode = 'random', chunk_size = None, statevector = False, state_size_array = None):
         """
         Sets the true states for QST.
         Lists of modes:
@@ -470,26 +501,78 @@ class QREM:
         'GHZ' : GHZ states of chunk size.
 
         rho_true_array (list): List of true states for QST, shape [n_averages, n_chunks, 2**chunk_size, 2**chunk_size]
+        statevector (bool): If True the pure true states are stored as statevectors, shape [n_averages, n_chunks, 2**chunk_size],
+                            and the QST simulation rotates and measures the statevectors directly.
+        state_size_array (list): Sizes of the entangled state blocks, summing to n_qubits. Defaults to blocks of chunk size.
+                                 Blocks that do not tile the chunks are measured with sequential sampling, see mf.measure_hashed_QST_sequential.
         """
         if chunk_size is not None:
             self._chunk_size = chunk_size
         self._n_averages = n_averages
         self._true_state_mode = mode
-        self._state_size_array = [self._chunk_size]*int(self._n_qubits/self._chunk_size)
+        if state_size_array is None:
+            self._state_size_array = [self._chunk_size]*int(self._n_qubits/self._chunk_size)
+        elif np.sum(state_size_array) != self._n_qubits:
+            raise ValueError(f"The state blocks of total size {np.sum(state_size_array)} do not match {self._n_qubits} qubits.")
+        else:
+            self._state_size_array = list(state_size_array)
         self._rho_true_labels = cl.get_true_cluster_labels(self._state_size_array)
         if mode == 'random':
-            self._rho_true_array = [[sf.generate_random_pure_state(size) for size in self._state_size_array] for _ in range(n_averages)]
+            # All states of the same size are generated at once for all averages.
+            rng = np.random.default_rng(np.random.randint(2**31))
+            generate_states = sf.generate_random_pure_statevector_batch if statevector else sf.generate_random_pure_state_batch
+            sizes, size_index = np.unique(self._state_size_array, return_inverse=True)
+            state_stacks = [iter(generate_states(size, n_averages*np.sum(size_index == i), rng)) for i, size in enumerate(sizes)]
+            self._rho_true_array = [[next(state_stacks[i]) for i in size_index] for _ in range(n_averages)]
+        elif mode == 'GHZ' and statevector:
+            self._rho_true_array = [[sf.generate_GHZ_statevector(size) for size in self._state_size_array] for _ in range(n_averages)]
         elif mode == 'GHZ':
             self._rho_true_array = [[sf.generate_GHZ(size) for size in self._state_size_array] for _ in range(n_averages)]
 
         #self._rho_true_list, self._rho_labels_in_state = ot.tensor_chunk_states(self._rho_true_array, self._rho_true_labels, self._noise_cluster_labels, self._two_point_corr_labels)
 
+    def set_MPS_true_states(self, n_averages = 1, mode = 'GHZ', bond_dim = 2):
+        """
+        Sets true states for QST that are entangled across the full register, stored as matrix product states (see mps.MPS).
+        The states are sampled and traced down from the MPS, without dense states.
+        Lists of modes:
+        'GHZ' : GHZ state on all qubits.
+        'cluster' : One dimensional cluster state on all qubits.
+        'random' : Random MPS with bond dimension bond_dim.
+
+        rho_true_array (list): List of MPS true states, one for each average.
+        """
+        self._n_averages = n_averages
+        self._true_state_mode = f'MPS_{mode}'
+        self._state_size_array = [self._n_qubits]
+        self._rho_true_labels = cl.get_true_cluster_labels(self._state_size_array)
+        if mode == 'GHZ':
+            self._rho_true_array = [MPS.GHZ(self._n_qubits) for _ in range(n_averages)]
+        elif mode == 'cluster':
+            self._rho_true_array = [MPS.cluster_state(self._n_qubits) for _ in range(n_averages)]
+        elif mode == 'random':
+            self._rho_true_array = [MPS.random_state(self._n_qubits, bond_dim) for _ in range(n_averages)]
+        else:
+            raise ValueError("MPS mode not supported, please use 'GHZ', 'cluster' or 'random'.")
+
+    def _is_chunk_aligned(self):
+        """
+        Checks if the state blocks and the noise clusters both tile the chunks, as required by the chunked QST simulation.
+        """
+        return mf.is_chunk_aligned(self._chunk_size, self._initial_cluster_size, self._state_size_array)
+
+    def _measure_true_state(self, average, n_shots, hashed_QST_instructions):
+        """
+        Simulates the QST measurements of one average of the true states, chunked dense states or MPS.
+        """
+        return mf.measure_hashed_true_state_QST(n_shots, self._chunk_size, self._povm_array, self._initial_cluster_size, self._rho_true_array[average], self._state_size_array, hashed_QST_instructions)
+
     def copy_chunked_true_states(self,qrem):
         """
         Copies the chunked true states from self to another QREM object.
         
         """
-        self._rho_true_array = np.array(qrem._rho_true_array)
+        self._rho_true_array = list(qrem._rho_true_array) # State blocks can have different sizes
         self._rho_true_labels = np.array(qrem._rho_true_labels)
         self._n_averages = qrem._n_averages
         self._true_state_mode = qrem._true_state_mode
@@ -505,7 +588,67 @@ class QREM:
         if self._clustered_QDOT is None:
             raise ValueError("Please reconstruct the POVMs before performing QST measurements.")
 
-        self._QST_outcomes = [mf.measure_hashed_chunk_QST(self._n_QST_shots_total, self._chunk_size, self._povm_array, self._initial_cluster_size, self._rho_true_array[i], self._state_size_array, self._hashed_QST_instructions) for i in range(self._n_averages) ]
+        if self._outcome_storage == 'counts' and isinstance(self._rho_true_array[0], MPS):
+            raise ValueError("MPS true states are entangled across the clusters, please use 'outcomes', 'packed' or 'disk' outcome storage.")
+        if self._outcome_storage == 'counts' and not self._is_chunk_aligned():
+            raise ValueError("The true states do not tile the chunks, please use 'outcomes', 'packed' or 'disk' outcome storage.")
+        if self._outcome_storage == 'counts':
+            self._QST_outcomes = [mf.measure_hashed_chunk_QST_counts(self._n_QST_shots_total, self._chunk_size, self._povm_array, self._initial_cluster_size, self._rho_true_array[i], self._state_size_array, self._hashed_QST_instructions) for i in range(self._n_averages) ]
+        elif self._outcome_storage == 'packed':
+            self._QST_outcomes = [PackedOutcomes.from_outcomes(self._measure_true_state(i, self._n_QST_shots_total, self._hashed_QST_instructions)) for i in range(self._n_averages) ]
+        elif self._outcome_storage == 'disk':
+            self._QST_outcomes = []
+            for i in range(self._n_averages):
+                outcome_store = OutcomeStore.create(os.path.join(self._outcome_store_path, f'QST_outcomes_{i}'), len(self._hashed_QST_instructions), self._n_QST_shots_total, self._n_qubits)
+                for start in range(0, len(self._hashed_QST_instructions), outcome_store.row_block_size):
+                    block_instructions = self._hashed_QST_instructions[start:start + outcome_store.row_block_size]
+                    outcome_store.write_rows(start, self._measure_true_state(i, self._n_QST_shots_total, block_instructions))
+                outcome_store.flush()
+                self._QST_outcomes.append(outcome_store)
+        else:
+            self._QST_outcomes = [self._measure_true_state(i, self._n_QST_shots_total, self._hashed_QST_instructions) for i in range(self._n_averages) ]
+
+    def _get_correlator_union_labels(self, cluster_labels):
+        """
+        Returns the union of the clusters that each two-point correlator touches, in descending qubit order.
+        These are the subsystems read by the correlator QST reconstructions, e.g. ot.QST_from_instructions.
+        """
+        union_labels = []
+        for two_point_label in self._two_point_corr_labels:
+            cluster_index = ot.get_cluster_index_from_correlator_labels(cluster_labels, two_point_label)
+            union_labels.append(np.sort(np.concatenate([cluster_labels[index] for index in cluster_index]).astype(int))[::-1])
+        return union_labels
+
+    def perform_streamed_QST_measurements(self, subsystem_labels = None, n_QST_shots_total = None, n_shots_per_batch = 1000):
+        """
+        Streaming alternative to perform_averaged_QST_measurements. The QST shots are simulated in batches and only the
+        counts of the registered subsystems are kept for each average (see outcomes.MarginalCountAccumulator).
+        By default the single qubits, the noise clusters, the true clusters, the two-point correlators and the correlator unions
+        (the union of the noise clusters, or true clusters, that each two-point correlator touches) are registered.
+        subsystem_labels (list): Additional subsystems to register.
+        """
+        if n_QST_shots_total is not None:
+            self._n_QST_shots_total = n_QST_shots_total
+        if self._clustered_QDOT is None:
+            raise ValueError("Please reconstruct the POVMs before performing QST measurements.")
+        registered_labels = [[qubit] for qubit in range(self._n_qubits)] + list(self.true_cluster_labels)
+        for labels in [self._noise_cluster_labels, self._two_point_corr_labels, subsystem_labels]:
+            if labels is not None:
+                registered_labels += list(labels)
+        if self._two_point_corr_labels is not None:
+            for cluster_labels in [self._noise_cluster_labels, self.true_cluster_labels]:
+                if cluster_labels is not None:
+                    registered_labels += self._get_correlator_union_labels(cluster_labels)
+
+        self._QST_outcomes = []
+        for i in range(self._n_averages):
+            accumulator = MarginalCountAccumulator(self._n_qubits, len(self._hashed_QST_instructions), registered_labels)
+            n_remaining_shots = self._n_QST_shots_total
+            while n_remaining_shots > 0:
+                n_batch_shots = min(n_shots_per_batch, n_remaining_shots)
+                accumulator.update(self._measure_true_state(i, n_batch_shots, self._hashed_QST_instructions))
+                n_remaining_shots -= n_batch_shots
+            self._QST_outcomes.append(accumulator)
 
     def compute_correlator_true_states(self):
         """
@@ -541,7 +684,12 @@ class QREM:
         self.traced_down_correlator_rho_true_array = []
 
         for av in range(self._n_averages):
-            rho_true_list, rho_labels_in_state = ot.tensor_chunk_states(self._rho_true_array[av], self._rho_true_labels, 
+            if isinstance(self._rho_true_array[av], MPS): # The correlator states are traced down directly from the MPS
+                self.traced_down_correlator_rho_true_array.append([self._rho_true_array[av].reduced_density_matrix(label) for label in self._two_point_corr_labels])
+                continue
+            # Statevectors are turned into density matrices to trace down to the correlators.
+            rho_true_chunks = [np.outer(state, state.conj()) if np.ndim(state) == 1 else state for state in self._rho_true_array[av]]
+            rho_true_list, rho_labels_in_state = ot.tensor_chunk_states(rho_true_chunks, self._rho_true_labels, 
                                                                                     self._noise_cluster_labels, self._two_point_corr_labels)
 
             traced_down_rho_true = [ot.trace_down_qubit_state(rho_true_list[i], rho_labels_in_state[i], 
@@ -12,7 +12,7 @@ import sys
 
 import EMQST_lib.support_functions as sf
 from EMQST_lib import measurement_functions as mf
-from EMQST_lib.povm import POVM
+from EMQST_lib.povm import POVM, get_POVM_buffer
 #from EMQST_lib import povm
 
 class QST():
@@ -62,7 +62,7 @@ class QST():
         
         self.n_cores=n_cores
         self.bool_exp_measurement=bool_exp_measurements
-        full_operator_list=np.array([a.get_POVM() for a in self.POVM_list])
+        full_operator_list=get_POVM_buffer(self.POVM_list)
         full_operator_list=np.reshape(full_operator_list,(-1,2**self.n_qubits,2**self.n_qubits))
         self.full_operator_list=full_operator_list
 
@@ -132,7 +132,7 @@ class QST():
         bool_exp_measurements=False
         exp_dictionary={}
         n_cores=4
-        list_of_true_states = np.array([sf.generate_random_pure_state(n_qubits) for _ in range(n_averages)])
+        list_of_true_states = sf.generate_random_pure_state_batch(n_qubits, n_averages)
         POVM_list=POVM.generate_Pauli_POVM(n_qubits)
         return QST(POVM_list,list_of_true_states,n_QST_shots,n_qubits,bool_exp_measurements,exp_dictionary,n_cores=n_cores)
     
@@ -197,9 +197,13 @@ class QST():
             # Generate data
             temp_outcomes=np.zeros((n_POVMs,n_shots_each_POVM))
             index_iterator=0
+            if self.bool_exp_measurement and custom_measurement_function is None: # All POVMs are submitted together, as one batch if exp_dictionary holds a measurement backend
+                outcome_list=mf.experimental_measurements(n_shots_each_POVM,[povm.get_angles() for povm in measured_POVM_list],[self.true_state_angles_list[i]]*n_POVMs,self.exp_dictionary)
+            else:
+                outcome_list=[mf.measurement(n_shots_each_POVM, measured_POVM_list[j],self.true_state_list[i], self.bool_exp_measurement, self.exp_dictionary,state_angle_representation=self.true_state_angles_list[i], custom_measurement_function = custom_measurement_function) for j in range(n_POVMs)]
 
             for j in range(n_POVMs):
-                temp_outcomes[j]=mf.measurement(n_shots_each_POVM, measured_POVM_list[j],self.true_state_list[i], self.bool_exp_measurement, self.exp_dictionary,state_angle_representation=self.true_state_angles_list[i], custom_measurement_function = custom_measurement_function) + index_iterator
+                temp_outcomes[j]=outcome_list[j] + index_iterator
                 index_iterator+=len(self.POVM_list[j].get_POVM())
             
             # Reshape lists
@@ -215,7 +219,7 @@ class QST():
         if override_POVM_list is None:
             full_operator_list=self.full_operator_list  
         else:
-            full_operator_list=np.array([a.get_POVM() for a in override_POVM_list])
+            full_operator_list=get_POVM_buffer(override_POVM_list)
             full_operator_list=np.reshape(full_operator_list,(-1,2**self.n_qubits,2**self.n_qubits))
             
         outcome_index=self.outcome_index.astype(int)
@@ -285,7 +289,7 @@ class QST():
         if override_POVM_list is None:
             full_operator_list=self.full_operator_list
         else:
-            full_operator_list=np.array([a.get_POVM() for a in override_POVM_list])
+            full_operator_list=get_POVM_buffer(override_POVM_list)
             full_operator_list=np.reshape(full_operator_list,(-1,2**self.n_qubits,2**self.n_qubits))
        
             
@@ -455,16 +459,13 @@ def logLikelihood(rho,full_operator_list,index_counts,index_values):
     return np.dot(np.log(np.real(np.einsum('ij,kji->k',rho,full_operator_list)))[index_values],index_counts)
 
 
-def generate_bank_particles(nBankParticles,nQubits,boolBuresPrior=False):
+def generate_bank_particles(nBankParticles,nQubits,boolBuresPrior=False,rng=None):
     """
     Returns a set of bank particles of given bank size and number of qubits. 
     Can generate mixed states from either HS random or Bures random states.
+    All particles are generated at once as a stack, see sf.generate_random_Hilbert_Schmidt_mixed_state_batch.
+    rng (numpy.random.Generator, optional): Random generator. By default it is seeded from the global numpy random state.
     """
-    rhoBank=np.zeros([nBankParticles,2**nQubits,2**nQubits],dtype=complex)    
     if boolBuresPrior:
-         for i in range(nBankParticles):
-            rhoBank[i]=sf.generate_random_Bures_mixed_state(nQubits)
-    else:
-        for i in range(nBankParticles):
-            rhoBank[i]=sf.generate_random_Hilbert_Schmidt_mixed_state(nQubits)
-    return rhoBank
\ No newline at end of file
+        return sf.generate_random_Bures_mixed_state_batch(nQubits, nBankParticles, rng)
+    return sf.generate_random_Hilbert_Schmidt_mixed_state_batch(nQubits, nBankParticles, rng)
\ No newline at end of file
@@ -122,6 +122,14 @@ def generate_random_pure_state(nQubit):
     return U@baseRho@U.conj().T
 
 
+def generate_random_pure_statevector(nQubit):
+    """
+    Generates Haar random pure state as a statevector, the first column of a Haar random unitary.
+    Statevector version of generate_random_pure_state.
+    """
+    return unitary_group.rvs(2**nQubit)[:,0]
+
+
 def generate_random_factorized_states(n_qubits,n_averages):
     """
     Creates n_averages n_qubit factorized state of Haar random single qubit states.
@@ -142,36 +150,147 @@ def generate_random_factorized_states(n_qubits,n_averages):
         state_list[i] = temp_state
         
     return state_list, angle_list
+
+
+def generate_random_unitary_batch(dim, n_unitaries, rng = None):
+    """
+    Generates a stack of Haar random unitaries of shape (n_unitaries, dim, dim).
+    The unitaries are the Q factors of QR decompositions of complex Ginibre matrices, with the phases of the diagonal of R
+    absorbed into Q such that the distribution is exactly Haar. Batched version of unitary_group.rvs.
+    rng (numpy.random.Generator, optional): Random generator. By default it is seeded from the global numpy random state.
+    """
+    if rng is None:
+        rng = np.random.default_rng(np.random.randint(2**31))
+    ginibre = rng.normal(size=(n_unitaries, dim, dim)) + 1j*rng.normal(size=(n_unitaries, dim, dim))
+    Q, R = np.linalg.qr(ginibre)
+    diagonal = np.diagonal(R, axis1=-2, axis2=-1)
+    return Q*(diagonal/np.abs(diagonal))[:, None, :]
+
+
+def generate_random_pure_statevector_batch(nQubit, n_states, rng = None):
+    """
+    Generates a stack of Haar random statevectors of shape (n_states, 2**nQubit), as normalized complex Gaussian vectors.
+    Batched version of generate_random_pure_statevector.
+    """
+    if rng is None:
+        rng = np.random.default_rng(np.random.randint(2**31))
+    psi = rng.normal(size=(n_states, 2**nQubit)) + 1j*rng.normal(size=(n_states, 2**nQubit))
+    return psi/np.linalg.norm(psi, axis=-1, keepdims=True)
+
+
+def generate_random_pure_state_batch(nQubit, n_states, rng = None):
+    """
+    Generates a stack of Haar random pure states of shape (n_states, 2**nQubit, 2**nQubit).
+    Batched version of generate_random_pure_state.
+    """
+    psi = generate_random_pure_statevector_batch(nQubit, n_states, rng)
+    return np.einsum('ni,nj->nij', psi, psi.conj())
+
+
+def generate_random_Hilbert_Schmidt_mixed_state_batch(nQubit, n_states, rng = None):
+    """
+    Generates a stack of random mixed states from the Hilbert-Schmidt metric, shape (n_states, 2**nQubit, 2**nQubit).
+    Batched version of generate_random_Hilbert_Schmidt_mixed_state.
+    """
+    if rng is None:
+        rng = np.random.default_rng(np.random.randint(2**31))
+    A = rng.normal(size=(n_states, 2**nQubit, 2**nQubit)) + 1j*rng.normal(size=(n_states, 2**nQubit, 2**nQubit))
+    rho = A @ A.conj().transpose(0, 2, 1)
+    return rho/np.trace(rho, axis1=-2, axis2=-1)[:, None, None]
+
+
+def generate_random_Bures_mixed_state_batch(nQubit, n_states, rng = None):
+    """
+    Generates a stack of Bures random states, shape (n_states, 2**nQubit, 2**nQubit).
+    Batched version of generate_random_Bures_mixed_state.
+    """
+    if rng is None:
+        rng = np.random.default_rng(np.random.randint(2**31))
+    A = rng.normal(size=(n_states, 2**nQubit, 2**nQubit)) + 1j*rng.normal(size=(n_states, 2**nQubit, 2**nQubit))
+    Id_plus_U = np.eye(2**nQubit) + generate_random_unitary_batch(2**nQubit, n_states, rng)
+    B = Id_plus_U @ A
+    rho = B @ B.conj().transpose(0, 2, 1)
+    return rho/np.trace(rho, axis1=-2, axis2=-1)[:, None, None]
+
+
+def generate_random_factorized_states_batch(n_qubits, n_averages, rng = None):
+    """
+    Creates n_averages n_qubit factorized states of Haar random single qubit states.
+    Batched version of generate_random_factorized_states, with the same return values.
+
+    Returns:
+        state_list (ndarray): Factorized states of shape (n_averages, 2**n_qubits, 2**n_qubits).
+        angle_list (ndarray): Bloch angles of each single qubit state, shape (n_averages, n_qubits, 2).
+    """
+    psi = generate_random_pure_statevector_batch(1, n_averages*n_qubits, rng).reshape(n_averages, n_qubits, 2)
+    # Bloch vector from the statevector components, as in get_angles_from_density_matrix_single_qubit.
+    coherence = psi[..., 0].conj()*psi[..., 1]
+    angle_list = np.stack((np.arccos(np.clip(np.abs(psi[..., 0])**2 - np.abs(psi[..., 1])**2, -1, 1)), np.arctan2(2*np.imag(coherence), 2*np.real(coherence))), axis=-1)
+    full_psi = psi[:, 0]
+    for j in range(1, n_qubits):
+        full_psi = np.einsum('ni,nj->nij', full_psi, psi[:, j]).reshape(n_averages, -1)
+    return np.einsum('ni,nj->nij', full_psi, full_psi.conj()), angle_list
         
         
             
 
 
 
-def POVM_distance(M,N):
+def POVM_distance(M, N, method='auto', n_samples=1000):
     """
     Computes the operational distance for two POVM sets.
     It is based on maximizing over all possible quantum states the "Total-Variation" distance.
     Inputs must be numpy arrays and not POVM objects.
+    Args:
+        M, N (ndarray): POVM elements of shape (n_outcomes, dim, dim).
+        method (str): 'exact' maximizes over all subsets of outcomes with an eigenvalue computation,
+                      'sampled' maximizes over n_samples random Hilbert-Schmidt states (lower bound),
+                      'auto' uses 'exact' for at most 16 outcomes and 'sampled' otherwise.
     """
-    # Check if the instance i POVM. If not, convert it to POVM.
-    #if isinstance(M, POVM):
-    #    M = M.get_POVM()
-    #if isinstance(N, POVM):
-    #    N = N.get_POVM()
-    d=0
-    n=1000
-    n_qubits=int(np.log2(len(M[0])))
-    d = np.zeros(n)
-    for i in range(n):
-        rho=generate_random_Hilbert_Schmidt_mixed_state(n_qubits)
-        p=np.real(np.einsum('nij,ji->n',M,rho))
-        q=np.real(np.einsum('nij,ji->n',N,rho))
-        d[i]=1/2*np.sum(np.abs(p-q))
-        
-    return np.max(d)
+    return POVM_distance_batch(np.asarray(M)[None], np.asarray(N)[None], method=method, n_samples=n_samples)[0]
+
+
+def POVM_distance_batch(M_stack, N_stack, method='auto', n_samples=1000, max_exact_outcomes=16):
+    """
+    Computes the operational distance for a stack of POVM pairs, see POVM_distance.
+    For complete POVMs the total-variation distance for a state rho is max_S tr(rho sum_{i in S}(M_i-N_i)),
+    hence the exact distance is max_S ||sum_{i in S}(M_i-N_i)||, where the maximum over subsets S of outcomes
+    can be restricted to subsets not containing the last outcome (the complement gives the negative operator).
+    Args:
+        M_stack, N_stack (ndarray): POVM elements of shape (n_pairs, n_outcomes, dim, dim).
+    Returns:
+        ndarray: Operational distance of each pair.
+    """
+    diff = np.asarray(M_stack, dtype=complex) - np.asarray(N_stack, dtype=complex)
+    n_pairs, n_outcomes, dim = diff.shape[:3]
+    if method == 'auto':
+        method = 'exact' if n_outcomes <= max_exact_outcomes else 'sampled'
+
+    if method == 'exact':
+        n_free = n_outcomes - 1
+        distance = np.zeros(n_pairs)
+        # Process the 2**(n_outcomes-1) subsets in chunks to limit memory usage.
+        chunk_size = max(1, 2**22 // max(1, n_pairs * dim**2))
+        for start in range(0, 2**n_free, chunk_size):
+            subset_index = np.arange(start, min(start + chunk_size, 2**n_free))
+            subsets = ((subset_index[:, None] >> np.arange(n_free)) & 1).astype(float)
+            subset_operators = np.einsum('sk,pkij->psij', subsets, diff[:, :n_free])
+            eigenvalues = np.linalg.eigvalsh(subset_operators)
+            chunk_max = np.max(np.maximum(eigenvalues[..., -1], -eigenvalues[..., 0]), axis=1)
+            distance = np.maximum(distance, chunk_max)
+        return distance
+
+    elif method == 'sampled':
+        # Random Hilbert-Schmidt states for all samples at once.
+        G = np.random.normal(size=(n_samples, dim, dim)) + 1j*np.random.normal(size=(n_samples, dim, dim))
+        rho = G @ np.transpose(G.conj(), axes=[0,2,1])
+        rho /= np.real(np.einsum('sii->s', rho))[:, None, None]
+        p_diff = np.real(np.einsum('pnij,sji->psn', diff, rho))
+        return np.max(1/2*np.sum(np.abs(p_diff), axis=-1), axis=1)
+
+    else:
+        raise ValueError(f"Unknown POVM distance method '{method}'.")
 
-    
 
 def Pauli_expectation_value(rho):
     X=np.array([[0,1],[1,0]])
@@ -303,13 +422,14 @@ def binary_to_decimal_array(a):
     return a.dot(1 << np.arange(a.shape[-1] - 1, -1, -1)).copy()
 
 
-def decimal_to_binary_array(decimal_array, max_length=None):
+def decimal_to_binary_array(decimal_array, max_length=None, dtype=int):
     """
     Takes in an array of decimal numbers and converts it into an array of binary numbers.
 
     Parameters:
     - decimal_array (array-like): An array of decimal numbers.
     - max_length (int, optional): The maximum length of the binary representation. If not provided, it is calculated based on the maximum decimal value in the array.
+    - dtype (optional): Integer type of the returned array, e.g. np.uint8 for compact outcome storage. Defaults to int.
 
     Returns:
     - binary_array (ndarray): An array of binary numbers.
@@ -323,7 +443,7 @@ def decimal_to_binary_array(decimal_array, max_length=None):
             max_length = int(np.ceil(np.log2(max_len)))
     
     # Create binary array for each integer
-    binary_array = (((decimal_array[:, None] & (1 << np.arange(max_length)[::-1]))) > 0).astype(int)
+    binary_array = (((decimal_array[:, None] & (1 << np.arange(max_length)[::-1]))) > 0).astype(dtype)
     
     return binary_array
 def partial_trace(rho, qubit = 0):
@@ -356,6 +476,16 @@ def generate_GHZ(n_qubits):
     GHZ[0,0] = 1/2
     GHZ[-1,-1] = 1/2
     return GHZ
+
+
+def generate_GHZ_statevector(n_qubits):
+    """
+    Generates the GHZ statevector (|0...0> + |1...1>)/sqrt(2) for n_qubits.
+    """
+    GHZ = np.zeros(2**n_qubits, dtype=complex)
+    GHZ[0] = 1/np.sqrt(2)
+    GHZ[-1] = 1/np.sqrt(2)
+    return GHZ
     
 
 
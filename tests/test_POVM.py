@@ -2,6 +2,8 @@ import unittest
 import numpy as np
 from functools import reduce
 import sys
+import os
+import tempfile
 sys.path.append('../') # Adding path to library
 from EMQST_lib.povm import POVM
 import EMQST_lib.povm as pv
@@ -93,6 +95,17 @@ class testPOVM(unittest.TestCase):
         self.assertTrue(np.all(long_pauli[78] == povm[8]))
         self.assertTrue(np.all(long_pauli[1] == povm[9]))
         
+    def test_statevector_histogram(self):
+        # Statevectors give the same outcome probabilities as their density matrices, for general and computational basis POVMs.
+        psi = np.random.randn(8) + 1j*np.random.randn(8)
+        psi /= np.linalg.norm(psi)
+        rho = np.outer(psi, psi.conj())
+        for povm in [POVM.generate_random_POVM(8, 8), POVM.generate_noisy_POVM_list(POVM.generate_computational_POVM(3), 3)[0]]:
+            self.assertTrue(np.allclose(povm.get_histogram(psi), povm.get_histogram(rho)))
+        psi_stack = np.array([psi, np.roll(psi, 1)])
+        povm_elements = POVM.generate_computational_POVM(3)[0].get_POVM()
+        self.assertTrue(np.allclose(pv.get_statevector_histogram(povm_elements, psi_stack), np.abs(psi_stack)**2))
+
     def test_computational_basis_POVM(self):
         # Test normalization
         basis = POVM.generate_computational_POVM(1)[0]
@@ -301,6 +314,119 @@ class testPOVM(unittest.TestCase):
         povm_abc2 = POVM.tensor_POVM(povm_a,povm_bc)[0]
         self.assertTrue(np.allclose(povm_abc.get_POVM(), povm_abc2.get_POVM()))
         
+    def test_classical_correlation_coefficient_batch(self):
+        def reference_reduce(povm, rho, qubit):
+            # Explicit partial trace of the POVM multiplied with the environment state, summing the outcomes of the traced out qubit.
+            if qubit == 0:
+                combined_op = np.einsum('ijk,kl->ijl', povm, np.kron(np.eye(2), rho)).reshape((-1, 2, 2, 2, 2))
+                traced_down_povm = np.einsum('ijklk->ijl', combined_op)
+                return np.array([traced_down_povm[0] + traced_down_povm[1], traced_down_povm[2] + traced_down_povm[3]])
+            combined_op = np.einsum('ijk,kl->ijl', povm, np.kron(rho, np.eye(2))).reshape((-1, 2, 2, 2, 2))
+            traced_down_povm = np.einsum('ikjkl->ijl', combined_op)
+            return np.array([traced_down_povm[0] + traced_down_povm[2], traced_down_povm[1] + traced_down_povm[3]])
+
+        def reference_coefficients(povm, mode):
+            states = np.array([[[1, 0], [0, 0]], [[0, 0], [0, 1]]])
+            coefficients = []
+            for qubit in [0, 1]:
+                diff = reference_reduce(povm, states[0], qubit)[0] - reference_reduce(povm, states[1], qubit)[0]
+                if mode == 'AC':
+                    coefficients.append(1/2 * np.sqrt(np.linalg.norm(diff)**2 + np.abs(np.trace(diff))**2))
+                else:
+                    coefficients.append(np.linalg.norm(diff, ord=np.inf))
+            return np.array(coefficients)
+
+        povm_list = [POVM.generate_random_POVM(4, 4) for _ in range(5)]
+        povm_list.append(POVM.generate_noisy_POVM(POVM.generate_computational_POVM(2)[0], 1))
+        povm_stack = np.array([povm.get_POVM() for povm in povm_list])
+        for mode in ['WC', 'AC']:
+            batch = pv.get_classical_correlation_coefficient_batch(povm_stack, mode)
+            self.assertEqual(batch.shape, (6, 2))
+            for i in range(len(povm_list)):
+                self.assertTrue(np.allclose(batch[i], reference_coefficients(povm_stack[i], mode)))
+        rho = np.array([[0.3, 0.2-0.1j], [0.2+0.1j, 0.7]])
+        for qubit in [0, 1]:
+            reduced = pv.reduce_POVM_two_to_one_batch(povm_stack, rho, qubit)
+            for i in range(len(povm_list)):
+                self.assertTrue(np.allclose(reduced[i], reference_reduce(povm_stack[i], rho, qubit)))
+
+        # CNOT readout, outcome (x1 xor x0, x0) for the basis state |x1 x0>. The qubit 1 outcome is flipped by qubit 0,
+        # while the qubit 0 outcome does not depend on qubit 1.
+        cnot_povm = np.zeros((4, 4, 4))
+        for x1 in range(2):
+            for x0 in range(2):
+                cnot_povm[2*(x1 ^ x0) + x0, 2*x1 + x0, 2*x1 + x0] = 1
+        self.assertTrue(np.allclose(pv.get_classical_correlation_coefficient_batch(cnot_povm[None], 'WC')[0], [1, 0]))
+        self.assertTrue(np.allclose(pv.get_classical_correlation_coefficient_batch(cnot_povm[None], 'AC')[0], [1/np.sqrt(2), 0]))
+        self.assertTrue(np.allclose(pv.get_classical_correlation_coefficient_batch(POVM.generate_computational_POVM(2)[0].get_POVM()[None], 'WC'), 0))
+
+    def test_POVM_array(self):
+        # Pauli POVMs in one buffer match the object array version.
+        for n_qubits in [1, 2]:
+            pauli = POVM.generate_Pauli_POVM(n_qubits)
+            pauli_array = pv.POVMArray.generate_Pauli_POVM(n_qubits)
+            self.assertEqual(len(pauli_array), len(pauli))
+            self.assertTrue(np.allclose(pauli_array.get_POVM_array(), np.array([povm.get_POVM() for povm in pauli])))
+            for povm, view in zip(pauli, pauli_array):
+                self.assertEqual(view, povm)
+                self.assertTrue(np.all(view.get_angles() == povm.get_angles()))
+
+        # Rotated computational basis POVMs.
+        comp = POVM.generate_random_POVM(4, 4)
+        pauli_from_comp = POVM.generate_Pauli_from_comp(comp)
+        array_from_comp = pv.POVMArray.generate_Pauli_from_comp(comp)
+        self.assertTrue(np.allclose(array_from_comp.get_POVM_array(), np.array([povm.get_POVM() for povm in pauli_from_comp])))
+
+        # Views are read-only and do not copy.
+        view = array_from_comp[3]
+        self.assertFalse(view.get_POVM().flags.writeable)
+        self.assertTrue(np.shares_memory(view.get_POVM(), array_from_comp.get_POVM_array()))
+        with self.assertRaises(ValueError):
+            view.get_POVM()[0, 0, 0] = 1
+        self.assertEqual(array_from_comp.get_operator_list().shape, (9*4, 4, 4))
+
+        # Index arrays return a new array, and the histograms match.
+        rho = np.eye(4)/4
+        sub_array = array_from_comp[np.array([0, 4, 8])]
+        self.assertIsInstance(sub_array, pv.POVMArray)
+        self.assertTrue(np.allclose(sub_array.get_histograms(rho)[1], pauli_from_comp[4].get_histogram(rho)))
+        self.assertTrue(np.allclose(pv.get_POVM_buffer(pauli_from_comp), pv.get_POVM_buffer(array_from_comp)))
+        
+    def test_exp_POVM_library(self):
+        # Create a small fake experimental folder structure with two 1 qubit settings.
+        with tempfile.TemporaryDirectory() as path:
+            label_list = ["X", "Y", "Z"]
+            for name in ["a", "b"]:
+                os.makedirs(os.path.join(path, "1", name))
+                povm_list = np.array([POVM.generate_random_POVM(2,2) for _ in label_list])
+                np.save(os.path.join(path, "1", name, "DT_settings.npy"), {"reconstructed_POVM_list": povm_list})
+            with open(os.path.join(path, "1", "a", "label_order.txt"), "w") as label_file:
+                label_file.write("\n".join(label_list))
+
+            library = pv.ExpPOVMLibrary(path)
+            self.assertEqual(library.get_n_qubits(), [1])
+            self.assertEqual(library.get_POVM_array(1).shape, (2, 3, 2, 2, 2))
+
+            np.random.seed(0)
+            povm, load_path = library.draw_random(1)
+            rand_povm = np.random.RandomState(0).randint(2)
+            dt_settings = np.load(load_path[0], allow_pickle=True).item()
+            self.assertEqual(load_path[0], library._index[1]["paths"][rand_povm])
+            self.assertEqual(povm, dt_settings["reconstructed_POVM_list"][label_list.index(load_path[1])])
+            z_povm, z_path = library.draw_random(1, use_Z_basis_only=True)
+            self.assertEqual(z_path[1], "Z")
+
+            # Saved index is memory-mapped and gives the same draws.
+            library.save()
+            cached_library = pv.ExpPOVMLibrary(path, cache_path=path)
+            self.assertIsInstance(cached_library.get_POVM_array(1), np.memmap)
+            np.random.seed(1)
+            povm_a, path_a = library.draw_random(1)
+            np.random.seed(1)
+            povm_b, path_b = pv.load_random_exp_povm(path, 1)
+            self.assertEqual(povm_a, povm_b)
+            self.assertEqual(path_a, path_b)
+        
         
 if __name__ == '__main__':
     unittest.main()
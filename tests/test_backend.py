@@ -0,0 +1,83 @@
+import unittest
+import numpy as np
+import sys
+sys.path.append('../') # Adding path to library
+from EMQST_lib import dt
+from EMQST_lib import measurement_functions as mf
+from EMQST_lib import support_functions as sf
+from EMQST_lib.backend import MeasurementJob, FunctionBackend, SimulatedBackend
+from EMQST_lib.povm import POVM
+
+
+def standard_measurement_function(n_shots, POVM_angles, true_state_angles, exp_dictionary):
+    # Same simulation as the in-process SimulatedBackend, one setting at a time.
+    rho = sf.get_density_matrix_from_angles(true_state_angles)
+    povm = POVM.POVM_from_angles(POVM_angles[0])
+    return mf.simulated_measurement(n_shots, povm, rho)
+
+
+class TestBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.n_qubits = 2
+        self.calibration_states, self.calibration_angles = sf.get_calibration_states(self.n_qubits, "SIC")
+        self.povm = POVM.generate_Pauli_POVM(self.n_qubits)
+
+    def test_simulated_backend(self):
+        jobs = [MeasurementJob(100, povm.get_angles(), angles) for povm in self.povm for angles in self.calibration_angles]
+        with SimulatedBackend(batch_size=10) as backend:
+            np.random.seed(0)
+            outcomes = backend.run(jobs)
+            self.assertEqual(backend.n_round_trips, int(np.ceil(len(jobs)/10)))
+            np.random.seed(0)
+            expected_outcomes = [standard_measurement_function(*job, {}) for job in jobs]
+            for outcome, expected_outcome in zip(outcomes, expected_outcomes):
+                self.assertTrue(np.array_equal(outcome, expected_outcome))
+            # Results can be iterated as they complete
+            completed_index = sorted(index for index, _ in backend.iterate_results(jobs))
+            self.assertEqual(completed_index, list(range(len(jobs))))
+
+    def test_backend_in_device_tomography(self):
+        np.random.seed(0)
+        exp_dictionary = {"standard_measurement_function": standard_measurement_function}
+        reference_POVM = dt.device_tomography(self.n_qubits, 1000, self.povm, self.calibration_states, bool_exp_meaurements=True,
+                                              exp_dictionary=exp_dictionary, calibration_angles=self.calibration_angles)
+        np.random.seed(0)
+        backend = SimulatedBackend()
+        backend_POVM = dt.device_tomography(self.n_qubits, 1000, self.povm, self.calibration_states, bool_exp_meaurements=True,
+                                            exp_dictionary={"measurement_backend": backend}, calibration_angles=self.calibration_angles)
+        backend.shutdown()
+        self.assertEqual(backend.n_round_trips, 1)
+        for reference, reconstructed in zip(reference_POVM, backend_POVM):
+            self.assertTrue(np.allclose(reference.get_POVM(), reconstructed.get_POVM()))
+        # Experimental measurements need the angle representation of the calibration states
+        with SimulatedBackend() as backend:
+            with self.assertRaises(ValueError):
+                dt.device_tomography(self.n_qubits, 1000, self.povm, self.calibration_states, bool_exp_meaurements=True,
+                                     exp_dictionary={"measurement_backend": backend})
+        self.assertEqual(backend.n_round_trips, 0)
+
+    def test_function_backend(self):
+        jobs = [(50, self.povm[0].get_angles(), angles) for angles in self.calibration_angles]
+        batch_sizes = []
+        def batch_measurement_function(jobs, exp_dictionary):
+            batch_sizes.append(len(jobs))
+            return [standard_measurement_function(*job, exp_dictionary) for job in jobs]
+        with FunctionBackend(batch_measurement_function=batch_measurement_function, batch_size=5) as backend:
+            outcomes = backend.run(jobs)
+        self.assertEqual(batch_sizes, [5, 5, 5, 1])
+        self.assertEqual(np.array(outcomes).shape, (len(jobs), 50))
+        # Errors of the measurement function are raised when the results are collected
+        def failing_measurement_function(n_shots, POVM_angles, true_state_angles, exp_dictionary):
+            raise RuntimeError("Device unavailable.")
+        with FunctionBackend(failing_measurement_function) as backend:
+            with self.assertRaises(RuntimeError):
+                backend.run(jobs)
+        with self.assertRaises(ValueError):
+            FunctionBackend()
+        with self.assertRaises(ValueError):
+            SimulatedBackend(batch_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import numpy as np
+import scipy as sp
+from functools import reduce
+from itertools import product
+import sys
+sys.path.append('../') # Adding path to library
+from EMQST_lib import channels
+from EMQST_lib import support_functions as sf
+from EMQST_lib.povm import POVM
+
+
+class TestChannels(unittest.TestCase):
+
+    def test_coherent_XX_unitary(self):
+        X = np.array([[0,1],[1,0]], dtype = complex)
+        Id = np.eye(2)
+        XX = np.kron(X,X)
+        angle = np.pi/10
+        for size in range(1, 5):
+            if size <= 2:
+                true_unitary = sf.rot_about_collective_X(angle, size)
+            else: # Nearest neighbour model built with matrix exponentials
+                full_H = np.zeros((2**size,2**size),dtype=complex)
+                for i in range(size-1):
+                    H_temp = [Id]*(size-1)
+                    H_temp[i] = XX
+                    full_H += -1j/2 *reduce(np.kron,H_temp) * angle
+                true_unitary = sp.linalg.expm(full_H)
+            self.assertTrue(np.allclose(channels.coherent_XX_unitary(size, angle), true_unitary))
+
+            comp_povm = POVM.generate_computational_POVM(size)[0].get_POVM()
+            true_povm = np.einsum('jk,ikl,lm->ijm', true_unitary, comp_povm, true_unitary.conj().T)
+            self.assertTrue(np.allclose(channels.coherent_XX_POVM(size, angle), true_povm))
+        # Cached arrays are read-only.
+        self.assertFalse(channels.coherent_XX_POVM(2, angle).flags.writeable)
+
+    def test_apply_local_kraus(self):
+        n_qubits = 3
+        povm_stack = np.array([povm.get_POVM() for povm in POVM.generate_Pauli_POVM(n_qubits)[:4]])
+        for noise_mode in range(1, 5):
+            kraus = channels.single_qubit_kraus(noise_mode)
+            # Reference with all tensor products of the single-qubit Kraus operators
+            full_kraus = np.array([reduce(np.kron, comb) for comb in product(kraus, repeat=n_qubits)])
+            true_stack = channels.apply_kraus(povm_stack, full_kraus)
+            noisy_stack = channels.apply_local_kraus(povm_stack, kraus, n_qubits)
+            self.assertTrue(np.allclose(noisy_stack, true_stack))
+            # Noisy POVMs are still complete
+            self.assertTrue(np.allclose(np.sum(noisy_stack, axis=1), np.eye(2**n_qubits)))
+
+        # The single qubit case agrees with generate_noisy_POVM
+        povm = POVM.generate_computational_POVM(1)[0]
+        kraus = channels.single_qubit_kraus(3)
+        self.assertTrue(np.allclose(channels.apply_local_kraus(povm.get_POVM(), kraus, 1), POVM.generate_noisy_POVM(povm, 3).get_POVM()))
+
+    def test_apply_kraus_stack(self):
+        # One unitary per cluster
+        povm_stack = np.array([POVM.generate_random_POVM(4, 4).get_POVM() for _ in range(3)])
+        unitaries = np.array([sp.stats.unitary_group.rvs(4) for _ in range(3)])
+        rotated = channels.apply_unitary(povm_stack, unitaries)
+        for i in range(3):
+            true_povm = np.einsum('jk,ikl,lm->ijm', unitaries[i], povm_stack[i], unitaries[i].conj().T)
+            self.assertTrue(np.allclose(rotated[i], true_povm))
+        # One Kraus set per entry of a stack with an extra leading dimension
+        povm_stack = np.array([[POVM.generate_random_POVM(2, 2).get_POVM() for _ in range(4)] for _ in range(3)])
+        kraus_ops = np.array([channels.single_qubit_kraus(noise_mode) for noise_mode in [1, 2, 1]])
+        noisy_stack = channels.apply_kraus(povm_stack, kraus_ops)
+        self.assertEqual(noisy_stack.shape, povm_stack.shape)
+        for i in range(3):
+            self.assertTrue(np.allclose(noisy_stack[i], channels.apply_kraus(povm_stack[i], kraus_ops[i])))
+
+    def test_noisy_POVM_n_qubits(self):
+        pauli_povm = POVM.generate_Pauli_POVM(3)
+        noisy_list = POVM.generate_noisy_POVM_list(pauli_povm, 1)
+        self.assertEqual(len(noisy_list), len(pauli_povm))
+        noisy_povm = POVM.generate_noisy_POVM(pauli_povm[5], 1)
+        self.assertEqual(noisy_povm, noisy_list[5])
+        # Depolarizing mode 7 is the same as the 2 qubit definition of generate_noisy_POVM
+        two_qubit_pauli_povm = POVM.generate_Pauli_POVM(2)
+        for noisy_povm, povm in zip(POVM.generate_noisy_POVM_list(two_qubit_pauli_povm, 7), two_qubit_pauli_povm):
+            self.assertTrue(np.allclose(noisy_povm.get_POVM(), POVM.generate_noisy_POVM(povm, 7).get_POVM()))
+        depolarized = POVM.generate_noisy_POVM_list(POVM.generate_computational_POVM(3), 7)[0]
+        self.assertTrue(np.allclose(depolarized.get_POVM(), POVM.depolarized_POVM(POVM.generate_computational_POVM(3)[0], 0.2).get_POVM()))
+        # Modes without an n-qubit definition keep the depolarizing fallback, unknown modes raise
+        for noise_mode in [5, 6]:
+            for noisy_povm, povm in zip(POVM.generate_noisy_POVM_list(pauli_povm, noise_mode), pauli_povm):
+                self.assertTrue(np.allclose(noisy_povm.get_POVM(), POVM.depolarized_POVM(povm).get_POVM()))
+        with self.assertRaises(ValueError):
+            POVM.generate_noisy_POVM_list(pauli_povm, 8)
+        with self.assertRaises(ValueError):
+            POVM.generate_noisy_POVM(pauli_povm[0], 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import numpy as np
+import sys
+sys.path.append('../') # Adding path to library
+from EMQST_lib import dt
+from EMQST_lib import support_functions as sf
+from EMQST_lib import overlapping_tomography as ot
+from EMQST_lib.povm import POVM
+
+
+class TestDT(unittest.TestCase):
+
+    def setUp(self):
+        # Random product SIC calibration states on 2 qubits, measured with an amplitude damped POVM.
+        np.random.seed(1)
+        self.n_qubits = 2
+        calibration_angles = np.array([[[0,0]],[[2*np.arccos(1/np.sqrt(3)),0]],
+                                       [[2*np.arccos(1/np.sqrt(3)),2*np.pi/3]],
+                                       [[2*np.arccos(1/np.sqrt(3)),4*np.pi/3]]])
+        self.one_qubit_calibration_states = np.array([sf.get_density_matrix_from_angles(angle) for angle in calibration_angles])
+        self.instructions = np.random.randint(4, size=(100, self.n_qubits))
+        self.calibration_states = np.array([ot.calibration_states_from_instruction(instruction, self.one_qubit_calibration_states, True) for instruction in self.instructions])
+        true_POVM = POVM.generate_noisy_POVM_list(POVM.generate_computational_POVM(self.n_qubits), 3)[0].get_POVM()
+        p = np.real(np.einsum('qij,nji->nq', true_POVM, self.calibration_states))
+        self.index_counts = np.array([np.random.multinomial(1000, p_row/np.sum(p_row)) for p_row in p])
+        self.guess_POVM = POVM.generate_computational_POVM(self.n_qubits)[0]
+
+    def test_POVM_MLE_accelerated(self):
+        standard_POVM = dt.POVM_MLE(self.n_qubits, self.index_counts, self.calibration_states, self.guess_POVM)
+        accelerated_POVM, diagnostics = dt.POVM_MLE_accelerated(self.n_qubits, self.index_counts, self.calibration_states, self.guess_POVM)
+        self.assertTrue(diagnostics["converged"])
+        self.assertLess(diagnostics["n_iterations"], 2000)
+        self.assertTrue(np.allclose(standard_POVM.get_POVM(), accelerated_POVM.get_POVM(), atol=1e-4))
+        # Result is a valid POVM
+        self.assertTrue(np.allclose(np.sum(accelerated_POVM.get_POVM(), axis=0), np.eye(2**self.n_qubits)))
+        self.assertTrue(np.all(np.linalg.eigvalsh(accelerated_POVM.get_POVM()) > -1e-12))
+
+        # A capped run reports that it did not converge.
+        _, capped_diagnostics = dt.POVM_MLE_accelerated(self.n_qubits, self.index_counts, self.calibration_states, self.guess_POVM, max_iter=3)
+        self.assertFalse(capped_diagnostics["converged"])
+        self.assertEqual(capped_diagnostics["n_iterations"], 3)
+        self.assertLess(capped_diagnostics["log_likelihood"], diagnostics["log_likelihood"])
+
+    def test_marginalize_QDT_counts(self):
+        n_qubits = 3
+        index_counts = np.random.randint(100, size=(3**n_qubits, 6**n_qubits, 2**n_qubits))
+        # Legacy strided implementation, keeping the rightmost qubits
+        for to_qubits in range(1, n_qubits + 1):
+            arr_1 = np.array([np.array([np.sum(np.array([np.sum(index_counts[k,i::6**to_qubits],axis=0)[j::2**to_qubits] for j in range(2**to_qubits)]),axis=1) for i in range(6**to_qubits)]) for k in range(len(index_counts))])
+            arr_2 = np.array([np.sum(arr_1[i::3**to_qubits],axis=0) for i in range(3**to_qubits)])
+            self.assertTrue(np.array_equal(dt.downconvert_QDT_counts(index_counts, to_qubits), arr_2))
+
+        # Keep qubits 2 and 0, explicit sum over the middle qubit
+        reduced_counts, calibration_index_map, POVM_index_map = dt.marginalize_QDT_counts(index_counts, [0, 2])
+        true_counts = np.zeros((9, 36, 4), dtype=int)
+        for p, c, o in np.ndindex(index_counts.shape):
+            p_digits = np.unravel_index(p, (3,)*3)
+            c_digits = np.unravel_index(c, (6,)*3)
+            o_digits = np.unravel_index(o, (2,)*3)
+            true_counts[3*p_digits[0] + p_digits[2], 6*c_digits[0] + c_digits[2], 2*o_digits[0] + o_digits[2]] += index_counts[p, c, o]
+            self.assertEqual(calibration_index_map[c], 6*c_digits[0] + c_digits[2])
+            self.assertEqual(POVM_index_map[p], 3*p_digits[0] + p_digits[2])
+        self.assertTrue(np.array_equal(reduced_counts, true_counts))
+        self.assertEqual(np.sum(reduced_counts), np.sum(index_counts))
+
+        with self.assertRaises(ValueError):
+            dt.marginalize_QDT_counts(index_counts, [3])
+
+    def test_incremental_QDT(self):
+        true_POVM = POVM.generate_noisy_POVM_list(POVM.generate_computational_POVM(self.n_qubits), 3)[0].get_POVM()
+        p = np.real(np.einsum('qij,nji->nq', true_POVM, self.calibration_states))
+        new_index_counts = np.array([np.random.multinomial(1000, p_row/np.sum(p_row)) for p_row in p])
+        incremental = dt.IncrementalQDT(self.n_qubits, self.calibration_states, self.guess_POVM)
+        incremental.add_counts(self.index_counts)
+        self.assertTrue(np.array_equal(incremental.update(), [0]))
+        incremental.add_counts(new_index_counts)
+        self.assertTrue(np.array_equal(incremental.update(), [0]))
+        # Nothing new to solve
+        self.assertEqual(len(incremental.update()), 0)
+        full_POVM = dt.POVM_MLE(self.n_qubits, self.index_counts + new_index_counts, self.calibration_states, self.guess_POVM)
+        self.assertTrue(np.allclose(incremental.get_POVM_list()[0].get_POVM(), full_POVM.get_POVM(), atol=1e-6))
+
+        # Product calibration states on merged counts, with counts that agree with the reconstruction skipped by the G-test
+        pattern_counts = dt.merge_calibration_counts(self.instructions, self.index_counts)
+        new_pattern_counts = dt.merge_calibration_counts(self.instructions, new_index_counts)
+        incremental = dt.IncrementalQDT(self.n_qubits, self.one_qubit_calibration_states, self.guess_POVM, n_problems=2, product_calibration=True, significance=0.01)
+        incremental.add_counts(np.array([pattern_counts, pattern_counts]))
+        incremental.update()
+        incremental.add_counts(new_pattern_counts, problems=[0])
+        # Counts from a different detector are rejected
+        incremental.add_counts(np.roll(new_pattern_counts, 1, axis=1), problems=[1])
+        _, p_value = incremental.G_test()
+        self.assertGreater(p_value[0], 0.01)
+        self.assertLess(p_value[1], 0.01)
+        self.assertTrue(np.array_equal(incremental.update(), [1]))
+        self.assertTrue(np.array_equal(incremental.update(force=True), [0]))
+        self.assertTrue(np.allclose(incremental.get_POVM_list()[0].get_POVM(), full_POVM.get_POVM(), atol=1e-6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+import os
+import tempfile
+import sys
+sys.path.append('../') # Adding path to library
+from EMQST_lib import emqst
+from EMQST_lib import support_functions as sf
+
+
+class TestEMQST(unittest.TestCase):
+
+    def test_emqst_batch(self):
+        np.random.seed(0)
+        n_qubits = 1
+        true_states = np.array([sf.generate_random_pure_state(n_qubits) for _ in range(2)])
+        jobs = [{"true_state_list": true_states, "n_QST_shots_each": 100, "noise_mode": 3},
+                {"true_state_list": true_states[:1], "n_QST_shots_each": 500, "noise_mode": 3},
+                {"true_state_list": true_states, "n_QST_shots_each": 100, "noise_mode": 0, "method": "MLE"}]
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                results = emqst.emqst_batch(n_qubits, 1000, jobs, n_cores=2)
+                data_path = os.path.join('results', os.listdir('results')[0])
+                # One calibration per noise mode, one folder per job
+                self.assertEqual(sorted(os.listdir(data_path)), ['experimental_settings.npy', 'job_0', 'job_1', 'job_2', 'noise_mode_0', 'noise_mode_3'])
+                self.assertTrue(os.path.exists(os.path.join(data_path, 'job_1', 'QST_results.npy')))
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(len(results), 3)
+        # Jobs with the same noise mode share the reconstructed POVMs
+        self.assertTrue(np.array_equal(results[0]["reconstructed_POVM"], results[1]["reconstructed_POVM"]))
+        self.assertFalse(np.array_equal(results[0]["reconstructed_POVM"], results[2]["reconstructed_POVM"]))
+        self.assertEqual(results[0]["corrected_rho_estm"].shape, (2, 2, 2))
+        self.assertEqual(results[1]["corrected_rho_estm"].shape, (1, 2, 2))
+        # Corrected reconstructions of the amplitude damped measurements are better than uncorrected ones
+        self.assertLess(np.mean(results[0]["corrected_infidelity"][:, -1]), np.mean(results[0]["uncorrected_infidelity"][:, -1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 import numpy as np
+import scipy as sp
 import sys
 sys.path.append('../') # Adding path to library
 from EMQST_lib import measurement_functions as mf
@@ -94,6 +95,27 @@ class TestOutcomesToFrequencies(unittest.TestCase):
         outcome_frequencies = mf.simulated_measurement(n_shots,comp_povm,rho,return_frequencies)
         self.assertTrue(np.all(outcome_frequencies == np.array([51,49])), 'x-state not sampled correctly.')
         
+    def test_simulated_measurement_counts(self):
+        pauli_povm = POVM.generate_Pauli_POVM(2)
+        calibration_states, _ = sf.get_calibration_states(2)
+        n_shots = 10**5
+        np.random.seed(0)
+        counts = mf.simulated_measurement_counts(n_shots, pauli_povm, calibration_states)
+        self.assertEqual(counts.shape, (9, 36, 4))
+        self.assertTrue(np.all(np.sum(counts, axis=-1) == n_shots))
+        probabilities = np.array([[povm.get_histogram(rho) for rho in calibration_states] for povm in pauli_povm])
+        self.assertTrue(np.allclose(counts/n_shots, probabilities, atol=0.01))
+        # Deterministic outcomes
+        comp_povm = POVM.generate_computational_POVM(1)
+        counts = mf.simulated_measurement_counts(100, comp_povm, np.array([[[1,0],[0,0]],[[0,0],[0,1]]]))
+        self.assertTrue(np.all(counts == np.array([[[100,0],[0,100]]])))
+        # Global seed makes the draws reproducible
+        np.random.seed(1)
+        counts_a = mf.simulated_measurement_counts(100, pauli_povm, calibration_states)
+        np.random.seed(1)
+        counts_b = mf.simulated_measurement_counts(100, pauli_povm, calibration_states)
+        self.assertTrue(np.all(counts_a == counts_b))
+        
     def test_random_Pauli_6_measurements(self):
         np.random.seed(0)
         n_qubits=1
@@ -147,6 +169,44 @@ class TestOutcomesToFrequencies(unittest.TestCase):
         self.assertTrue(np.all(outcomes == expected_outcomes))
 
 
+    def test_measure_separable_states(self):
+        # The vectorized sampler reproduces measure_separable_state row by row with the same random state.
+        n_qubits = 5
+        povm_list = np.array([POVM.generate_random_POVM(2, 2) for _ in range(n_qubits)])
+        rho_stack = np.array([[sf.generate_random_pure_state(1) for _ in range(n_qubits)] for _ in range(4)])
+        np.random.seed(2)
+        outcomes = mf.measure_separable_states(50, np.array([povm.get_POVM() for povm in povm_list]), rho_stack)
+        np.random.seed(2)
+        expected_outcomes = np.array([mf.measure_separable_state(50, povm_list, rho_array) for rho_array in rho_stack])
+        self.assertEqual(outcomes.shape, (4, 50, n_qubits))
+        self.assertTrue(np.array_equal(outcomes, expected_outcomes))
+
+        # POVMs given per row, e.g. hashed Pauli measurements
+        pauli_6 = POVM.generate_Pauli_POVM(1)
+        instructions = np.random.randint(3, size=(4, n_qubits))
+        hashed_POVM = np.array([[pauli_6[i].get_POVM() for i in instruction] for instruction in instructions])
+        np.random.seed(3)
+        outcomes = mf.measure_separable_states(50, hashed_POVM, rho_stack[0])
+        np.random.seed(3)
+        expected_outcomes = np.array([mf.measure_separable_state(50, pauli_6[instruction], rho_stack[0]) for instruction in instructions])
+        self.assertTrue(np.array_equal(outcomes, expected_outcomes))
+
+    def test_measure_hashed_clusters(self):
+        # Cached cluster histograms reproduce measure_clusters row by row with the same random state.
+        cluster_size = [2, 1, 3]
+        n_qubits = sum(cluster_size)
+        povm_array = [POVM.generate_random_POVM(2**size, 2**size) for size in cluster_size]
+        one_qubit_calibration_states = np.array([sf.generate_random_pure_state(1) for _ in range(4)])
+        hashed_QDT_instructions = np.random.randint(4, size=(40, n_qubits))
+        np.random.seed(4)
+        expected_outcomes = np.array([mf.measure_clusters(100, povm_array, one_qubit_calibration_states[instruction], cluster_size) for instruction in hashed_QDT_instructions])
+        np.random.seed(4)
+        outcomes = mf.measure_hashed_clusters(100, povm_array, one_qubit_calibration_states, hashed_QDT_instructions, cluster_size, max_block_size=1000)
+        self.assertTrue(np.array_equal(outcomes, expected_outcomes))
+        np.random.seed(4)
+        packed_outcomes = mf.measure_hashed_clusters(100, povm_array, one_qubit_calibration_states, hashed_QDT_instructions, cluster_size, packed=True)
+        self.assertTrue(np.array_equal(np.unpackbits(packed_outcomes, axis=-1, count=n_qubits), expected_outcomes))
+
     def test_measure_hashed_chunk_QST(self):
         # Test different chunk and state configureations
         # Does not checks, only checks that runs terminate without errors
@@ -191,6 +251,72 @@ class TestOutcomesToFrequencies(unittest.TestCase):
         n_hash_symbols = 2
         hashed_QST_instructions = ot.create_hashed_instructions(hash_function, possible_QST_instructions, n_hash_symbols)
         hashed_outcomes = mf.measure_hashed_chunk_QST(n_shots, chunk_size, povm_array, povm_size_array, state_array, state_size_array,hashed_QST_instructions) 
-        
+
+    def test_measure_hashed_chunk_QST_patterns(self):
+        # Rows grouped by local instruction pattern give the same outcomes as rotating and measuring every row separately.
+        chunk_size = 2
+        n_shots = 50
+        povm_array = [POVM.generate_random_POVM(4, 4) for _ in range(2)]
+        state_array = [sf.generate_random_pure_state(2) for _ in range(2)]
+        hashed_QST_instructions = np.random.choice(['X', 'Y', 'Z'], size=(30, 4))
+        rotations = {"X": sp.linalg.expm(1j * np.pi/4 * np.array([[0,-1j],[1j,0]])), "Y": sp.linalg.expm(-1j * np.pi/4 * np.array([[0,1],[1,0]])), "Z": np.eye(2)}
+        np.random.seed(6)
+        expected_outcomes = np.zeros((30, n_shots, 4), dtype=int)
+        for i in range(2):
+            for j, instruction in enumerate(hashed_QST_instructions):
+                unitary = np.kron(rotations[instruction[2*i]], rotations[instruction[2*i+1]])
+                outcome = mf.simulated_measurement(n_shots, povm_array[i], unitary @ state_array[i] @ unitary.conj().T)
+                expected_outcomes[j, :, 2*i:2*i+2] = sf.decimal_to_binary_array(outcome, 2)
+        np.random.seed(6)
+        hashed_outcomes = mf.measure_hashed_chunk_QST(n_shots, chunk_size, povm_array, [2, 2], state_array, [2, 2], hashed_QST_instructions)
+        self.assertTrue(np.array_equal(hashed_outcomes, expected_outcomes))
+
+    def test_measure_hashed_chunk_QST_product_blocks(self):
+        # Product states measured with factorized POVMs are sampled block by block, with the same statistics as the joint chunk.
+        chunk_size = 4
+        n_shots = 20000
+        povm_array = [POVM.generate_random_POVM(2, 2) for _ in range(2)] + [POVM.generate_random_POVM(4, 4)]
+        state_array = [sf.generate_random_pure_state(1) for _ in range(4)]
+        hashed_QST_instructions = np.array([['Z', 'Z', 'Z', 'Z'], ['X', 'Y', 'Z', 'X']])
+        hashed_outcomes = mf.measure_hashed_chunk_QST(n_shots, chunk_size, povm_array, [1, 1, 2], state_array, [1, 1, 1, 1], hashed_QST_instructions)
+        # Expected outcome probabilities of the first qubit and of the last two qubits in the Z basis
+        self.assertAlmostEqual(np.mean(hashed_outcomes[0, :, 0] == 0), povm_array[0].get_histogram(state_array[0])[0], delta=0.02)
+        joint_frequencies = np.bincount(2*hashed_outcomes[0, :, 2] + hashed_outcomes[0, :, 3], minlength=4)/n_shots
+        self.assertTrue(np.allclose(joint_frequencies, povm_array[2].get_histogram(np.kron(state_array[2], state_array[3])), atol=0.02))
+        # Counts-native sampling splits the chunk into the same blocks
+        chunk_counts = mf.measure_hashed_chunk_QST_counts(n_shots, chunk_size, povm_array, [1, 1, 2], state_array, [1, 1, 1, 1], hashed_QST_instructions)
+        self.assertTrue(np.array_equal(chunk_counts.get_cluster_size(), [1, 1, 2]))
+
+    def test_measure_hashed_chunk_QST_statevectors(self):
+        # Pure true states given as statevectors are measured the same way as their density matrices.
+        chunk_size = 4
+        povm_array = [POVM.generate_random_POVM(4, 4) for _ in range(3)] + [POVM.generate_computational_POVM(2)[0]]
+        statevector_array = [sp.stats.unitary_group.rvs(2**size)[:, 0] for size in [4, 1, 1, 1, 1]]
+        state_array = [np.outer(psi, psi.conj()) for psi in statevector_array]
+        hashed_QST_instructions = np.random.choice(['X', 'Y', 'Z'], size=(20, 8))
+        np.random.seed(7)
+        expected_outcomes = mf.measure_hashed_chunk_QST(100, chunk_size, povm_array, [2, 2, 2, 2], state_array, [4, 1, 1, 1, 1], hashed_QST_instructions)
+        np.random.seed(7)
+        hashed_outcomes = mf.measure_hashed_chunk_QST(100, chunk_size, povm_array, [2, 2, 2, 2], statevector_array, [4, 1, 1, 1, 1], hashed_QST_instructions)
+        self.assertTrue(np.array_equal(hashed_outcomes, expected_outcomes))
+
+    def test_measure_hashed_QST_sequential(self):
+        # State blocks and POVM clusters that straddle each other follow the same distribution as a dense simulation of all qubits.
+        n_shots = 20000
+        state_size_array = [2, 2, 1]
+        povm_size_array = [1, 2, 2]
+        state_array = [sp.stats.unitary_group.rvs(4)[:, 0], sf.generate_random_pure_state(2), sf.generate_random_pure_state(1)]
+        povm_array = [POVM.generate_random_POVM(2**size, 2**size) for size in povm_size_array]
+        hashed_QST_instructions = np.array([['Z']*5, ['X', 'Y', 'Z', 'X', 'Y']])
+        sequential_outcomes = mf.measure_hashed_QST_sequential(n_shots, povm_array, povm_size_array, state_array, state_size_array, hashed_QST_instructions)
+        dense_outcomes = mf.measure_hashed_chunk_QST(n_shots, 5, povm_array, povm_size_array, state_array, state_size_array, hashed_QST_instructions)
+        self.assertEqual(sequential_outcomes.shape, (2, n_shots, 5))
+        for subsystem_label in [[4, 3], [2, 1], [3, 2, 0]]:
+            difference = ot.get_traced_out_index_counts(sequential_outcomes, subsystem_label) - ot.get_traced_out_index_counts(dense_outcomes, subsystem_label)
+            self.assertLess(np.max(np.abs(difference))/n_shots, 0.03)
+        with self.assertRaises(ValueError):
+            mf.measure_hashed_QST_sequential(n_shots, povm_array, [1, 2, 1], state_array, state_size_array, hashed_QST_instructions)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
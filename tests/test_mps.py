@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+import sys
+sys.path.append('../') # Adding path to library
+from EMQST_lib import measurement_functions as mf
+from EMQST_lib import overlapping_tomography as ot
+from EMQST_lib.mps import MPS
+from EMQST_lib.povm import POVM
+
+
+class TestMPS(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.n_qubits = 5
+
+    def test_states(self):
+        GHZ = MPS.GHZ(self.n_qubits).to_statevector()
+        expected_GHZ = np.zeros(2**self.n_qubits)
+        expected_GHZ[[0, -1]] = 1/np.sqrt(2)
+        self.assertTrue(np.allclose(GHZ, expected_GHZ))
+        # Cluster state, CZ on all neighbours applied to |+>^n
+        bits = (np.arange(2**self.n_qubits)[:, None] >> np.arange(self.n_qubits)[::-1]) & 1
+        expected_cluster = (-1)**np.sum(bits[:, :-1]*bits[:, 1:], axis=1)/np.sqrt(2**self.n_qubits)
+        self.assertTrue(np.allclose(MPS.cluster_state(self.n_qubits).to_statevector(), expected_cluster))
+        random_state = MPS.random_state(self.n_qubits, 3, np.random.default_rng(1))
+        self.assertEqual(random_state.bond_dims, [2, 3, 3, 2])
+        self.assertAlmostEqual(np.linalg.norm(random_state.to_statevector()), 1)
+        with self.assertRaises(ValueError):
+            MPS([np.ones((1, 2, 2)), np.ones((3, 2, 1))])
+
+    def test_reduced_density_matrix(self):
+        random_state = MPS.random_state(self.n_qubits, 3, np.random.default_rng(2))
+        psi = random_state.to_statevector()
+        rho = np.outer(psi, psi.conj())
+        state_labels = np.arange(self.n_qubits)[::-1]
+        for qubit_labels in [[4, 2], [0], [1, 3, 0]]:
+            expected_rho = ot.trace_down_qubit_state(rho, state_labels, np.setdiff1d(state_labels, qubit_labels))
+            self.assertTrue(np.allclose(random_state.reduced_density_matrix(qubit_labels), expected_rho))
+        with self.assertRaises(ValueError):
+            random_state.reduced_density_matrix([5])
+
+    def test_hashed_MPS_QST(self):
+        # Sampling from the MPS follows the same distribution as the dense chunk simulation of the same state.
+        n_shots = 20000
+        random_state = MPS.random_state(self.n_qubits, 2, np.random.default_rng(3))
+        cluster_size = [2, 1, 2]
+        povm_array = [POVM.generate_random_POVM(2**size, 2**size) for size in cluster_size]
+        hashed_QST_instructions = np.array([['Z']*self.n_qubits, ['X', 'Y', 'Z', 'X', 'Y']])
+        MPS_outcomes = mf.measure_hashed_MPS_QST(n_shots, random_state, povm_array, cluster_size, hashed_QST_instructions)
+        dense_outcomes = mf.measure_hashed_chunk_QST(n_shots, self.n_qubits, povm_array, cluster_size, [random_state.to_statevector()], [self.n_qubits], hashed_QST_instructions)
+        self.assertEqual(MPS_outcomes.shape, (2, n_shots, self.n_qubits))
+        for subsystem_label in [[4, 3], [2, 0], [3, 1, 0]]:
+            difference = ot.get_traced_out_index_counts(MPS_outcomes, subsystem_label) - ot.get_traced_out_index_counts(dense_outcomes, subsystem_label)
+            self.assertLess(np.max(np.abs(difference))/n_shots, 0.03)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import numpy as np
+import sys
+import pickle
+import tempfile
+import os
+sys.path.append('../') # Adding path to library
+from EMQST_lib import measurement_functions as mf
+from EMQST_lib import overlapping_tomography as ot
+from EMQST_lib import support_functions as sf
+from EMQST_lib.outcomes import ClusterCounts, PackedOutcomes, MarginalCountAccumulator, OutcomeStore
+from EMQST_lib.povm import POVM
+
+
+class TestOutcomes(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.cluster_size = [2, 1, 3]
+        self.n_qubits = sum(self.cluster_size)
+        self.povm_array = [POVM.generate_random_POVM(2**size, 2**size) for size in self.cluster_size]
+        self.factorized_rho_array = np.array([[sf.generate_random_pure_state(1) for _ in range(self.n_qubits)] for _ in range(5)])
+
+    def test_cluster_counts_marginals(self):
+        counts = mf.measure_clusters_counts(1000, self.povm_array, self.factorized_rho_array, self.cluster_size)
+        self.assertEqual(counts.shape, (5, 1000, self.n_qubits))
+        self.assertTrue(np.all(np.sum(counts.get_cluster_counts(2), axis=1) == 1000))
+        # All marginals, within and across clusters, agree with the expanded outcomes.
+        outcomes = counts.to_outcomes()
+        for subsystem_label in [[5, 4], [3], [4, 3], [5, 1, 0], [2, 0], np.arange(self.n_qubits)]:
+            self.assertTrue(np.array_equal(counts.get_traced_out_index_counts(subsystem_label), ot.get_traced_out_index_counts(outcomes, subsystem_label)))
+            self.assertTrue(np.array_equal(ot.get_traced_out_index_counts(counts, subsystem_label), ot.get_traced_out_index_counts(outcomes, subsystem_label)))
+        # Arbitrary label order
+        self.assertTrue(np.array_equal(counts.get_index_counts([4, 5]), ot.get_traced_out_index_counts(outcomes[..., [1, 0]], [1, 0])))
+        self.assertTrue(np.array_equal(counts.get_index_counts([0, 3]), ot.get_traced_out_index_counts(outcomes[..., [5, 2]], [1, 0])))
+
+    def test_measure_clusters_counts(self):
+        # The counts follow the same distribution as measure_clusters
+        n_shots = 20000
+        counts = mf.measure_clusters_counts(n_shots, self.povm_array, self.factorized_rho_array, self.cluster_size)
+        outcomes = np.array([mf.measure_clusters(n_shots, self.povm_array, rho_array, self.cluster_size) for rho_array in self.factorized_rho_array])
+        for subsystem_label in [[5, 4], [3, 0]]:
+            difference = counts.get_traced_out_index_counts(subsystem_label) - ot.get_traced_out_index_counts(outcomes, subsystem_label)
+            self.assertLess(np.max(np.abs(difference))/n_shots, 0.03)
+
+        # Chunked QST counts
+        hashed_QST_instructions = np.array([["X"]*self.n_qubits, ["Y"]*self.n_qubits, ["Z", "X", "Y", "Z", "X", "Y"]])
+        state_array = [sf.generate_random_pure_state(2) for _ in range(3)]
+        povm_array = [POVM.generate_random_POVM(4, 4) for _ in range(3)]
+        chunk_counts = mf.measure_hashed_chunk_QST_counts(n_shots, 2, povm_array, [2, 2, 2], state_array, [2, 2, 2], hashed_QST_instructions)
+        chunk_outcomes = mf.measure_hashed_chunk_QST(n_shots, 2, povm_array, [2, 2, 2], state_array, [2, 2, 2], hashed_QST_instructions)
+        self.assertTrue(np.array_equal(chunk_counts.get_cluster_size(), [2, 2, 2]))
+        difference = chunk_counts.get_traced_out_index_counts([4, 1]) - ot.get_traced_out_index_counts(chunk_outcomes, [4, 1])
+        self.assertLess(np.max(np.abs(difference))/n_shots, 0.03)
+
+    def test_invalid_cluster_counts(self):
+        with self.assertRaises(ValueError):
+            ClusterCounts([np.ones((2, 4))], [2, 1])
+
+    def test_packed_outcomes(self):
+        outcomes = np.array([mf.measure_clusters(100, self.povm_array, rho_array, self.cluster_size) for rho_array in self.factorized_rho_array])
+        self.assertEqual(outcomes.dtype, np.uint8)
+        packed_outcomes = PackedOutcomes.from_outcomes(outcomes)
+        self.assertEqual(packed_outcomes.shape, outcomes.shape)
+        self.assertTrue(np.array_equal(packed_outcomes.to_outcomes(), outcomes))
+        # Packing in measure_clusters gives the same container
+        np.random.seed(1)
+        packed_rows = np.array([mf.measure_clusters(100, self.povm_array, rho_array, self.cluster_size, packed=True) for rho_array in self.factorized_rho_array])
+        np.random.seed(1)
+        unpacked_rows = np.array([mf.measure_clusters(100, self.povm_array, rho_array, self.cluster_size) for rho_array in self.factorized_rho_array])
+        self.assertTrue(np.array_equal(PackedOutcomes(packed_rows, self.n_qubits).to_outcomes(), unpacked_rows))
+
+        # More than 8 qubits span several bytes
+        wide_outcomes = np.random.randint(2, size=(3, 50, 13)).astype(np.uint8)
+        packed_wide_outcomes = PackedOutcomes.from_outcomes(wide_outcomes)
+        self.assertEqual(packed_wide_outcomes.nbytes, 3*50*2)
+        for subsystem_label in [[0], [12, 3], [8, 7, 0], [11, 5]]:
+            self.assertTrue(np.array_equal(ot.get_traced_out_index_counts(packed_wide_outcomes, subsystem_label), ot.get_traced_out_index_counts(wide_outcomes, subsystem_label)))
+            self.assertTrue(np.array_equal(ot.trace_out(subsystem_label, packed_wide_outcomes), ot.trace_out(subsystem_label, wide_outcomes)))
+        with self.assertRaises(ValueError):
+            PackedOutcomes(np.zeros((3, 50, 1), dtype=np.uint8), 13)
+
+    def test_marginal_count_accumulator(self):
+        subsystem_labels = [[0], [5, 2], [1, 4], [3, 2, 0]]
+        accumulator = MarginalCountAccumulator(self.n_qubits, len(self.factorized_rho_array), subsystem_labels)
+        batches = []
+        for n_batch_shots in [40, 40, 20]:
+            batch = np.array([mf.measure_clusters(n_batch_shots, self.povm_array, rho_array, self.cluster_size) for rho_array in self.factorized_rho_array])
+            accumulator.update(batch)
+            batches.append(batch)
+        outcomes = np.concatenate(batches, axis=1)
+        self.assertEqual(accumulator.shape, outcomes.shape)
+        for subsystem_label in subsystem_labels:
+            self.assertTrue(np.array_equal(ot.get_traced_out_index_counts(accumulator, subsystem_label), ot.get_traced_out_index_counts(outcomes, subsystem_label)))
+        # Containers are accepted as batches
+        packed_accumulator = MarginalCountAccumulator(self.n_qubits, len(self.factorized_rho_array), subsystem_labels)
+        for batch in batches:
+            packed_accumulator.update(PackedOutcomes.from_outcomes(batch))
+        self.assertTrue(np.array_equal(packed_accumulator.get_traced_out_index_counts([3, 2, 0]), accumulator.get_traced_out_index_counts([0, 2, 3])))
+        with self.assertRaises(ValueError):
+            accumulator.get_traced_out_index_counts([5, 1])
+        with self.assertRaises(ValueError):
+            accumulator.register([[5, 1]])
+
+    def test_outcome_store(self):
+        outcomes = np.random.randint(2, size=(7, 30, 11)).astype(np.uint8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'QDT_outcomes')
+            store = OutcomeStore.create(path, 7, 30, 11, row_block_size=3)
+            # Rows are written incrementally
+            store.write_rows(0, outcomes[:4])
+            store.write_rows(4, PackedOutcomes.from_outcomes(outcomes[4:]))
+            store.flush()
+            self.assertEqual(store.shape, outcomes.shape)
+            reopened_store = pickle.loads(pickle.dumps(store))
+            self.assertTrue(np.array_equal(reopened_store.to_outcomes(), outcomes))
+            self.assertTrue(np.array_equal(reopened_store.get_rows([1, 5]).to_outcomes(), outcomes[[1, 5]]))
+            for subsystem_label in [[0], [10, 3], [8, 7, 0]]:
+                self.assertTrue(np.array_equal(ot.get_traced_out_index_counts(reopened_store, subsystem_label), ot.get_traced_out_index_counts(outcomes, subsystem_label)))
+                self.assertTrue(np.array_equal(ot.trace_out(subsystem_label, reopened_store), ot.trace_out(subsystem_label, outcomes)))
+            read_only_store = OutcomeStore(path)
+            with self.assertRaises(ValueError):
+                read_only_store.write_rows(0, outcomes[:1])
+            del store, reopened_store, read_only_store
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,8 @@ import sys
 sys.path.append('../') # Adding path to library
 from EMQST_lib import support_functions as sf
 from EMQST_lib import overlapping_tomography as ot
+from EMQST_lib import measurement_functions as mf
+from EMQST_lib import dt
 from EMQST_lib.povm import POVM
 
 
@@ -297,6 +299,39 @@ class TestHash(unittest.TestCase):
         traced_out = ot.get_traced_out_indicies(index_to_keep,11)
         self.assertTrue(np.all(traced_out == np.array([0,1,3,4,5,6,7,8,9,10])))
         
+    def test_batched_QDT(self):
+        # Simulate hashed QDT measurements on 4 qubits with two noisy 2 qubit clusters.
+        np.random.seed(0)
+        n_qubits = 4
+        n_hash_symbols = 2
+        hash_family = ot.create_2RDM_hash(n_qubits)
+        calibration_angles = np.array([[[0,0]],[[2*np.arccos(1/np.sqrt(3)),0]],
+                                       [[2*np.arccos(1/np.sqrt(3)),2*np.pi/3]],
+                                       [[2*np.arccos(1/np.sqrt(3)),4*np.pi/3]]])
+        one_qubit_calibration_states = np.array([sf.get_density_matrix_from_angles(angle) for angle in calibration_angles])
+        instructions = ot.create_hashed_instructions(hash_family, np.array([0, 1, 2, 3]), n_hash_symbols)
+        calib_states = np.array([ot.calibration_states_from_instruction(instruction, one_qubit_calibration_states) for instruction in instructions])
+        comp_povm = POVM.generate_computational_POVM(2)[0]
+        povm_array = [POVM.generate_noisy_POVM(comp_povm, 1), POVM.generate_noisy_POVM(comp_povm, 2)]
+        QDT_outcomes = np.array([mf.measure_clusters(1000, povm_array, rho_array, np.array([2, 2])) for rho_array in calib_states])
+
+        # Batched reconstruction agrees with the reconstruction of each subsystem on its own.
+        labels = np.array([[3, 2], [1, 0], [2, 0], [1], [3, 1, 0]], dtype=object)
+        index_counts = [ot.get_traced_out_index_counts(QDT_outcomes, label) for label in labels]
+        batched_POVMs = ot.reconstruct_POVMs_from_noise_labels(QDT_outcomes, labels, n_qubits, hash_family, n_hash_symbols, one_qubit_calibration_states, 1)
+        self.assertEqual(len(batched_POVMs), len(labels))
+        for i, label in enumerate(labels):
+            serial_POVM = ot.QDT(label, index_counts[i], hash_family, n_hash_symbols, n_qubits, one_qubit_calibration_states)
+            self.assertTrue(np.allclose(batched_POVMs[i].get_POVM(), serial_POVM.get_POVM(), atol=1e-8))
+            # The product state kernel agrees with the MLE on dense calibration states.
+            dense_states = ot.create_traced_out_calibration_states(label, hash_family, one_qubit_calibration_states, n_hash_symbols, n_qubits)
+            dense_POVM = dt.POVM_MLE(len(label), index_counts[i], dense_states, POVM.generate_computational_POVM(len(label))[0])
+            self.assertTrue(np.allclose(dense_POVM.get_POVM(), serial_POVM.get_POVM(), atol=1e-6))
+
+        two_point_POVMs, corr_labels = ot.reconstruct_all_two_qubit_POVMs(QDT_outcomes, n_qubits, hash_family, n_hash_symbols, one_qubit_calibration_states, 2)
+        self.assertEqual(len(two_point_POVMs), 6)
+        self.assertTrue(np.allclose(two_point_POVMs[-1].get_POVM(), batched_POVMs[0].get_POVM()))
+
     def test_create_2RDM_hash(self):
         # Test case 1: n_total_qubits = 2
         n_total_qubits = 2
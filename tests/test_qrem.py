@@ -1,5 +1,6 @@
 import unittest
 import numpy as np
+import tempfile
 import scipy as sp
 import sys
 sys.path.append('../')
@@ -48,4 +49,117 @@ class TestQREM(unittest.TestCase):
 
         comp_povm = POVM.generate_computational_POVM(3)[0].get_POVM()
         true_povm = np.einsum("ij,kjl,lm->kim",rot_matrix,comp_povm,rot_matrix.conj().T) 
-        self.assertTrue(np.allclose(qrem._povm_array[3].get_POVM(), true_povm))
\ No newline at end of file
+        self.assertTrue(np.allclose(qrem._povm_array[3].get_POVM(), true_povm))
+
+    def _reconstructed_qrem(self):
+        # Small QREM run with perfectly reconstructed noise clusters, ready for the correlator QST.
+        np.random.seed(0)
+        sim_dict = {'n_qubits': 8, 'n_QST_shots_total': 10**3, 'n_QDT_shots': 10**3, 'n_QDT_hash_symbols': 2, 'n_QST_hash_symbols': 2,
+                    'n_cores': 1, 'max_cluster_size': 3, 'data_path': None}
+        qrem = QREM(sim_dict, two_point_corr_labels=[[1, 0], [5, 2]], chunk_size=4)
+        qrem.set_initial_cluster_size(np.array([2, 2, 2, 2]))
+        qrem.set_coherent_POVM_array(angle=np.pi/10)
+        qrem.perform_QDT_measurements()
+        qrem.reconstruct_cluster_with_perfect_clustering()
+        qrem._noise_cluster_labels = qrem.true_cluster_labels
+        qrem._clustered_QDOT = qrem._perfect_clustered_QDOT
+        qrem.reconstruct_all_one_qubit_POVMs()
+        return qrem
+
+    def _check_correlated_QREM_comparison(self, qrem):
+        qrem.compute_correlator_true_states()
+        result_dict = qrem.perform_correlated_QREM_comparison([0])
+        for results in [result_dict['no_QREM'], result_dict['correlated_QREM']]:
+            self.assertEqual(np.shape(results), (1, 2, 4, 4))
+            self.assertTrue(np.allclose(np.trace(results, axis1=-2, axis2=-1), 1))
+
+    def test_correlated_QREM_comparison_misaligned_states(self):
+        # State blocks that do not tile the chunks are simulated with sequential sampling in the correlator comparison.
+        qrem = self._reconstructed_qrem()
+        qrem.set_chunked_true_states(1, mode='random', state_size_array=[3, 3, 2])
+        self.assertFalse(qrem._is_chunk_aligned())
+        self._check_correlated_QREM_comparison(qrem)
+
+    def test_correlated_QREM_comparison_MPS_states(self):
+        qrem = self._reconstructed_qrem()
+        qrem.set_MPS_true_states(1, mode='cluster')
+        self._check_correlated_QREM_comparison(qrem)
+
+    def test_streamed_measurements(self):
+        # Streamed QDT covers the noise clusters found by the clustering, also when they differ from the true clusters,
+        # and streamed QST covers the correlator unions. The counts agree with the stored outcomes drawn from the same seed.
+        sim_dict = {'n_qubits': 6, 'n_QST_shots_total': 10**3, 'n_QDT_shots': 10**3, 'n_QDT_hash_symbols': 2, 'n_QST_hash_symbols': 2,
+                    'n_cores': 1, 'max_cluster_size': 3, 'data_path': None}
+        np.random.seed(0)
+        qrem = QREM(sim_dict, two_point_corr_labels=[[1, 0], [5, 2]])
+        qrem.set_initial_cluster_size(np.array([1, 2, 3]))
+        qrem.set_coherent_POVM_array(angle=np.pi/5)
+        random_state = np.random.get_state()
+        qrem.perform_streamed_QDT_measurements()
+        streamed_QDT_outcomes = qrem._QDT_outcomes
+        qrem.perform_clustering()
+        qrem.reconstruct_cluster_POVMs()
+        self.assertTrue(any(len(cluster) > 2 for cluster in qrem._noise_cluster_labels))
+        np.random.set_state(random_state)
+        qrem.perform_QDT_measurements()
+        for cluster_label in qrem._noise_cluster_labels:
+            self.assertTrue(np.array_equal(streamed_QDT_outcomes.get_traced_out_index_counts(cluster_label), ot.get_traced_out_index_counts(qrem._QDT_outcomes, cluster_label)))
+        with self.assertRaises(ValueError):
+            qrem.perform_streamed_QDT_measurements(max_registered_counts=0)
+
+        qrem.set_chunked_true_states(1, mode='random', chunk_size=3)
+        random_state = np.random.get_state()
+        qrem.perform_streamed_QST_measurements()
+        streamed_QST_outcomes = qrem._QST_outcomes[0]
+        np.random.set_state(random_state)
+        qrem.perform_averaged_QST_measurements()
+        for two_point_label, union_label in zip(qrem._two_point_corr_labels, qrem._get_correlator_union_labels(qrem._noise_cluster_labels)):
+            self.assertTrue(np.array_equal(streamed_QST_outcomes.get_traced_out_index_counts(union_label), ot.get_traced_out_index_counts(qrem._QST_outcomes[0], union_label)))
+            rho = ot.QST_from_instructions(streamed_QST_outcomes, qrem._hashed_QST_instructions, np.array([two_point_label]), union_label, qrem._clustered_QDOT, qrem._noise_cluster_labels)
+            self.assertAlmostEqual(np.real(np.trace(rho)), 1)
+
+    def _run_storage_smoke(self, outcome_storage, outcome_store_path = None):
+        # Runs QDT, clustering, reconstruction and QST with the given outcome storage, with the same seed for every storage.
+        sim_dict = {'n_qubits': 6, 'n_QST_shots_total': 10**4, 'n_QDT_shots': 10**4, 'n_QDT_hash_symbols': 2, 'n_QST_hash_symbols': 2,
+                    'n_cores': 1, 'max_cluster_size': 3, 'data_path': None}
+        np.random.seed(0)
+        kwargs = {} if outcome_store_path is None else {'outcome_store_path': outcome_store_path}
+        qrem = QREM(sim_dict, two_point_corr_labels=[[1, 0], [5, 2]], outcome_storage=outcome_storage, **kwargs)
+        qrem.set_initial_cluster_size(np.array([1, 2, 3]))
+        qrem.set_coherent_POVM_array(angle=np.pi/5)
+        qrem.perform_QDT_measurements()
+        qrem.perform_clustering()
+        qrem.reconstruct_cluster_with_perfect_clustering()
+        qrem._noise_cluster_labels = qrem.true_cluster_labels
+        qrem._clustered_QDOT = qrem._perfect_clustered_QDOT
+        np.random.seed(1) # The storages use the random state differently, the true states should be the same.
+        qrem.set_chunked_true_states(1, mode='random', chunk_size=3)
+        qrem.perform_averaged_QST_measurements()
+        return qrem
+
+    def _check_storage_against_outcomes(self, qrem):
+        reference = self._run_storage_smoke('outcomes')
+        # Reconstructed POVMs and QST marginal frequencies agree within sampling error.
+        for povm, reference_povm in zip(qrem._clustered_QDOT, reference._clustered_QDOT):
+            self.assertLess(np.max(np.abs(povm.get_POVM() - reference_povm.get_POVM())), 0.1)
+        n_QST_shots = reference._n_QST_shots_total
+        for subsystem_label in list(reference.true_cluster_labels) + [[5, 2]]:
+            frequencies = ot.get_traced_out_index_counts(qrem._QST_outcomes[0], subsystem_label)/n_QST_shots
+            reference_frequencies = ot.get_traced_out_index_counts(reference._QST_outcomes[0], subsystem_label)/n_QST_shots
+            self.assertLess(np.max(np.abs(frequencies - reference_frequencies)), 0.05)
+
+    def test_counts_storage(self):
+        qrem = self._run_storage_smoke('counts')
+        self._check_storage_against_outcomes(qrem)
+        # Counts are drawn per chunk, state blocks that straddle the chunks are rejected.
+        qrem.set_chunked_true_states(1, mode='random', state_size_array=[2, 2, 2])
+        with self.assertRaises(ValueError):
+            qrem.perform_averaged_QST_measurements()
+
+    def test_packed_storage(self):
+        self._check_storage_against_outcomes(self._run_storage_smoke('packed'))
+
+    def test_disk_storage(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            qrem = self._run_storage_smoke('disk', tmp_dir)
+            self._check_storage_against_outcomes(qrem)
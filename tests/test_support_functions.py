@@ -1,10 +1,12 @@
 import unittest
 import numpy as np
 from functools import reduce
+from itertools import combinations
 import sys
 sys.path.append('../') # Adding path to library
 from EMQST_lib import support_functions as sf
 from EMQST_lib import overlapping_tomography as ot
+from EMQST_lib.povm import POVM
 
 
 
@@ -120,6 +122,26 @@ class TestSupport(unittest.TestCase):
         self.assertTrue(np.allclose(sf.get_angles_from_density_matrix_single_qubit(rho5), expected5))
         
         
+    def test_POVM_distance(self):
+        # Computational and X basis measurements have distance sqrt(1-|<0|+>|^2) = 1/sqrt(2)
+        comp = POVM.generate_computational_POVM(1)[0].get_POVM()
+        x_povm = POVM.generate_Pauli_POVM(1)[0].get_POVM()
+        self.assertTrue(np.isclose(sf.POVM_distance(comp, x_povm, method='exact'), 1/np.sqrt(2)))
+        self.assertTrue(np.isclose(sf.POVM_distance(comp, comp), 0))
+
+        # The exact distance is an upper bound of the sampled distance, and the batch agrees with single pairs.
+        M_stack = np.array([POVM.generate_random_POVM(4, 4).get_POVM() for _ in range(3)])
+        N_stack = np.array([POVM.generate_random_POVM(4, 4).get_POVM() for _ in range(3)])
+        exact = sf.POVM_distance_batch(M_stack, N_stack, method='exact')
+        sampled = sf.POVM_distance_batch(M_stack, N_stack, method='sampled')
+        self.assertTrue(np.all(sampled <= exact + 1e-12))
+        for i in range(3):
+            self.assertTrue(np.isclose(sf.POVM_distance(M_stack[i], N_stack[i], method='exact'), exact[i]))
+        # Brute force over all subsets, including the last outcome
+        diff = M_stack[0] - N_stack[0]
+        brute_force = max(np.linalg.eigvalsh(np.sum(diff[list(S)], axis=0))[-1] for k in range(1, 5) for S in combinations(range(4), k))
+        self.assertTrue(np.isclose(brute_force, exact[0]))
+
     def test_decimal_to_binary_array(self):
         # Test case 1
         decimal_array1 = np.array([5, 10, 15])
@@ -145,6 +167,28 @@ class TestSupport(unittest.TestCase):
         decimal_array5 = np.array([0, 1, 2, 3])
         expected5 = np.array([[0, 0, 0], [0, 0, 1], [0, 1, 0], [0, 1, 1]])
         self.assertTrue(np.array_equal(sf.decimal_to_binary_array(decimal_array5,3), expected5))
+
+    def test_random_state_batches(self):
+        rng = np.random.default_rng(0)
+        unitaries = sf.generate_random_unitary_batch(4, 2000, rng)
+        self.assertTrue(np.allclose(unitaries @ unitaries.conj().transpose(0, 2, 1), np.eye(4)))
+        # Haar moments, E|U_ij|^2 = 1/d and E|U_ij|^4 = 2/(d(d+1))
+        self.assertAlmostEqual(np.mean(np.abs(unitaries)**2), 1/4, places=2)
+        self.assertAlmostEqual(np.mean(np.abs(unitaries)**4), 2/20, places=2)
+        for generate_states in [sf.generate_random_pure_state_batch, sf.generate_random_Hilbert_Schmidt_mixed_state_batch, sf.generate_random_Bures_mixed_state_batch]:
+            states = generate_states(2, 10, rng)
+            self.assertEqual(states.shape, (10, 4, 4))
+            self.assertTrue(np.allclose(np.trace(states, axis1=1, axis2=2), 1))
+            self.assertTrue(np.allclose(states, states.conj().transpose(0, 2, 1)))
+            self.assertTrue(np.all(np.linalg.eigvalsh(states) > -1e-12))
+        pure_states = sf.generate_random_pure_state_batch(2, 10, rng)
+        self.assertTrue(np.allclose(pure_states @ pure_states, pure_states))
+        # Factorized states are consistent with their Bloch angles
+        states, angles = sf.generate_random_factorized_states_batch(3, 5, rng)
+        self.assertEqual(angles.shape, (5, 3, 2))
+        for state, angle in zip(states, angles):
+            expected_state = reduce(np.kron, [sf.get_density_matrix_from_angles(np.array([a])) for a in angle])
+            self.assertTrue(np.allclose(state, expected_state))
         
    
 